@@ -0,0 +1,126 @@
+# Copyright Stacklet, Inc.
+# SPDX-License-Identifier: Apache-2.0
+
+"""
+Output formatter throughput on large account and policy listings.
+
+Each formatter lays out a synthetic response page, as a single `--output` document
+and as a stream of result nodes (as with `--all`). YAML is timed with both the
+pure-Python dumper and the libyaml one, when PyYAML is built with it. Formatters with
+passthrough also lay out the encoded response, read in chunks as it would be from the
+API, without decoding it.
+
+    $ python benchmarks/formatters.py --nodes 10000
+"""
+
+import argparse
+import json
+import timeit
+from typing import Any, Iterable, Iterator
+
+import jmespath
+import yaml
+from response_decode import policy_page
+
+from stacklet.client.platform.formatter import FORMATTERS, Formatter, YAMLFormatter
+from stacklet.client.platform.graphql.executor import STREAM_CHUNK_SIZE
+from stacklet.client.platform.graphql.snippets import ListAccounts, ListPolicies
+
+
+def account_page(nodes: int) -> dict:
+    """A ListAccounts response page with the given number of nodes."""
+    return {
+        "data": {
+            "accounts": {
+                "edges": [
+                    {
+                        "node": {
+                            "id": f"account:aws:{n:012d}",
+                            "key": f"{n:012d}",
+                            "name": f"account-{n}",
+                            "shortName": f"a{n}",
+                            "description": "Production workloads",
+                            "provider": "AWS",
+                            "path": "/org/prod",
+                            "email": f"cloud+{n}@example.com",
+                            "securityContext": f"arn:aws:iam::{n:012d}:role/stacklet",
+                            "tags": [
+                                {"key": "env", "value": "prod"},
+                                {"key": "team", "value": "platform"},
+                            ],
+                            "variables": '{"region": "us-east-1"}',
+                        }
+                    }
+                    for n in range(nodes)
+                ],
+                "pageInfo": {
+                    "hasPreviousPage": False,
+                    "hasNextPage": True,
+                    "startCursor": "start",
+                    "endCursor": "end",
+                    "total": nodes * 10,
+                },
+            }
+        }
+    }
+
+
+class PurePythonYAMLFormatter(YAMLFormatter):
+    """YAML output with PyYAML's pure-Python dumper, as before libyaml was used."""
+
+    def __call__(self, value):
+        return yaml.safe_dump(value, indent=2)
+
+    def stream(self, values: Iterable[Any]) -> Iterator[str]:
+        for value in values:
+            yield yaml.safe_dump(value, indent=2, explicit_start=True).rstrip("\n")
+
+
+def formatters() -> dict[str, Formatter]:
+    """Formatters to time, by label."""
+    result: dict[str, Formatter] = {
+        name: formatter_class() for name, formatter_class in FORMATTERS.items()
+    }
+    if getattr(yaml, "CSafeDumper", None) is not None:
+        result["yaml (libyaml)"] = result.pop("yaml")
+    result["yaml (pure Python)"] = PurePythonYAMLFormatter()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--nodes", type=int, default=10000, help="nodes in each page")
+    parser.add_argument("--repeat", type=int, default=3, help="timing repetitions")
+    args = parser.parse_args()
+
+    def best(func) -> float:
+        return min(timeit.repeat(func, number=1, repeat=args.repeat))
+
+    pages = {
+        "accounts": (account_page(args.nodes), ListAccounts.result_expr),
+        "policies": (policy_page(args.nodes), ListPolicies.result_expr),
+    }
+    for payload, (page, result_expr) in pages.items():
+        nodes = jmespath.search(result_expr, page)
+        print(f"{payload}, {args.nodes} nodes")
+        print(f"  {'formatter':<20} {'document':>11} {'stream':>11} {'nodes/s':>10}")
+        for label, formatter in formatters().items():
+            # tabular formatters lay out the nodes, the others the whole response
+            value = nodes if formatter.records else page
+            document = best(lambda: formatter(value))
+            stream = best(lambda: list(formatter.stream(iter(nodes))))
+            print(
+                f"  {label:<20} {document * 1000:8.1f} ms {stream * 1000:8.1f} ms "
+                f"{args.nodes / stream:10.0f}"
+            )
+
+        body = json.dumps(page, separators=(",", ":")).encode()
+        chunks = [body[i : i + STREAM_CHUNK_SIZE] for i in range(0, len(body), STREAM_CHUNK_SIZE)]
+        for label, formatter in formatters().items():
+            if formatter.passthrough:
+                document = best(lambda: "".join(formatter.reformat(chunks)))
+                print(f"  {label + ' (passthrough)':<20} {document * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
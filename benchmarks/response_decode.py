@@ -0,0 +1,115 @@
+# Copyright Stacklet, Inc.
+# SPDX-License-Identifier: Apache-2.0
+
+"""
+Microbenchmark for handling a large API response page.
+
+Compares what the executor used to do for every page (decode the response twice and
+format request and response for debug logging, whether or not it's enabled) with the
+current hot path (a single decode with the selected codec).
+
+    $ python benchmarks/response_decode.py --nodes 20000
+"""
+
+import argparse
+import json
+import timeit
+
+from stacklet.client.platform.codec import CODECS
+from stacklet.client.platform.graphql.snippets import ListPolicies
+
+SOURCE = """\
+policies:
+  - name: s3-bucket-encryption
+    resource: aws.s3
+    filters:
+      - type: bucket-encryption
+        state: false
+    actions:
+      - type: set-bucket-encryption
+"""
+
+
+def policy_page(nodes: int) -> dict:
+    """A ListPolicies response page with the given number of nodes."""
+    return {
+        "data": {
+            "policies": {
+                "edges": [
+                    {
+                        "node": {
+                            "id": f"policy:{n}",
+                            "uuid": f"00000000-0000-0000-0000-{n:012d}",
+                            "version": 3,
+                            "name": f"policy-{n}",
+                            "description": "Ensure S3 buckets are encrypted at rest",
+                            "category": ["encryption"],
+                            "compliance": [],
+                            "severity": "high",
+                            "resourceType": "aws.s3",
+                            "provider": "AWS",
+                            "resource": "s3",
+                            "mode": "pull",
+                            "tags": [{"key": "team", "value": "security"}],
+                            "commit": {"hash": "a" * 40, "author": "dev", "msg": "update"},
+                            "repository": {"id": "repo:1", "url": "https://git", "name": "p"},
+                            "path": f"policies/{n}.yaml",
+                            "source": SOURCE,
+                            "validationError": None,
+                        }
+                    }
+                    for n in range(nodes)
+                ],
+                "pageInfo": {
+                    "hasPreviousPage": False,
+                    "hasNextPage": True,
+                    "startCursor": "start",
+                    "endCursor": "end",
+                    "total": nodes * 10,
+                },
+            }
+        }
+    }
+
+
+def before(request: dict, body: bytes):
+    json.dumps(request, indent=2)
+    json.dumps(request)
+    json.dumps(json.loads(body), indent=2)
+    return json.loads(body)
+
+
+def after(codec, request: dict, body: bytes):
+    codec.dumps(request)
+    return codec.loads(body)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--nodes", type=int, default=20000, help="policies in the page")
+    parser.add_argument("--repeat", type=int, default=5, help="timing repetitions")
+    args = parser.parse_args()
+
+    request = ListPolicies.build({"first": args.nodes, "last": 0, "before": "", "after": ""})
+    body = json.dumps(policy_page(args.nodes)).encode()
+    print(f"page of {args.nodes} nodes, {len(body) / 2**20:.1f} MiB")
+
+    def best(func) -> float:
+        return min(timeit.repeat(func, number=1, repeat=args.repeat))
+
+    baseline = best(lambda: before(request, body))
+    print(f"{'before (json, 2 decodes + debug formatting)':<45} {baseline * 1000:8.1f} ms")
+    for name, codec_class in CODECS.items():
+        try:
+            codec = codec_class()
+        except ImportError:
+            print(f"{f'after ({name})':<45} {'not installed':>11}")
+            continue
+        elapsed = best(lambda: after(codec, request, body))
+        print(
+            f"{f'after ({name})':<45} {elapsed * 1000:8.1f} ms  {baseline / elapsed:5.1f}x faster"
+        )
+
+
+if __name__ == "__main__":
+    main()
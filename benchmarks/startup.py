@@ -0,0 +1,281 @@
+# Copyright Stacklet, Inc.
+# SPDX-License-Identifier: Apache-2.0
+
+"""
+Startup and cold-command latency benchmarks, compared against a JSON baseline.
+
+Each measurement runs in a fresh interpreter, as a user running `stacklet-admin` would:
+
+- importing the CLI entry point, as reported by `python -X importtime`
+- `stacklet-admin --help`, `account list` and `show`, end to end, with `account list`
+  talking to a fake API server on localhost
+- constructing a client with `platform_client()`, once its module is imported
+- `account list` through the `stacklet-admin` entry point, with a warm daemon running
+
+The best of several runs is kept for each. Without `--save`, results are compared with
+the baseline and the exit status is 1 if any regressed past the threshold. Timings
+depend on the machine, so the baseline isn't kept in the repository: save one on the
+machine running the comparison first, e.g. before making changes:
+
+    $ python benchmarks/startup.py --save
+    $ python benchmarks/startup.py
+"""
+
+import argparse
+import json
+import os
+import platform
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Iterator
+
+BASELINE = Path(__file__).parent / "startup_baseline.json"
+
+CLI_MODULE = "stacklet.client.platform.cli"
+
+# Regressions smaller than this are noise, whatever the relative threshold.
+NOISE_MS = 10.0
+# Seconds to wait for the daemon to start listening, or to exit once stopped.
+DAEMON_TIMEOUT = 10.0
+
+ACCOUNTS_PAGE = {
+    "data": {
+        "accounts": {
+            "edges": [
+                {
+                    "node": {
+                        "id": f"account:aws:{n:012d}",
+                        "key": f"{n:012d}",
+                        "name": f"account-{n}",
+                        "shortName": f"a{n}",
+                        "description": None,
+                        "provider": "AWS",
+                        "path": "/",
+                        "email": None,
+                        "securityContext": None,
+                        "tags": [],
+                        "variables": None,
+                    }
+                }
+                for n in range(20)
+            ],
+            "pageInfo": {
+                "hasPreviousPage": False,
+                "hasNextPage": False,
+                "startCursor": None,
+                "endCursor": None,
+                "total": 20,
+            },
+        }
+    }
+}
+
+
+class FakeAPI(BaseHTTPRequestHandler):
+    """Answers every GraphQL request with a page of accounts."""
+
+    body = json.dumps(ACCOUNTS_PAGE).encode()
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(self.body)))
+        self.end_headers()
+        self.wfile.write(self.body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@contextmanager
+def fake_api() -> Iterator[str]:
+    """Run the fake API server in a thread, yielding its URL."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeAPI)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}/api"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+@contextmanager
+def environment(api: str) -> Iterator[dict[str, str]]:
+    """Yield the environment for commands, with a config in a temporary home."""
+    with tempfile.TemporaryDirectory() as home:
+        config_file = Path(home) / ".stacklet" / "config.json"
+        config_file.parent.mkdir()
+        config_file.write_text(
+            json.dumps(
+                {
+                    "api": api,
+                    "cognito_user_pool_id": "us-east-1_benchmark",
+                    "cognito_client_id": "benchmark",
+                    "region": "us-east-1",
+                    "cubejs": "http://127.0.0.1",
+                }
+            )
+        )
+        env = os.environ | {
+            "HOME": home,
+            "STACKLET_CONFIG": str(config_file),
+            "STACKLET_API_KEY": "benchmark-token",
+            "NO_PROXY": "127.0.0.1",
+        }
+        yield env
+
+
+def import_time(module: str, env: dict[str, str] | None = None) -> float:
+    """Milliseconds importing a module takes in a fresh interpreter."""
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stderr
+    match = re.search(rf"\|\s*(\d+) \| {re.escape(module)}$", stderr, re.MULTILINE)
+    assert match, stderr
+    return int(match.group(1)) / 1000
+
+
+def command_time(env: dict[str, str], *args: str) -> float:
+    """Milliseconds a CLI command takes end to end, interpreter startup included."""
+    start = time.perf_counter()
+    subprocess.run(
+        [sys.executable, "-m", CLI_MODULE, *args],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        check=True,
+    )
+    return (time.perf_counter() - start) * 1000
+
+
+@contextmanager
+def running_daemon(env: dict[str, str]) -> Iterator[dict[str, str]]:
+    """Run a daemon, yielding the environment for commands to be forwarded to it."""
+    socket = Path(env["HOME"]) / "daemon.sock"
+    env = env | {"STACKLET_DAEMON_SOCKET": str(socket)}
+    daemon = subprocess.Popen([sys.executable, "-m", CLI_MODULE, "daemon", "serve"], env=env)
+    try:
+        deadline = time.monotonic() + DAEMON_TIMEOUT
+        while not socket.exists():
+            if daemon.poll() is not None:
+                raise RuntimeError(f"The daemon exited with status {daemon.returncode}")
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"The daemon didn't start in {DAEMON_TIMEOUT}s")
+            time.sleep(0.01)
+        yield env
+    finally:
+        if daemon.poll() is None:
+            subprocess.run([sys.executable, "-m", CLI_MODULE, "daemon", "stop"], env=env)
+            try:
+                daemon.wait(timeout=DAEMON_TIMEOUT)
+            except subprocess.TimeoutExpired:
+                daemon.kill()
+                daemon.wait()
+
+
+def forwarded_command_time(env: dict[str, str], *args: str) -> float:
+    """Milliseconds a CLI command takes end to end through the entry point."""
+    code = "from stacklet.client.platform.daemon import main; main()"
+    start = time.perf_counter()
+    subprocess.run(
+        [sys.executable, "-c", code, *args], env=env, stdout=subprocess.DEVNULL, check=True
+    )
+    return (time.perf_counter() - start) * 1000
+
+
+def client_time(env: dict[str, str]) -> float:
+    """Milliseconds `platform_client()` takes in a fresh interpreter."""
+    code = (
+        "import time\n"
+        "from stacklet.client.platform.client import platform_client\n"
+        "start = time.perf_counter()\n"
+        "platform_client()\n"
+        "print((time.perf_counter() - start) * 1000)\n"
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", code], env=env, capture_output=True, text=True, check=True
+    ).stdout
+    return float(output)
+
+
+def run(repeat: int) -> dict[str, float]:
+    """Return the best time of each benchmark, in milliseconds."""
+    with fake_api() as api, environment(api) as env, running_daemon(env) as daemon_env:
+        benchmarks = {
+            "import_cli": lambda: import_time(CLI_MODULE, env),
+            "help": lambda: command_time(env, "--help"),
+            "account_list": lambda: command_time(env, "account", "list"),
+            "show": lambda: command_time(env, "show"),
+            "platform_client": lambda: client_time(env),
+            "daemon_account_list": lambda: forwarded_command_time(daemon_env, "account", "list"),
+        }
+        return {
+            name: round(min(benchmark() for _ in range(repeat)), 2)
+            for name, benchmark in benchmarks.items()
+        }
+
+
+def compare(results: dict[str, float], baseline: dict[str, float], threshold: float) -> bool:
+    """Print results next to the baseline, returning whether any regressed."""
+    regressed = False
+    print(f"{'benchmark':<20} {'baseline':>10} {'current':>10} {'change':>8}")
+    for name, current in results.items():
+        before = baseline.get(name)
+        if before is None:
+            print(f"{name:<20} {'-':>10} {current:8.1f}ms {'new':>8}")
+            continue
+        change = (current - before) / before
+        failed = current > before * (1 + threshold) and current - before > NOISE_MS
+        regressed |= failed
+        flag = "  REGRESSED" if failed else ""
+        print(f"{name:<20} {before:8.1f}ms {current:8.1f}ms {change:+8.0%}{flag}")
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=10, help="runs of each benchmark")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.25,
+        help="slowdown over the baseline counted as a regression (default: 0.25, i.e. 25%%)",
+    )
+    parser.add_argument("--baseline", type=Path, default=BASELINE, help="baseline JSON file")
+    parser.add_argument("--save", action="store_true", help="save results as the baseline")
+    args = parser.parse_args()
+
+    results = run(args.repeat)
+    if args.save:
+        baseline = {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "results_ms": results,
+        }
+        args.baseline.write_text(json.dumps(baseline, indent=2) + "\n")
+        for name, elapsed in results.items():
+            print(f"{name:<20} {elapsed:8.1f}ms")
+        print(f"saved to {args.baseline}")
+        return
+
+    if not args.baseline.exists():
+        sys.exit(f"No baseline at {args.baseline}, create one with --save")
+    baseline = json.loads(args.baseline.read_text())["results_ms"]
+    if compare(results, baseline, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
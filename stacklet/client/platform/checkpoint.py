@@ -0,0 +1,147 @@
+# Copyright Stacklet, Inc.
+# SPDX-License-Identifier: Apache-2.0
+
+"""
+On-disk checkpoints for resuming interrupted pagination.
+
+A checkpoint is kept under an ID chosen by the caller, as two files in the checkpoints
+directory: the pages fetched so far, appended one per line as they arrive, and a small
+state file with the cursor to continue from. The state is only replaced (atomically)
+once a page has been fully written, so a run interrupted at any point resumes from the
+last complete page.
+"""
+
+import json
+import os
+import re
+from pathlib import Path
+from typing import Any, Callable, Iterator
+
+from . import config
+from .config import JSONDict
+
+PageInfo = JSONDict | None
+Page = tuple[PageInfo, Any]
+
+_ID_RE = re.compile(r"^[A-Za-z0-9_-][A-Za-z0-9_.-]*$")
+
+
+class CheckpointMismatch(Exception):
+    """A checkpoint was saved for a different query than the one being resumed."""
+
+
+def validate_id(checkpoint_id: str) -> str:
+    """Check that a checkpoint ID is usable as a file name, returning it."""
+    if not _ID_RE.match(checkpoint_id):
+        raise ValueError(
+            f"Invalid checkpoint ID '{checkpoint_id}': use letters, digits, '-', '_' and '.'"
+        )
+    return checkpoint_id
+
+
+class Checkpoint:
+    """Progress of a paginated query, saved after each page."""
+
+    def __init__(self, directory: Path, checkpoint_id: str, query: JSONDict):
+        self.id = checkpoint_id
+        # as it reads back from the state file, to compare with the saved one
+        self.query = json.loads(json.dumps(query))
+        self._state_file = directory / f"{checkpoint_id}.json"
+        self._pages_file = directory / f"{checkpoint_id}.pages.jsonl"
+        self.cursor: str | None = None
+        self.pages = 0
+        self.finished = False
+        # length of the pages file up to the last complete page
+        self._offset = 0
+
+        if self._state_file.exists():
+            state = json.loads(self._state_file.read_text())
+            if state["query"] != self.query:
+                raise CheckpointMismatch(
+                    f"Checkpoint '{checkpoint_id}' was saved for a different query"
+                )
+            self.cursor = state["cursor"]
+            self.pages = state["pages"]
+            self.finished = state["finished"]
+            self._offset = state["offset"]
+
+    def saved_pages(self) -> Iterator[Page]:
+        """Yield the pages saved so far, as (page info, result) pairs."""
+        if not self.pages:
+            return
+        with self._pages_file.open("rb") as fd:
+            # anything past the offset is a page that was being written when the run
+            # was interrupted
+            for line in fd.read(self._offset).splitlines():
+                page_info, result = json.loads(line)
+                yield page_info, result
+
+    def record(self, page_info: PageInfo, result: Any):
+        """Save a page and move the checkpoint after it."""
+        self._state_file.parent.mkdir(parents=True, exist_ok=True)
+        with self._pages_file.open("ab") as fd:
+            fd.truncate(self._offset)
+            fd.write(json.dumps([page_info, result]).encode() + b"\n")
+            self._offset = fd.tell()
+        self.pages += 1
+        if page_info:
+            self.cursor = page_info["endCursor"]
+        self.finished = not (page_info and page_info["hasNextPage"])
+        self._save()
+
+    def remove(self):
+        """Delete the checkpoint files."""
+        self._state_file.unlink(missing_ok=True)
+        self._pages_file.unlink(missing_ok=True)
+
+    def _save(self):
+        state = {
+            "query": self.query,
+            "cursor": self.cursor,
+            "pages": self.pages,
+            "finished": self.finished,
+            "offset": self._offset,
+        }
+        tmp = self._state_file.with_name(self._state_file.name + ".tmp")
+        tmp.write_text(json.dumps(state))
+        os.replace(tmp, self._state_file)
+
+
+class CheckpointStore:
+    """Checkpoints kept in a directory, by default `~/.stacklet/checkpoints`."""
+
+    def __init__(self, directory: Path | None = None):
+        self._directory = directory
+
+    @property
+    def directory(self) -> Path:
+        if self._directory is not None:
+            return self._directory
+        return config.DEFAULT_CONFIG_DIR / "checkpoints"
+
+    def open(self, checkpoint_id: str, query: JSONDict) -> Checkpoint:
+        """
+        Return the checkpoint with the given ID, empty if it doesn't exist yet.
+
+        The query (snippet, variables and anything else affecting the saved pages)
+        must be the same as the one the checkpoint was saved with, otherwise
+        CheckpointMismatch is raised.
+        """
+        return Checkpoint(self.directory, validate_id(checkpoint_id), query)
+
+
+def resume(checkpoint: Checkpoint, fetch: Callable[[str | None], Iterator[Page]]) -> Iterator[Page]:
+    """
+    Yield the pages saved in a checkpoint, then the ones after them, saving each.
+
+    `fetch` is called with the cursor to continue after (None to start from the first
+    page) and must yield (page info, result) pairs. The checkpoint is removed once the
+    last page has been consumed; if fetching fails, or the consumer stops early, it's
+    kept for resuming later.
+    """
+    yield from checkpoint.saved_pages()
+    if not checkpoint.finished:
+        for page_info, result in fetch(checkpoint.cursor):
+            checkpoint.record(page_info, result)
+            yield page_info, result
+    checkpoint.remove()
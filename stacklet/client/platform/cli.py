@@ -5,18 +5,19 @@
 from urllib.parse import urlsplit, urlunsplit
 
 import click
-import jwt
-import requests
 
-from .cognito import CognitoUserManager
-from .commands import commands
+from .commands import COMMANDS
 from .config import DEFAULT_CONFIG_FILE, DEFAULT_OUTPUT_FORMAT, StackletConfig
 from .context import StackletContext
 from .formatter import FORMATTERS
-from .utils import expand_user_path, setup_logging
+from .graphql.cache import DEFAULT_TTL, ResponseCache
+from .utils import LazyGroup, expand_user_path, setup_logging
 
+# Heavy dependencies (boto3, jwt, requests) are imported by the commands using them,
+# to keep startup fast for the others.
 
-@click.group()
+
+@click.group(cls=LazyGroup, lazy_commands=COMMANDS)
 @click.option(
     "--config",
     type=click.Path(path_type=Path, dir_okay=False),
@@ -34,6 +35,29 @@
     show_envvar=True,
     help="Output type",
 )
+@click.option(
+    "--persisted-queries",
+    is_flag=True,
+    envvar="STACKLET_PERSISTED_QUERIES",
+    show_envvar=True,
+    help="Send query hashes instead of repeating full queries, if the server supports it",
+)
+@click.option(
+    "--cache",
+    is_flag=True,
+    envvar="STACKLET_CACHE",
+    show_envvar=True,
+    help="Cache query responses in ~/.stacklet/cache, discarding them after mutations",
+)
+@click.option(
+    "--cache-ttl",
+    type=click.FloatRange(min=0),
+    default=DEFAULT_TTL,
+    envvar="STACKLET_CACHE_TTL",
+    show_envvar=True,
+    show_default=True,
+    help="Seconds cached responses are used for",
+)
 @click.option(
     "-v",
     count=True,
@@ -45,6 +69,9 @@ def cli(
     ctx,
     config,
     output,
+    persisted_queries,
+    cache,
+    cache_ttl,
     v,
 ):
     """
@@ -108,9 +135,25 @@ def cli(
             --after $after_token \\
             list
     \b
+
+    To fetch all pages, writing out results as they arrive (one JSON document per line
+    with JSON output):
+
+        $ stacklet-admin --output json account list --all
+
+    CSV and table output have a row per result, with nested fields flattened into
+    dotted columns (e.g. accountGroup.name). Columns are picked from the first 100
+    results, so output streams with bounded memory:
+
+        $ stacklet-admin --output csv account list --all > accounts.csv
     """
     setup_logging(v)
-    ctx.obj = StackletContext(config_file=config, output_format=output)
+    ctx.obj = StackletContext(
+        config_file=config,
+        output_format=output,
+        persisted_queries=persisted_queries,
+        cache=ResponseCache(ttl=cache_ttl) if cache else None,
+    )
 
 
 @cli.command(short_help="Configure stacklet-admin cli")
@@ -224,6 +267,8 @@ def auto_configure(url, prefix, idp, location):
             # Be forgiving if we get a base URL like customer.stacklet.io
             host = f"console.{host}"
 
+    import requests
+
     config = {}
     try:
         for config_path in ("config/cognito.json", "config/cubejs.json"):
@@ -301,6 +346,8 @@ def show(obj):
     """
     fmt = obj.formatter()
     if id_token := obj.credentials.id_token():
+        import jwt
+
         id_details = jwt.decode(id_token, options={"verify_signature": False})
         click.echo(fmt(id_details))
         click.echo()
@@ -349,6 +396,8 @@ def login(ctx, username, password):
         username = click.prompt("Username")
     if not password:
         password = click.prompt("Password", hide_input=True)
+    from .cognito import CognitoUserManager
+
     manager = CognitoUserManager.from_context(context)
     id_token, access_token = manager.login(
         user=username,
@@ -357,9 +406,5 @@ def login(ctx, username, password):
     context.credentials.write(id_token, access_token)
 
 
-for c in commands:
-    cli.add_command(c)
-
-
 if __name__ == "__main__":
     cli()
@@ -3,18 +3,38 @@
 
 # Stacklet Platform API client based on the CLI
 
+import copy
+from contextlib import closing
 from functools import cached_property
 from itertools import chain
-from typing import Any
+from pathlib import Path
+from typing import Any, AsyncIterator, Generator, Iterable, Iterator, TypeVar
 
 import jmespath
+import requests
 
 from . import config
+from .checkpoint import CheckpointStore, resume
 from .config import JSONDict
 from .context import StackletContext
 from .exceptions import MissingConfigException
-from .graphql import GRAPHQL_SNIPPETS, GraphQLExecutor, GraphQLSnippet
-from .utils import PAGINATION_OPTIONS
+from .graphql import (
+    GRAPHQL_SNIPPETS,
+    AsyncGraphQLExecutor,
+    GraphQLExecutor,
+    GraphQLSnippet,
+)
+from .graphql.async_executor import DEFAULT_CONCURRENCY
+from .graphql.batch import DEFAULT_BATCH_SIZE
+from .graphql.cache import ResponseCache
+from .graphql.snippet import count_snippet, profiled_snippet, projected_snippet
+from .graphql.snippets import ShowPolicy
+from .mirror import Mirror
+from .pagination import AdaptivePageSize, prefetch
+from .utils import DEFAULT_PAGE_SIZE, PAGINATION_OPTIONS
+
+T = TypeVar("T")
+M = TypeVar("M", bound="_BaseSnippetMethod")
 
 
 class PlatformApiError(Exception):
@@ -28,13 +48,43 @@ class PlatformTokenExpired(PlatformApiError):
 class StackletPlatformClient:
     """Client to the Stacklet Platform API."""
 
-    def __init__(self, executor: GraphQLExecutor, pager: bool = False, expr: bool = False):
+    def __init__(
+        self,
+        executor: GraphQLExecutor,
+        pager: bool = False,
+        expr: bool = False,
+        prefetch: int = 0,
+        adaptive_page_size: AdaptivePageSize | None = None,
+        checkpoints: CheckpointStore | None = None,
+        mirror_path: Path | None = None,
+    ):
+        self.mirror = Mirror(executor, mirror_path)
+        self.policy_sources = PolicySources(executor)
+        checkpoints = checkpoints or CheckpointStore()
         for snippet in GRAPHQL_SNIPPETS:
-            method = _SnippetMethod(snippet, executor, pager, expr)
+            method = _SnippetMethod(
+                snippet,
+                executor,
+                pager,
+                expr,
+                prefetch=prefetch,
+                adaptive_page_size=adaptive_page_size,
+                checkpoints=checkpoints,
+            )
             setattr(self, method.name, method)
 
 
-def platform_client(pager: bool = False, expr: bool = False) -> StackletPlatformClient:
+def platform_client(
+    pager: bool = False,
+    expr: bool = False,
+    persisted_queries: bool = False,
+    prefetch: int = 0,
+    adaptive_page_size: AdaptivePageSize | bool = False,
+    timeout: float | None = None,
+    checkpoint_dir: Path | None = None,
+    cache: ResponseCache | bool = False,
+    mirror_path: Path | None = None,
+) -> StackletPlatformClient:
     """
     Return a client for the Stacklet Platform API.
 
@@ -48,6 +98,27 @@ def platform_client(pager: bool = False, expr: bool = False) -> StackletPlatform
         expr: Enable result transformation using JMESPath expressions. When True,
             methods will extract and return simplified data structures instead of
             raw GraphQL responses. Default: False
+        persisted_queries: Send the full text of each query only the first time,
+            which registers it on the server, and just its hash after that.
+            Requires server support for automatic persisted queries. Default: False
+        prefetch: When following pagination, request up to this many of the next
+            pages in a background thread while the current one is being consumed.
+            Default: 0 (fetch a page only when it's needed)
+        adaptive_page_size: When following pagination without an explicit `first`
+            or `last`, size each page based on how quickly and how big the previous
+            one came back, growing it up to the snippet's ceiling. Pass True for the
+            default targets, or an `AdaptivePageSize` to tune them. Default: False
+        timeout: Seconds to wait for the API to respond before giving up. With
+            adaptive page sizes, a page that times out is retried smaller.
+            Default: None (wait indefinitely)
+        checkpoint_dir: Directory where pagination checkpoints are saved, for calls
+            passing `checkpoint=<id>`. Default: ~/.stacklet/checkpoints
+        cache: Cache query responses on disk, in ~/.stacklet/cache, discarding
+            them when a mutation changes the entities they're about. Pass True for
+            the default TTL and size, or a `ResponseCache` to tune them.
+            Default: False
+        mirror_path: SQLite database for the client's local inventory mirror, see
+            `client.mirror`. Default: ~/.stacklet/mirror.db
 
     Returns:
         StackletPlatformClient: A configured client instance with methods for
@@ -62,53 +133,179 @@ def platform_client(pager: bool = False, expr: bool = False) -> StackletPlatform
         >>> # With automatic pagination
         >>> client = platform_client(pager=True)
         >>> all_accounts = client.list_accounts()  # Fetches all pages
+        >>> # Streaming, one page at a time
+        >>> for account in client.list_accounts.iter_items():
+        ...     print(account["name"])
+        >>> # Resumable, running it again after a failure continues where it stopped
+        >>> all_policies = client.list_policies(checkpoint="policies-export")
+        >>> # Only selecting some fields of results
+        >>> client.list_policies(fields=["uuid", "name", "provider"])
+        >>> # Listings leave policy sources out, fetched in batches for those read
+        >>> for policy in client.list_policies.iter_items():
+        ...     source = client.policy_sources.get(policy["uuid"])
+        >>> # Offline queries on a local copy of the inventory
+        >>> client.mirror.sync()
+        >>> client.mirror.find("policies", resource_type="aws.s3")
     """
-    context = StackletContext(config_file=config.DEFAULT_CONFIG_FILE)
+    if cache is True:
+        cache = ResponseCache()
+    context = StackletContext(
+        config_file=config.DEFAULT_CONFIG_FILE,
+        persisted_queries=persisted_queries,
+        cache=cache or None,
+    )
     if not context.config_file.exists() or not context.credentials.api_token():
         raise MissingConfigException("Please configure and authenticate on stacklet-admin cli")
 
-    return StackletPlatformClient(context.executor, pager=pager, expr=expr)
+    executor = context.executor
+    executor.timeout = timeout
+    if adaptive_page_size is True:
+        adaptive_page_size = AdaptivePageSize()
+    return StackletPlatformClient(
+        executor,
+        pager=pager,
+        expr=expr,
+        prefetch=prefetch,
+        adaptive_page_size=adaptive_page_size or None,
+        checkpoints=CheckpointStore(checkpoint_dir),
+        mirror_path=mirror_path,
+    )
+
+
+class PolicySources:
+    """
+    Policy sources, fetched on demand.
 
+    Policy listings leave the YAML source out by default, as it's most of their size.
+    Sources are fetched here only for the policies they're asked for, in batched
+    requests, and kept once fetched. Policies whose source will be needed can be
+    queued with `request()`, to be fetched together with the next one asked for.
+    """
 
-class _SnippetMethod:
-    def __init__(
-        self,
-        snippet_class: type[GraphQLSnippet],
-        executor: GraphQLExecutor,
-        pager: bool,
-        expr: bool,
-    ):
-        self.name = snippet_class.name.replace("-", "_")
-        self.snippet_class = snippet_class
+    def __init__(self, executor: GraphQLExecutor, batch_size: int = DEFAULT_BATCH_SIZE):
         self.executor = executor
-        self._page_expr = snippet_class.pagination_expr if pager else None
-        self._result_expr = snippet_class.result_expr if expr else None
+        self.batch_size = batch_size
+        self._sources: dict[str, str | None] = {}
+        self._requested: dict[str, None] = {}
+
+    def request(self, uuids: Iterable[str]):
+        """Queue policies whose source will be asked for, to fetch them in a batch."""
+        for uuid in uuids:
+            if uuid not in self._sources:
+                self._requested[uuid] = None
+
+    def get(self, uuid: str) -> str | None:
+        """The source of a policy, None if there's no such policy."""
+        if uuid not in self._sources:
+            self.request([uuid])
+            self._fetch()
+        return self._sources[uuid]
+
+    def fetch(self, uuids: Iterable[str]) -> dict[str, str | None]:
+        """The sources of several policies, fetching the missing ones in batches."""
+        uuids = list(uuids)
+        self.request(uuids)
+        self._fetch()
+        return {uuid: self._sources[uuid] for uuid in uuids}
+
+    def _fetch(self):
+        uuids = list(self._requested)
+        self._requested.clear()
+        snippet_class = projected_snippet(ShowPolicy, ("source",))
+        results = self.executor.run_many(
+            snippet_class,
+            [{"name": None, "uuid": uuid} for uuid in uuids],
+            batch_size=self.batch_size,
+        )
+        for uuid, result in zip(uuids, results):
+            if result.get("errors"):
+                raise PlatformApiError(result["errors"])
+            self._sources[uuid] = jmespath.search("data.policy.source", result)
+
+
+class AsyncStackletPlatformClient:
+    """Client to the Stacklet Platform API, with methods returning coroutines."""
+
+    def __init__(self, executor: AsyncGraphQLExecutor, pager: bool = False, expr: bool = False):
+        self.executor = executor
+        for snippet in GRAPHQL_SNIPPETS:
+            method = _AsyncSnippetMethod(snippet, executor, pager, expr)
+            setattr(self, method.name, method)
 
-        self.__name__ = self.name
-        self.__doc__ = self._doc()
+    def close(self):
+        """Release the executor's workers and connections."""
+        self.executor.close()
 
-    def __call__(self, **kwargs):
-        """Call the snippet."""
-        params = self._defaults | kwargs
-        page_info, result = self._run_snippet(params)
+    async def __aenter__(self) -> "AsyncStackletPlatformClient":
+        await self.executor.__aenter__()
+        return self
 
-        # no pagination, just return the result
-        if not page_info:
-            return result
+    async def __aexit__(self, *exc_info):
+        await self.executor.__aexit__(*exc_info)
 
-        # pagination enabled, collect all pages
-        pages = [result]
 
-        while page_info and page_info["hasNextPage"]:
-            params["after"] = page_info["endCursor"]
-            page_info, result = self._run_snippet(params)
-            pages.append(result)
+def async_platform_client(
+    pager: bool = False, expr: bool = False, concurrency: int = DEFAULT_CONCURRENCY
+) -> AsyncStackletPlatformClient:
+    """
+    Return an asyncio client for the Stacklet Platform API.
+
+    Methods are the same as for `platform_client`, but they return coroutines, so many
+    calls can be in flight at once from a single event loop.
+
+    Args:
+        pager: Enable automatic pagination handling, see `platform_client`.
+        expr: Enable result transformation using JMESPath expressions, see
+            `platform_client`.
+        concurrency: Maximum number of requests in flight at the same time. Calls
+            beyond this wait for a free slot. Default: 50
+
+    Example:
+        >>> async with async_platform_client(expr=True, concurrency=100) as client:
+        ...     accounts = await asyncio.gather(
+        ...         *(client.show_account(provider="AWS", key=key) for key in keys)
+        ...     )
+    """
+    context = StackletContext(config_file=config.DEFAULT_CONFIG_FILE)
+    token = context.credentials.api_token()
+    if not context.config_file.exists() or not token:
+        raise MissingConfigException("Please configure and authenticate on stacklet-admin cli")
+
+    executor = AsyncGraphQLExecutor(context.config.api, token, concurrency=concurrency)
+    return AsyncStackletPlatformClient(executor, pager=pager, expr=expr)
+
+
+class _Remaining:
+    """Items left to fetch before reaching a limit, shared by the stages of a call."""
+
+    def __init__(self, items: int):
+        self.items = items
 
-        # if expr is enabled, flatten the results in a single list
-        if self._result_expr:
-            return list(chain(*pages))
 
-        return pages
+class _BaseSnippetMethod:
+    """What's common to client methods, whether they run snippets sync or async."""
+
+    # Whether the method's snippet already selects the fields asked for
+    _selected = False
+
+    def __init__(self, snippet_class: type[GraphQLSnippet], pager: bool, expr: bool):
+        self.name = snippet_class.name.replace("-", "_")
+        self.snippet_class = snippet_class
+        self._page_expr = snippet_class.pagination_expr if pager else None
+        self._result_expr = snippet_class.result_expr if expr else None
+
+        self.__name__ = self.name
+        self.__doc__ = self._doc()
+
+    def _selecting(self: M, fields: Iterable[str] | None, profile: str | None) -> M:
+        """The method for the snippet selecting the given fields, or profile, of results."""
+        method = copy.copy(self)
+        if fields is not None:
+            method.snippet_class = projected_snippet(self.snippet_class, tuple(fields))
+        else:
+            method.snippet_class = profiled_snippet(self.snippet_class, profile)
+        method._selected = True
+        return method
 
     @cached_property
     def _defaults(self) -> dict[str, Any]:
@@ -122,24 +319,25 @@ def _defaults(self) -> dict[str, Any]:
 
         return defaults
 
-    def _run_snippet(self, params: JSONDict) -> tuple[JSONDict | None, JSONDict]:
-        """
-        Run the snippet, returning the pagination info (if available) and
-        possibly filtered result.
-        """
-        result = self.executor.run_snippet(self.snippet_class, variables=params)
+    def _process(
+        self, result: JSONDict, page_expr: str | None, result_expr: str | None
+    ) -> tuple[JSONDict | None, Any]:
+        """Check a snippet result for errors and extract pagination info and data."""
         if result == {"message": "The incoming token has expired"}:
             # would be nicer off the 401 status code
-            raise PlatformTokenExpired()
+            raise PlatformTokenExpired(result["message"])
+        if "message" in result and "data" not in result:
+            # not a GraphQL result at all, e.g. a gateway error
+            raise PlatformApiError(result["message"])
         if result.get("errors"):
             raise PlatformApiError(result["errors"])
 
         page_info = None
-        if self._page_expr:
-            page_info = jmespath.search(self._page_expr, result)
+        if page_expr:
+            page_info = jmespath.search(page_expr, result)
 
-        if self._result_expr:
-            result = jmespath.search(self._result_expr, result)
+        if result_expr:
+            result = jmespath.search(result_expr, result)
 
         return page_info, result
 
@@ -165,3 +363,366 @@ def _doc(self) -> str:
                 lines.append(f" - {param}: {details['help']}")
             lines.append("")
         return "\n".join(lines)
+
+
+class _SnippetMethod(_BaseSnippetMethod):
+    def __init__(
+        self,
+        snippet_class: type[GraphQLSnippet],
+        executor: GraphQLExecutor,
+        pager: bool,
+        expr: bool,
+        prefetch: int = 0,
+        adaptive_page_size: AdaptivePageSize | None = None,
+        checkpoints: CheckpointStore | None = None,
+    ):
+        super().__init__(snippet_class, pager, expr)
+        self.executor = executor
+        self.prefetch = prefetch
+        self.adaptive_page_size = adaptive_page_size
+        self.checkpoints = checkpoints or CheckpointStore()
+
+    def __call__(
+        self,
+        *,
+        checkpoint: str | None = None,
+        limit: int | None = None,
+        fields: Iterable[str] | None = None,
+        profile: str | None = None,
+        **kwargs,
+    ):
+        """
+        Call the snippet.
+
+        With pagination enabled, passing a `checkpoint` ID saves each page as it's
+        fetched, so that calling again with the same ID and parameters after a
+        failure only fetches the pages that are missing.
+
+        A `limit` caps the number of results: pages are sized so that no more than
+        that are requested, and pagination stops once it's reached.
+
+        With `fields` (paths in the result nodes, e.g. `["uuid", "commit.hash"]`), the
+        query only selects those, so the server does less work and responses are
+        smaller. Otherwise, the fields selected are those of a `profile`: "minimal",
+        "standard" (the default for listings, leaving out heavy fields like policy
+        sources) or "full" (the default otherwise).
+        """
+        if not self._selected:
+            method = self._selecting(fields, profile)
+            return method(checkpoint=checkpoint, limit=limit, **kwargs)
+        pages = self._iter_pages(kwargs, self._page_expr, self._result_expr, checkpoint, limit)
+        with closing(self._prefetch(pages, None)) as pages:
+            page_info, result = next(pages)
+
+            # no pagination, just return the result
+            if not page_info:
+                return result
+
+            # pagination enabled, collect all pages
+            results = [result, *(result for _, result in pages)]
+
+        # if expr is enabled, flatten the results in a single list
+        if self._result_expr:
+            return list(chain(*results))
+
+        return results
+
+    def iter_pages(
+        self,
+        *,
+        prefetch: int | None = None,
+        checkpoint: str | None = None,
+        limit: int | None = None,
+        fields: Iterable[str] | None = None,
+        profile: str | None = None,
+        **kwargs,
+    ) -> Iterator[Any]:
+        """
+        Call the snippet, yielding each page of results as it's fetched.
+
+        Pagination is always followed. Without prefetching, the next page is only
+        requested once the previous one has been consumed, so stopping early skips
+        the rest; `prefetch` overrides the client's prefetch depth. Pages are
+        filtered by the result expression if the client has `expr` enabled.
+
+        With a `checkpoint` ID, pages saved by a previous interrupted run with the
+        same ID are yielded first, and fetching continues after them. With a `limit`,
+        pages stop once that many results have been fetched. Fields of results are
+        selected by `fields` or `profile`, as when calling the snippet.
+        """
+        if not self._selected:
+            method = self._selecting(fields, profile)
+            yield from method.iter_pages(
+                prefetch=prefetch, checkpoint=checkpoint, limit=limit, **kwargs
+            )
+            return
+        page_expr = self.snippet_class.pagination_expr
+        pages = self._iter_pages(kwargs, page_expr, self._result_expr, checkpoint, limit)
+        for _, result in self._prefetch(pages, prefetch):
+            yield result
+
+    def iter_items(
+        self,
+        *,
+        prefetch: int | None = None,
+        checkpoint: str | None = None,
+        limit: int | None = None,
+        fields: Iterable[str] | None = None,
+        profile: str | None = None,
+        **kwargs,
+    ) -> Iterator[Any]:
+        """
+        Call the snippet, yielding each result item (e.g. account nodes for
+        `list_accounts`) as its page is fetched, up to `limit` items if given. Fields
+        of results are selected by `fields` or `profile`, as when calling the snippet.
+        """
+        if not self._selected:
+            method = self._selecting(fields, profile)
+            yield from method.iter_items(
+                prefetch=prefetch, checkpoint=checkpoint, limit=limit, **kwargs
+            )
+            return
+        page_expr = self.snippet_class.pagination_expr
+        result_expr = self.snippet_class.result_expr
+        pages = self._iter_pages(kwargs, page_expr, result_expr, checkpoint, limit)
+        for _, result in self._prefetch(pages, prefetch):
+            yield from _items(result, result_expr)
+
+    def count(self) -> int:
+        """
+        Return the total number of items in the listing, e.g. accounts for
+        `list_accounts`, without fetching any of them.
+        """
+        snippet_class = count_snippet(self.snippet_class)
+        result = self.executor.run_snippet(snippet_class)
+        _, total = self._process(result, None, snippet_class.result_expr)
+        return total
+
+    def _prefetch(self, pages: Iterator[T], depth: int | None) -> Generator[T, None, None]:
+        return prefetch(pages, self.prefetch if depth is None else depth)
+
+    def _iter_pages(
+        self,
+        kwargs: JSONDict,
+        page_expr: str | None,
+        result_expr: str | None,
+        checkpoint: str | None = None,
+        limit: int | None = None,
+    ) -> Iterator[tuple[JSONDict | None, Any]]:
+        """
+        Run the snippet, following pagination if a page expression is given, and
+        yield pagination info and (possibly filtered) result for each page.
+
+        With a checkpoint ID, pages are saved as they're fetched, and the ones saved
+        by an earlier run are yielded before fetching the rest.
+        """
+        params = self._defaults | kwargs
+        remaining = None
+        if limit is not None:
+            if self.snippet_class.pagination_expr is None:
+                raise ValueError(f"{self.name} isn't paginated, it can't be limited")
+            if limit < 1:
+                raise ValueError("limit must be at least 1")
+            remaining = _Remaining(limit)
+
+        if checkpoint is None:
+            pages = self._follow(params, kwargs, page_expr, result_expr, remaining)
+        else:
+            if not page_expr:
+                raise ValueError(
+                    f"{self.name} isn't following pagination, it can't be checkpointed"
+                )
+            query = {"snippet": self.snippet_class.name, "variables": params, "expr": result_expr}
+            saved = self.checkpoints.open(checkpoint, query)
+
+            def fetch(cursor: str | None) -> Iterator[tuple[JSONDict | None, Any]]:
+                start = params if cursor is None else params | {"after": cursor}
+                return self._follow(start, kwargs, page_expr, result_expr, remaining)
+
+            pages = resume(saved, fetch)
+
+        if remaining is None:
+            return pages
+        return self._count_down(pages, result_expr, remaining)
+
+    def _follow(
+        self,
+        params: JSONDict,
+        kwargs: JSONDict,
+        page_expr: str | None,
+        result_expr: str | None,
+        remaining: _Remaining | None = None,
+    ) -> Iterator[tuple[JSONDict | None, Any]]:
+        params = dict(params)
+        # "last" overrides "first", so a limit caps whichever sizes pages
+        size_param = "last" if params.get("last") else "first"
+        page_size: int = params.get(size_param) or DEFAULT_PAGE_SIZE
+        sizer = self._page_sizer(kwargs, page_expr)
+        while remaining is None or remaining.items > 0:
+            if sizer is None:
+                if remaining is not None:
+                    params[size_param] = min(remaining.items, page_size)
+                page_info, result = self._run_snippet(params, page_expr, result_expr)
+            else:
+                page_info, result = self._run_sized(
+                    sizer, params, page_expr, result_expr, remaining
+                )
+            yield page_info, result
+            if not page_info or not page_info["hasNextPage"]:
+                return
+            params["after"] = page_info["endCursor"]
+
+    def _count_down(
+        self,
+        pages: Iterator[tuple[JSONDict | None, Any]],
+        result_expr: str | None,
+        remaining: _Remaining,
+    ) -> Iterator[tuple[JSONDict | None, Any]]:
+        """Count the items in pages as they're yielded, towards a limit."""
+        for page_info, result in pages:
+            if not result_expr:
+                items = jmespath.search(self.snippet_class.result_expr, result)
+            else:
+                items = result
+            remaining.items -= len(items or ())
+            yield page_info, result
+
+    def _page_sizer(self, kwargs: JSONDict, page_expr: str | None) -> AdaptivePageSize | None:
+        """A page sizer for following pagination, unless page sizes are fixed."""
+        if self.adaptive_page_size is None or not page_expr:
+            return None
+        if kwargs.get("first") or kwargs.get("last"):
+            # the caller asked for a specific page size
+            return None
+        return self.adaptive_page_size.for_snippet(self.snippet_class)
+
+    def _run_sized(
+        self,
+        sizer: AdaptivePageSize,
+        params: JSONDict,
+        page_expr: str | None,
+        result_expr: str | None,
+        remaining: _Remaining | None = None,
+    ) -> tuple[JSONDict | None, Any]:
+        """Run the snippet for a page sized by the sizer, shrinking it on timeouts."""
+        while True:
+            params["first"] = sizer.size
+            if remaining is not None:
+                params["first"] = min(remaining.items, sizer.size)
+            # a page that can still shrink is retried smaller on timeouts, rather than
+            # at the same size by the executor
+            retry_timeouts = sizer.size <= sizer.minimum
+            try:
+                with self.executor.read_timeout_retries(retry_timeouts):
+                    result = self._run_snippet(params, page_expr, result_expr)
+            except requests.Timeout:
+                if not sizer.shrink():
+                    raise
+                continue
+            stats = self.executor.last_response
+            if stats is not None:
+                sizer.record(stats.elapsed, stats.size)
+            return result
+
+    def _run_snippet(
+        self, params: JSONDict, page_expr: str | None, result_expr: str | None
+    ) -> tuple[JSONDict | None, Any]:
+        """
+        Run the snippet, returning the pagination info (if available) and
+        possibly filtered result.
+        """
+        result = self.executor.run_snippet(self.snippet_class, variables=params)
+        return self._process(result, page_expr, result_expr)
+
+
+class _AsyncSnippetMethod(_BaseSnippetMethod):
+    def __init__(
+        self,
+        snippet_class: type[GraphQLSnippet],
+        executor: AsyncGraphQLExecutor,
+        pager: bool,
+        expr: bool,
+    ):
+        super().__init__(snippet_class, pager, expr)
+        self.executor = executor
+
+    async def __call__(
+        self, *, fields: Iterable[str] | None = None, profile: str | None = None, **kwargs
+    ):
+        """Call the snippet, selecting fields of results as the sync client does."""
+        if not self._selected:
+            return await self._selecting(fields, profile)(**kwargs)
+        pages = self._iter_pages(kwargs, self._page_expr, self._result_expr)
+        page_info, result = await anext(pages)
+
+        if not page_info:
+            return result
+
+        # pages are fetched in sequence, since each needs the previous one's cursor
+        results = [result, *[result async for _, result in pages]]
+
+        if self._result_expr:
+            return list(chain(*results))
+
+        return results
+
+    async def iter_pages(
+        self, *, fields: Iterable[str] | None = None, profile: str | None = None, **kwargs
+    ) -> AsyncIterator[Any]:
+        """Call the snippet, yielding each page of results as it's fetched."""
+        if not self._selected:
+            async for page in self._selecting(fields, profile).iter_pages(**kwargs):
+                yield page
+            return
+        page_expr = self.snippet_class.pagination_expr
+        async for _, result in self._iter_pages(kwargs, page_expr, self._result_expr):
+            yield result
+
+    async def iter_items(
+        self, *, fields: Iterable[str] | None = None, profile: str | None = None, **kwargs
+    ) -> AsyncIterator[Any]:
+        """Call the snippet, yielding each result item as its page is fetched."""
+        if not self._selected:
+            async for item in self._selecting(fields, profile).iter_items(**kwargs):
+                yield item
+            return
+        page_expr = self.snippet_class.pagination_expr
+        result_expr = self.snippet_class.result_expr
+        async for _, result in self._iter_pages(kwargs, page_expr, result_expr):
+            for item in _items(result, result_expr):
+                yield item
+
+    async def count(self) -> int:
+        """Return the total number of items in the listing."""
+        snippet_class = count_snippet(self.snippet_class)
+        result = await self.executor.run_snippet(snippet_class)
+        _, total = self._process(result, None, snippet_class.result_expr)
+        return total
+
+    async def _iter_pages(
+        self, kwargs: JSONDict, page_expr: str | None, result_expr: str | None
+    ) -> AsyncIterator[tuple[JSONDict | None, Any]]:
+        params = self._defaults | kwargs
+        while True:
+            page_info, result = await self._run_snippet(params, page_expr, result_expr)
+            yield page_info, result
+            if not page_info or not page_info["hasNextPage"]:
+                return
+            params["after"] = page_info["endCursor"]
+
+    async def _run_snippet(
+        self, params: JSONDict, page_expr: str | None, result_expr: str | None
+    ) -> tuple[JSONDict | None, Any]:
+        result = await self.executor.run_snippet(self.snippet_class, variables=params)
+        return self._process(result, page_expr, result_expr)
+
+
+def _items(result: Any, result_expr: str | None) -> Iterator[Any]:
+    """The items in a page of results."""
+    if result is None:
+        return
+    if result_expr and isinstance(result, list):
+        yield from result
+    else:
+        # not a listing, the result is the only item
+        yield result
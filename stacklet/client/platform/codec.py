@@ -0,0 +1,157 @@
+# Copyright Stacklet, Inc.
+# SPDX-License-Identifier: Apache-2.0
+
+"""
+JSON encoding and decoding for API requests and responses.
+
+A faster JSON library is used when one is installed (orjson, then ujson), with the
+standard library as fallback.
+"""
+
+import codecs
+import importlib
+import json
+import re
+from itertools import chain
+from typing import Any, Iterable, Iterator
+
+
+class JSONCodec:
+    """Encode and decode JSON with the standard library."""
+
+    name = "json"
+
+    def dumps(self, value: Any) -> bytes:
+        return json.dumps(value, separators=(",", ":")).encode()
+
+    def loads(self, data: bytes | str) -> Any:
+        return json.loads(data)
+
+
+class OrjsonCodec(JSONCodec):
+    name = "orjson"
+
+    def __init__(self):
+        # optional and not a declared dependency, hence imported by name
+        self._orjson = importlib.import_module("orjson")
+
+    def dumps(self, value: Any) -> bytes:
+        return self._orjson.dumps(value)
+
+    def loads(self, data: bytes | str) -> Any:
+        return self._orjson.loads(data)
+
+
+class UjsonCodec(JSONCodec):
+    name = "ujson"
+
+    def __init__(self):
+        self._ujson = importlib.import_module("ujson")
+
+    def dumps(self, value: Any) -> bytes:
+        return self._ujson.dumps(value, ensure_ascii=False).encode()
+
+    def loads(self, data: bytes | str) -> Any:
+        return self._ujson.loads(data)
+
+
+CODECS: dict[str, type[JSONCodec]] = {
+    codec.name: codec for codec in (OrjsonCodec, UjsonCodec, JSONCodec)
+}
+
+
+def get_codec(name: str | None = None) -> JSONCodec:
+    """
+    Return the named codec, or the fastest one available if no name is given.
+
+    Raises ImportError if the library for a named codec isn't installed.
+    """
+    if name is not None:
+        return CODECS[name]()
+    for codec in CODECS.values():
+        try:
+            return codec()
+        except ImportError:
+            continue
+    return JSONCodec()
+
+
+# JSON tokens, each after any whitespace: a string (or, at the end of the text, the start
+# of one), an empty object or array, a structural character, or a literal (a number,
+# true, false or null).
+_TOKENS = re.compile(
+    r'\s*("[^"\\]*(?:\\.[^"\\]*)*"|"[^"\\]*(?:\\.[^"\\]*)*\\?\Z'
+    r"|\{\s*\}|\[\s*\]|[{}\[\],:]|[^\s{}\[\],:\"]+)"
+)
+_STRING = re.compile(r'"[^"\\]*(?:\\.[^"\\]*)*"')
+_NON_ASCII = re.compile(r"[^\x00-\x7f]")
+
+
+def reformat(chunks: Iterable[bytes], indent: int | None = None) -> Iterator[str]:
+    """
+    Reformat a UTF-8 JSON document read in chunks as `json.dumps(value, indent=indent)`
+    would write it, without decoding it.
+
+    Text is yielded as each chunk is reformatted, so memory use doesn't grow with the
+    document. Escapes and numbers are kept as written (e.g. "\\u00E9" or 1E3), but
+    otherwise the output is the same as json.dumps'. Raises ValueError if the
+    document is cut short.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    if indent is None:
+        newlines = [""] * 2
+        separators = [", "] * 2
+    else:
+        newlines = ["\n" + " " * (indent * depth) for depth in range(2)]
+        separators = ["," + newline for newline in newlines]
+    depth = 0
+    rest = ""
+
+    for chunk in chain(chunks, [None]):
+        final = chunk is None
+        text = rest + decoder.decode(chunk or b"", final)
+        tokens = _TOKENS.findall(text)
+        # the last token may go on in the next chunk
+        rest = "" if final or not tokens else tokens.pop()
+        escape = not text.isascii()
+        out = []
+        for token in tokens:
+            first = token[0]
+            if first == '"':
+                out.append(_NON_ASCII.sub(_escape, token) if escape else token)
+            elif first == ",":
+                out.append(separators[depth])
+            elif first == ":":
+                out.append(": ")
+            elif len(token) > 1 and first in "{[":
+                # empty
+                out.append("{}" if first == "{" else "[]")
+            elif first in "{[":
+                depth += 1
+                if depth == len(newlines):
+                    newline = "" if indent is None else "\n" + " " * (indent * depth)
+                    newlines.append(newline)
+                    separators.append("," + newline if newline else ", ")
+                out.append(first)
+                out.append(newlines[depth])
+            elif first in "]}":
+                depth -= 1
+                out.append(newlines[depth])
+                out.append(first)
+            else:
+                out.append(token)
+        if out:
+            yield "".join(out)
+
+    if depth or (tokens and tokens[-1][0] == '"' and not _STRING.fullmatch(tokens[-1])):
+        raise ValueError("The JSON document is incomplete")
+
+
+def _escape(match: re.Match) -> str:
+    """Escape a non-ASCII character as json.dumps does."""
+    code = ord(match.group())
+    if code > 0xFFFF:
+        # a surrogate pair
+        code -= 0x10000
+        return "\\u%04x\\u%04x" % (0xD800 | (code >> 10), 0xDC00 | (code & 0x3FF))
+    return "\\u%04x" % code
@@ -1,24 +1,26 @@
 # Copyright Stacklet, Inc.
 # SPDX-License-Identifier: Apache-2.0
 
-from .account import account
-from .account_group import account_group
-from .binding import binding
-from .cube import cubejs
-from .graphql import graphql
-from .policy import policy
-from .policy_collection import policy_collection
-from .repository import repository
-from .user import user
-
-commands = [
-    account,
-    account_group,
-    binding,
-    cubejs,
-    graphql,
-    policy,
-    policy_collection,
-    repository,
-    user,
-]
+# Command groups, imported only when they're run (see LazyGroup). Each maps to where
+# it's defined and the short help listed for it by `stacklet-admin --help`, which must
+# match the group's own.
+COMMANDS = {
+    "account": (f"{__name__}.account:account", "Run account queries/mutations"),
+    "account-group": (
+        f"{__name__}.account_group:account_group",
+        "Run account group queries/mutations",
+    ),
+    "batch": (f"{__name__}.batch:batch", "Run many commands in one process"),
+    "binding": (f"{__name__}.binding:binding", "Run binding queries/mutations"),
+    "cubejs": (f"{__name__}.cube:cubejs", "Run arbitrary cubejs queries"),
+    "daemon": (f"{__name__}.daemon:daemon", "Warm process running CLI commands"),
+    "graphql": (f"{__name__}.graphql:graphql", "Run arbitrary graphql snippets"),
+    "mirror": (f"{__name__}.mirror:mirror", "Local SQLite mirror of the platform inventory"),
+    "policy": (f"{__name__}.policy:policy", "Run policy queries"),
+    "policy-collection": (
+        f"{__name__}.policy_collection:policy_collection",
+        "Run policy collection queries/mutations",
+    ),
+    "repository": (f"{__name__}.repository:repository", "Run repository queries/mutations"),
+    "user": (f"{__name__}.user:user", "Run user queries/mutations"),
+}
@@ -1,10 +1,26 @@
 # Copyright Stacklet, Inc.
 # SPDX-License-Identifier: Apache-2.0
 
+import csv
+import json
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Iterable, Iterator, TextIO
 
 import click
+import jmespath
+import requests
+from requests.adapters import DEFAULT_POOLSIZE
 
-from ..graphql.cli import GraphQLCommand, register_graphql_commands, run_graphql, snippet_options
+from ..config import JSONDict
+from ..graphql import GraphQLExecutor
+from ..graphql.cli import (
+    GraphQLCommand,
+    echo_graphql,
+    register_graphql_commands,
+    snippet_options,
+)
 from ..graphql.snippets import (
     AddAccount,
     ListAccounts,
@@ -51,4 +67,241 @@ def validate_all(obj, **kwargs):
         for r in result["data"]["accounts"]["edges"]
     ]
     for pair in account_provider_pairs:
-        click.echo(run_graphql(obj, snippet_class=ValidateAccount, variables=pair))
+        echo_graphql(obj, ValidateAccount, pair)
+
+
+# Formats of account import files, by file extension.
+IMPORT_FORMATS = {".csv": "csv", ".json": "json", ".ndjson": "ndjson", ".jsonl": "ndjson"}
+
+
+@account.command("import")
+@click.argument("file", type=click.File("r"))
+@click.option(
+    "--format",
+    "file_format",
+    type=click.Choice(sorted(set(IMPORT_FORMATS.values()))),
+    help="Format of FILE, by default from its extension or content",
+)
+@click.option(
+    "--parallel",
+    type=click.IntRange(min=1),
+    default=1,
+    show_default=True,
+    help="Requests sent at once",
+)
+@click.option(
+    "--batch-size",
+    type=click.IntRange(min=1),
+    default=1,
+    show_default=True,
+    help="Accounts added in each request, as aliased addAccount mutations",
+)
+@click.pass_context
+def import_accounts(ctx, file, file_format, parallel, batch_size):
+    """
+    Add accounts to Stacklet from a file
+
+    FILE (a file, or - for standard input) is CSV with a header row, a JSON list of
+    objects, or NDJSON with an object per line. Fields are the options of `account
+    add`, with either dashes, underscores or camelCase in their names (e.g.
+    security-context, security_context or securityContext). Tags and variables are JSON
+    encoded, though JSON rows can also have them as a list and an object. For example:
+
+    \b
+        provider,key,name,security_context,tags
+        AWS,1234,prod,arn:aws:iam::1234:role/stacklet,"[{""key"": ""env"", ""value"": ""prod""}]"
+
+    All rows are checked before any account is added. A record is then written for
+    each row, in the file's order and the --output format, with the added account's
+    ID or the error adding it:
+
+    \b
+        {"row": 1, "provider": "AWS", "key": "123456789012", "id": "...", "error": null}
+
+    The exit code is 1 if any account failed to be added.
+    """
+    context = ctx.obj
+    if parallel > DEFAULT_POOLSIZE:
+        context.pool_size = parallel
+    text = file.read()
+    file_format = file_format or _import_format(file, text)
+    try:
+        rows = _read_rows(text, file_format)
+    except ValueError as err:
+        raise click.ClickException(f"Invalid {file_format} file: {err}")
+    if not rows:
+        raise click.ClickException("No accounts to import")
+    accounts, errors = _validate_rows(rows)
+    if errors:
+        raise click.ClickException("Invalid accounts:\n" + "\n".join(errors))
+
+    failed = False
+    fmt = context.formatter()
+    with click.progressbar(
+        length=len(accounts),
+        label="Adding accounts",
+        file=sys.stderr,
+        hidden=not sys.stderr.isatty(),
+    ) as progress:
+
+        def tracked(records: Iterable[JSONDict]) -> Iterator[JSONDict]:
+            nonlocal failed
+            for record in records:
+                failed |= record["error"] is not None
+                progress.update(1)
+                yield record
+
+        records = _add_accounts(context.executor, accounts, parallel, batch_size)
+        for output in fmt.stream(tracked(records)):
+            click.echo(output)
+    if failed:
+        ctx.exit(1)
+
+
+def _camel_case(name: str) -> str:
+    first, *rest = name.split("_")
+    return first + "".join(part.title() for part in rest)
+
+
+# Import file fields, by each of the names they can be given as.
+_IMPORT_FIELDS = {
+    alias: name
+    for name in (*AddAccount.required, *AddAccount.optional)
+    for alias in (name, name.replace("_", "-"), _camel_case(name))
+}
+
+
+def _import_format(file: TextIO, text: str) -> str:
+    """The format of an import file, from its extension or else its content."""
+    suffix = Path(getattr(file, "name", "")).suffix.lower()
+    if suffix in IMPORT_FORMATS:
+        return IMPORT_FORMATS[suffix]
+    match text.lstrip()[:1]:
+        case "[":
+            return "json"
+        case "{":
+            return "ndjson"
+    return "csv"
+
+
+def _read_rows(text: str, file_format: str) -> list[Any]:
+    """The rows of an import file, raising ValueError if it can't be parsed."""
+    if file_format == "csv":
+        return list(csv.DictReader(text.splitlines()))
+    if file_format == "ndjson":
+        return [json.loads(line) for line in text.splitlines() if line.strip()]
+    rows = json.loads(text)
+    if not isinstance(rows, list):
+        raise ValueError("expected a list of objects")
+    return rows
+
+
+def _validate_rows(rows: list[Any]) -> tuple[list[tuple[int, JSONDict]], list[str]]:
+    """
+    Check the rows of an import file, returning the AddAccount variables for each
+    (with its row number) and the problems found.
+    """
+    accounts = []
+    errors = []
+    seen: dict[tuple[str, str], int] = {}
+    for number, row in enumerate(rows, start=1):
+        if not isinstance(row, dict):
+            errors.append(f"row {number}: expected an object")
+            continue
+        problems = []
+        variables: JSONDict = dict.fromkeys(AddAccount.optional)
+        for field, value in row.items():
+            name = _IMPORT_FIELDS.get(field)
+            if name is None:
+                # csv puts cells past the header's under None
+                problems.append(
+                    "more cells than columns" if field is None else f"unknown field {field!r}"
+                )
+                continue
+            if value == "" or value is None:
+                value = None
+            elif name in ("tags", "variables"):
+                try:
+                    value = _json_field(name, value)
+                except ValueError as err:
+                    problems.append(f"invalid {name}: {err}")
+                    continue
+            else:
+                value = str(value)
+            variables[name] = value
+
+        missing = [name for name in AddAccount.required if variables.get(name) is None]
+        if missing:
+            problems.append(f"missing {', '.join(missing)}")
+        else:
+            account_id = (variables["provider"].upper(), variables["key"])
+            if account_id in seen:
+                problems.append(f"same provider and key as row {seen[account_id]}")
+            seen.setdefault(account_id, number)
+        if problems:
+            errors.append(f"row {number}: {'; '.join(problems)}")
+        else:
+            accounts.append((number, variables))
+    return accounts, errors
+
+
+def _json_field(name: str, value: Any) -> str:
+    """A tags or variables value JSON-encoded, as the options take it."""
+    decoded = json.loads(value) if isinstance(value, str) else value
+    if name == "tags" and not isinstance(decoded, list):
+        raise ValueError("expected a list of tags")
+    if name == "variables" and not isinstance(decoded, dict):
+        raise ValueError("expected an object")
+    return value if isinstance(value, str) else json.dumps(value)
+
+
+def _add_accounts(
+    executor: GraphQLExecutor,
+    accounts: list[tuple[int, JSONDict]],
+    parallel: int,
+    batch_size: int,
+) -> Iterator[JSONDict]:
+    """Add accounts, yielding a record for each in order."""
+
+    def add(chunk: list[tuple[int, JSONDict]]) -> list[JSONDict]:
+        try:
+            results = executor.run_many(
+                AddAccount,
+                [variables for _, variables in chunk],
+                transform_variables=True,
+                batch_size=batch_size,
+            )
+        except (requests.RequestException, ValueError) as err:
+            # the whole request failed, e.g. an error status without a JSON body
+            results = [{"errors": [{"message": str(err)}]}] * len(chunk)
+        return [
+            _import_record(number, variables, result)
+            for (number, variables), result in zip(chunk, results)
+        ]
+
+    chunks = [accounts[i : i + batch_size] for i in range(0, len(accounts), batch_size)]
+    if parallel == 1:
+        for chunk in chunks:
+            yield from add(chunk)
+        return
+    with ThreadPoolExecutor(parallel) as pool:
+        for records in pool.map(add, chunks):
+            yield from records
+
+
+def _import_record(number: int, variables: JSONDict, result: JSONDict) -> JSONDict:
+    account = jmespath.search(AddAccount.result_expr, result)
+    if errors := result.get("errors"):
+        error = "; ".join(str(error.get("message", error)) for error in errors)
+    elif account is None:
+        # not a GraphQL result (e.g. an expired token) if there's a message
+        error = result.get("message") or "No account returned"
+    else:
+        error = None
+    return {
+        "row": number,
+        "provider": variables["provider"],
+        "key": variables["key"],
+        "id": None if error else account.get("id"),
+        "error": error,
+    }
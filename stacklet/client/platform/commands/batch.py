@@ -0,0 +1,144 @@
+# Copyright Stacklet, Inc.
+# SPDX-License-Identifier: Apache-2.0
+
+import io
+import json
+import shlex
+import sys
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Iterable, Iterator
+
+import click
+from requests.adapters import DEFAULT_POOLSIZE
+
+from ..config import JSONDict
+from ..dispatch import ThreadOutput, run_command, thread_output
+
+
+@click.command()
+@click.argument("script", type=click.File("r"))
+@click.option(
+    "--parallel",
+    type=click.IntRange(min=1),
+    default=1,
+    show_default=True,
+    help="Commands run at once, for scripts whose lines don't depend on each other",
+)
+@click.pass_context
+def batch(ctx, script, parallel):
+    """
+    Run many commands in one process
+
+    SCRIPT (a file, or - for standard input) has a command per line, either as a
+    command line or as a JSON record with the command and its arguments, which are a
+    list or an object of option values. Blank lines and # comments are skipped:
+
+    \b
+        account show --provider AWS --key 123
+        {"command": "account show", "args": ["--provider", "AWS", "--key", "123"]}
+        {"command": "account show", "args": {"provider": "AWS", "key": "123"}}
+
+    Global options (e.g. --output) are the batch's, and all commands share one API
+    session. A JSON record is written for each command, in the script's order:
+
+    \b
+        {"line": 1, "command": [...], "exit_code": 0, "output": "...", "error": null}
+
+    The exit code is 1 if any command failed.
+    """
+    root = ctx.find_root()
+    if parallel > DEFAULT_POOLSIZE:
+        root.obj.pool_size = parallel
+
+    failed = False
+    saved_stdin = sys.stdin
+    # commands can't prompt or read standard input, which may be the script itself
+    sys.stdin = io.StringIO()
+    try:
+        with thread_output() as streams:
+            for record in _run_lines(_parse_lines(script), root, streams, parallel):
+                failed |= record["exit_code"] != 0
+                click.echo(json.dumps(record))
+    finally:
+        sys.stdin = saved_stdin
+    if failed:
+        ctx.exit(1)
+
+
+def _parse_lines(script: Iterable[str]) -> Iterator[JSONDict]:
+    """Yield a record for each command in a script, with an error for invalid lines."""
+    for number, line in enumerate(script, start=1):
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        try:
+            if line.startswith("{"):
+                argv = _record_argv(json.loads(line))
+            else:
+                argv = shlex.split(line)
+        except ValueError as err:
+            yield {"line": number, "command": None, "error": f"Invalid line: {err}"}
+        else:
+            yield {"line": number, "command": argv}
+
+
+def _record_argv(record: Any) -> list[str]:
+    if not isinstance(record, dict) or "command" not in record:
+        raise ValueError('expected an object with a "command"')
+    command = record["command"]
+    argv = shlex.split(command) if isinstance(command, str) else [str(arg) for arg in command]
+    args = record.get("args") or []
+    if isinstance(args, dict):
+        for name, value in args.items():
+            option = name if name.startswith("-") else f"--{name.replace('_', '-')}"
+            values = value if isinstance(value, list) else [value]
+            for value in values:
+                if value is True:
+                    argv.append(option)
+                elif value is not None and value is not False:
+                    argv.extend([option, str(value)])
+    else:
+        argv.extend(str(arg) for arg in args)
+    return argv
+
+
+def _run_lines(
+    lines: Iterable[JSONDict],
+    root: click.Context,
+    streams: tuple[ThreadOutput, ThreadOutput],
+    parallel: int,
+) -> Iterator[JSONDict]:
+    """Run commands, yielding their results in order."""
+
+    def run(line: JSONDict) -> JSONDict:
+        if line["command"] is None:
+            return {
+                "line": line["line"],
+                "command": None,
+                "exit_code": 2,
+                "output": "",
+                "error": line["error"],
+            }
+        stdout, stderr = io.StringIO(), io.StringIO()
+        with streams[0].redirect(stdout), streams[1].redirect(stderr):
+            exit_code = run_command(line["command"], parent=root)
+        return line | {
+            "exit_code": exit_code,
+            "output": stdout.getvalue(),
+            "error": stderr.getvalue() or None,
+        }
+
+    if parallel == 1:
+        yield from map(run, lines)
+        return
+
+    with ThreadPoolExecutor(parallel) as pool:
+        pending = deque()
+        for line in lines:
+            pending.append(pool.submit(run, line))
+            # bounded read-ahead, so a long script isn't all queued at once
+            if len(pending) >= parallel * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
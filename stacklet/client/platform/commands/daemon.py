@@ -0,0 +1,47 @@
+# Copyright Stacklet, Inc.
+# SPDX-License-Identifier: Apache-2.0
+
+from pathlib import Path
+
+import click
+
+from .. import daemon as _daemon
+
+SOCKET_OPTION = click.option(
+    "--socket",
+    type=click.Path(dir_okay=False, path_type=Path),
+    envvar="STACKLET_DAEMON_SOCKET",
+    show_envvar=True,
+    help="Unix socket the daemon listens on (default: ~/.stacklet/daemon.sock)",
+)
+
+
+@click.group()
+def daemon(*args, **kwargs):
+    """
+    Warm process running CLI commands
+
+    While the daemon runs, stacklet-admin forwards commands to it, saving startup time
+    and reusing config and API connections. Set STACKLET_NO_DAEMON to run commands
+    in-process anyway.
+    """
+
+
+@daemon.command()
+@SOCKET_OPTION
+def serve(socket):
+    """Run the daemon in the foreground, until stopped"""
+    try:
+        _daemon.serve(socket)
+    except RuntimeError as err:
+        raise click.ClickException(str(err))
+    except KeyboardInterrupt:
+        pass
+
+
+@daemon.command()
+@SOCKET_OPTION
+def stop(socket):
+    """Stop the running daemon"""
+    if not _daemon.stop(socket):
+        raise click.ClickException("The daemon isn't running")
@@ -6,7 +6,8 @@
 
 import click
 
-from ..graphql.cli import run_graphql
+from ..graphql.cli import echo_graphql
+from ..graphql.executor import adhoc_snippet
 
 
 @click.group()
@@ -23,4 +24,4 @@ def run(obj, snippet):
     if isinstance(snippet, io.IOBase):
         snippet = snippet.read()
 
-    click.echo(run_graphql(obj, snippet=snippet))
+    echo_graphql(obj, adhoc_snippet(snippet))
@@ -0,0 +1,72 @@
+# Copyright Stacklet, Inc.
+# SPDX-License-Identifier: Apache-2.0
+
+import sqlite3
+from dataclasses import asdict
+from pathlib import Path
+
+import click
+
+from ..mirror import TABLES, Mirror, MirrorSyncError
+
+DATABASE_OPTION = click.option(
+    "--database",
+    type=click.Path(dir_okay=False, path_type=Path),
+    help="SQLite database file (default: ~/.stacklet/mirror.db)",
+)
+
+
+@click.group()
+def mirror(*args, **kwargs):
+    """
+    Local SQLite mirror of the platform inventory
+
+    Sync it, then query it offline with SQL. Each table has a row per node with its
+    JSON in the `data` column, and indexed columns for common lookups.
+    """
+
+
+@mirror.command()
+@DATABASE_OPTION
+@click.option(
+    "--table",
+    "tables",
+    type=click.Choice(list(TABLES)),
+    multiple=True,
+    help="Only sync this table (default: all)",
+)
+@click.pass_obj
+def sync(obj, database, tables):
+    """Update the mirror, writing only what changed since the last sync"""
+    store = Mirror(obj.executor, database)
+    try:
+        stats = store.sync(tables or None)
+    except MirrorSyncError as err:
+        raise click.ClickException(f"Sync failed: {err}")
+    finally:
+        store.close()
+    fmt = obj.formatter()
+    click.echo(fmt({name: asdict(table_stats) for name, table_stats in stats.items()}))
+
+
+@mirror.command()
+@DATABASE_OPTION
+@click.argument("sql")
+@click.argument("params", nargs=-1)
+@click.pass_obj
+def query(obj, database, sql, params):
+    """
+    Run a SQL query on the mirror
+
+    Values for `?` placeholders in the query are passed as extra arguments.
+    """
+    # querying works offline, it doesn't need credentials
+    store = Mirror(None, database)
+    try:
+        rows = store.query(sql, *params)
+    except sqlite3.Error as err:
+        raise click.ClickException(f"Query failed: {err}")
+    finally:
+        store.close()
+    fmt = obj.formatter()
+    click.echo(fmt(rows))
@@ -8,6 +8,7 @@
 from ..context import StackletContext
 from ..exceptions import InvalidInputException
 from ..graphql.cli import GraphQLCommand, register_graphql_commands, run_graphql, snippet_options
+from ..graphql.snippet import projected_snippet
 from ..graphql.snippets import ListPolicies, ShowPolicy
 
 
@@ -49,8 +50,10 @@ def show_source(obj, **kwargs):
     Show policy source in Stacklet by either name or uuid
     """
     _show_policy_pre_check(obj, kwargs)
+    # only the source is fetched
+    snippet_class = projected_snippet(ShowPolicy, ("sourceYAML",))
     click.echo(
-        run_graphql(obj, snippet_class=ShowPolicy, variables=kwargs, raw=True)["data"]["policy"][
+        run_graphql(obj, snippet_class=snippet_class, variables=kwargs, raw=True)["data"]["policy"][
             "sourceYAML"
         ]
     )
@@ -10,8 +10,6 @@
 import typing as t
 from pathlib import Path
 
-from jsonschema import ValidationError, validate
-
 from .exceptions import ConfigValidationException
 
 MISSING = "missing"
@@ -98,6 +96,9 @@ def to_file(self, path: Path):
 
     @classmethod
     def validate(cls, config: JSONDict):
+        # deferred as it's slow to import, and only needed once a config is read
+        from jsonschema import ValidationError, validate
+
         try:
             return validate(instance=config, schema=cls.schema)
         except ValidationError as err:
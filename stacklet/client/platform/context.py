@@ -1,13 +1,65 @@
 # Copyright Stacklet, Inc.
 # SPDX-License-Identifier: Apache-2.0
 
+import threading
 from functools import cached_property
 from pathlib import Path
+from typing import TYPE_CHECKING, Callable, ClassVar
 
 from .config import DEFAULT_CONFIG_FILE, DEFAULT_OUTPUT_FORMAT, StackletConfig, StackletCredentials
 from .exceptions import MissingToken
 from .formatter import FORMATTERS, Formatter
-from .graphql import GraphQLExecutor
+from .graphql.cache import ResponseCache
+
+if TYPE_CHECKING:
+    from .graphql import GraphQLExecutor
+
+
+class SharedState:
+    """
+    Configs and executors reused by all the commands a process runs, e.g. the daemon.
+
+    A config is read again when its file changes. Executors are kept per API and
+    options, so their connections stay open between commands; a new token (after
+    logging in again) replaces the executor, closing the previous one.
+    """
+
+    def __init__(self, timeout: float | None = None):
+        # seconds executors wait on the API
+        self.timeout = timeout
+        # set while the command running should stop, checked by executors before each
+        # request
+        self.cancelled = threading.Event()
+        # by path, with the modification time they were read at
+        self.configs: dict[Path, tuple[int, StackletConfig]] = {}
+        # by API and options, with the token they send
+        self.executors: dict[tuple, tuple[str, "GraphQLExecutor"]] = {}
+
+    def config(self, path: Path) -> StackletConfig:
+        """The config from a file, read again if it changed."""
+        path = path.resolve()
+        mtime = path.stat().st_mtime_ns
+        entry = self.configs.get(path)
+        if entry is None or entry[0] != mtime:
+            entry = self.configs[path] = (mtime, StackletConfig.from_file(path))
+        return entry[1]
+
+    def executor(
+        self, key: tuple, token: str, make: Callable[[], "GraphQLExecutor"]
+    ) -> "GraphQLExecutor":
+        """The executor for an API and options, made anew if the token changed."""
+        entry = self.executors.get(key)
+        if entry is None or entry[0] != token:
+            if entry is not None:
+                entry[1].close()
+            entry = self.executors[key] = (token, make())
+        return entry[1]
+
+    def close(self):
+        """Close all executors."""
+        for _, executor in self.executors.values():
+            executor.close()
+        self.executors.clear()
 
 
 class StackletContext:
@@ -16,23 +68,73 @@ class StackletContext:
     formatter: type[Formatter]
     credentials: StackletCredentials
 
+    # set for processes running several commands
+    shared: ClassVar[SharedState | None] = None
+
     def __init__(
         self,
         config_file: Path = DEFAULT_CONFIG_FILE,
         output_format: str = DEFAULT_OUTPUT_FORMAT,
+        persisted_queries: bool = False,
+        cache: ResponseCache | None = None,
     ):
         self.config_file = config_file
+        self.persisted_queries = persisted_queries
+        self.cache = cache
         self.formatter = FORMATTERS[output_format]
         self.credentials = StackletCredentials()
+        # connections the executor pools, for commands sending requests from several
+        # threads (None for the default)
+        self.pool_size: int | None = None
+        self._executor: "GraphQLExecutor | None" = None
+        # commands run in several threads (e.g. by batch) share the context
+        self._executor_lock = threading.Lock()
 
     @cached_property
     def config(self) -> StackletConfig:
-        return StackletConfig.from_file(self.config_file)
+        if self.shared is None or not self.config_file.exists():
+            return StackletConfig.from_file(self.config_file)
+        return self.shared.config(self.config_file)
 
-    @cached_property
-    def executor(self) -> GraphQLExecutor:
+    @property
+    def executor(self) -> "GraphQLExecutor":
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = self._make_executor()
+            return self._executor
+
+    def _make_executor(self) -> "GraphQLExecutor":
         token = self.credentials.api_token()
         if not token:
             raise MissingToken()
 
-        return GraphQLExecutor(self.config.api, token)
+        if self.shared is None:
+            return self._new_executor(token)
+        cache = self.cache
+        key = (
+            self.config.api,
+            self.persisted_queries,
+            None if cache is None else (cache.directory, cache.ttl, cache.max_size),
+            self.pool_size,
+        )
+        return self.shared.executor(key, token, lambda: self._new_executor(token))
+
+    def _new_executor(self, token: str) -> "GraphQLExecutor":
+        # imported here as they bring in requests, which commands not calling the API
+        # (or just showing help) don't need
+        from requests.adapters import DEFAULT_POOLSIZE
+
+        from .graphql import GraphQLExecutor
+        from .graphql.persisted import PersistedHashes
+
+        return GraphQLExecutor(
+            self.config.api,
+            token,
+            persisted_queries=self.persisted_queries,
+            # saved, so later commands send queries registered by this one by hash
+            persisted_hashes=PersistedHashes.for_api(self.config.api),
+            cache=self.cache,
+            pool_size=DEFAULT_POOLSIZE if self.pool_size is None else self.pool_size,
+            timeout=None if self.shared is None else self.shared.timeout,
+            cancelled=None if self.shared is None else self.shared.cancelled,
+        )
@@ -0,0 +1,382 @@
+# Copyright Stacklet, Inc.
+# SPDX-License-Identifier: Apache-2.0
+
+"""
+Warm daemon running CLI commands, and the thin client forwarding them to it.
+
+`stacklet-admin daemon serve` listens on a Unix socket (`~/.stacklet/daemon.sock` by
+default) and keeps the package imported, configs parsed and API sessions open between
+commands. While it's running, `stacklet-admin` sends its arguments, working directory
+and environment (STACKLET_* variables, and those requests reads for proxies and CA
+bundles) there and writes out what comes back, instead of starting up in-process.
+When there's no daemon, it runs the command itself. Interrupting the client (e.g. with
+Ctrl-C) closes the connection, which cancels the command in the daemon before its
+next request.
+
+Commands are run one at a time, as running one swaps the process's standard streams,
+environment, working directory and logging setup for the client's: while one runs,
+others are sent back to run in their client rather than waiting for it. So are
+commands that prompt or read standard input (including any given a - argument).
+
+The protocol is JSON lines: the client sends a request, and the daemon answers with
+`{"stdout": text}` and `{"stderr": text}` chunks as the command writes them, then
+`{"exit": code}`, or just `{"local": true}` if the client should run the command.
+
+This module is imported by every `stacklet-admin` invocation, so it must stay cheap to
+import: everything else is imported by the daemon, or when falling back to running
+the command in-process.
+"""
+
+import io
+import json
+import os
+import socket
+import sys
+from contextlib import contextmanager, redirect_stderr, redirect_stdout
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Iterator, TextIO
+
+from . import __version__
+
+if TYPE_CHECKING:
+    import threading
+
+# Not taken from config.DEFAULT_CONFIG_DIR, to avoid importing click in the client.
+DEFAULT_SOCKET = Path("~/.stacklet/daemon.sock").expanduser()
+
+# Commands the daemon doesn't run, as they prompt, read standard input or manage the
+# daemon itself.
+LOCAL_COMMANDS = frozenset(
+    ["auto-configure", "batch", "configure", "cubejs", "daemon", "graphql", "login", "user"]
+)
+
+# Seconds the daemon waits on the API, so that a request for a client that went away
+# doesn't hold up the commands after it for long.
+REQUEST_TIMEOUT = 60.0
+
+# Environment variables passed on from the client.
+ENV_PREFIX = "STACKLET_"
+# Other variables passed on, which requests (or the ssl module) read for each request,
+# in upper or lower case.
+ENV_NAMES = frozenset(
+    [
+        "ALL_PROXY",
+        "CURL_CA_BUNDLE",
+        "HTTP_PROXY",
+        "HTTPS_PROXY",
+        "NETRC",
+        "NO_PROXY",
+        "REQUESTS_CA_BUNDLE",
+        "SSL_CERT_DIR",
+        "SSL_CERT_FILE",
+    ]
+)
+
+
+def socket_path() -> Path:
+    """Path of the daemon's socket, which STACKLET_DAEMON_SOCKET overrides."""
+    if path := os.environ.get("STACKLET_DAEMON_SOCKET"):
+        return Path(path)
+    return DEFAULT_SOCKET
+
+
+def main():
+    """Entry point for `stacklet-admin`, forwarding to the daemon if it's running."""
+    if not os.environ.get("STACKLET_NO_DAEMON"):
+        exit_code = forward(sys.argv[1:])
+        if exit_code is not None:
+            sys.exit(exit_code)
+
+    from .cli import cli
+
+    cli()
+
+
+def forward(
+    argv: list[str],
+    path: Path | None = None,
+    stdout: TextIO | None = None,
+    stderr: TextIO | None = None,
+) -> int | None:
+    """
+    Run a command in the daemon, returning its exit code.
+
+    None is returned if the command should run in-process instead: there's no daemon,
+    it runs a different version, or the command isn't one it runs.
+    """
+    stdout = stdout or sys.stdout
+    stderr = stderr or sys.stderr
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(str(path or socket_path()))
+    except OSError:
+        sock.close()
+        return None
+
+    request = {
+        "version": __version__,
+        "argv": argv,
+        "cwd": os.getcwd(),
+        "env": _forwarded_env(),
+    }
+    written = False
+    with sock, sock.makefile("rwb") as stream:
+        try:
+            stream.write(json.dumps(request).encode() + b"\n")
+            stream.flush()
+            for line in stream:
+                message = json.loads(line)
+                if "stdout" in message:
+                    stdout.write(message["stdout"])
+                    stdout.flush()
+                    written = True
+                elif "stderr" in message:
+                    stderr.write(message["stderr"])
+                    stderr.flush()
+                    written = True
+                elif "exit" in message:
+                    return message["exit"]
+                else:
+                    return None
+        except OSError:
+            pass
+        except KeyboardInterrupt:
+            # closing the connection aborts the command in the daemon
+            stderr.write("Aborted!\n")
+            return 1
+    # the daemon went away mid-command
+    if not written:
+        return None
+    stderr.write("The stacklet-admin daemon stopped while running the command\n")
+    return 1
+
+
+class _ChunkWriter:
+    """A text stream sending what's written to the client as messages."""
+
+    encoding = "utf-8"
+    errors = "strict"
+
+    def __init__(self, stream, name: str):
+        self._stream = stream
+        self._name = name
+
+    def write(self, text: str) -> int:
+        # rejecting bytes is also how click tells a text stream from a binary one
+        if not isinstance(text, str):
+            raise TypeError(f"write() argument must be str, not {type(text).__name__}")
+        if text:
+            _send(self._stream, {self._name: text})
+        return len(text)
+
+    def flush(self):
+        self._stream.flush()
+
+    def isatty(self) -> bool:
+        return False
+
+    def writable(self) -> bool:
+        return True
+
+
+def _send(stream, message: dict[str, Any]):
+    stream.write(json.dumps(message).encode() + b"\n")
+    stream.flush()
+
+
+def serve(path: Path | None = None):
+    """Run the daemon until stopped, serving commands on a Unix socket."""
+    import logging
+    import socketserver
+    import threading
+
+    from .context import SharedState, StackletContext
+    from .dispatch import command_name, run_command
+
+    path = path or socket_path()
+    shared = StackletContext.shared = SharedState(timeout=REQUEST_TIMEOUT)
+    # held while a command runs
+    busy = threading.Lock()
+
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            try:
+                request = json.loads(self.rfile.readline())
+            except ValueError:
+                return
+            if request.get("stop"):
+                _send(self.wfile, {"exit": 0})
+                threading.Thread(target=self.server.shutdown).start()
+                return
+            if (
+                request.get("version") != __version__
+                or command_name(request["argv"]) in LOCAL_COMMANDS
+                # a - argument reads standard input (e.g. `account import -`)
+                or "-" in request["argv"]
+                or not busy.acquire(blocking=False)
+            ):
+                _send(self.wfile, {"local": True})
+                return
+            try:
+                exit_code = self.run(request)
+            finally:
+                busy.release()
+            try:
+                _send(self.wfile, {"exit": exit_code})
+            except OSError:
+                # the client went away
+                pass
+
+        def run(self, request) -> int | None:
+            stdout = _ChunkWriter(self.wfile, "stdout")
+            stderr = _ChunkWriter(self.wfile, "stderr")
+            try:
+                with (
+                    _client_environment(request["cwd"], request["env"]),
+                    redirect_stdout(stdout),  # type: ignore[arg-type]
+                    redirect_stderr(stderr),  # type: ignore[arg-type]
+                    _no_stdin(),
+                    _restored_logging(logging.getLogger()),
+                ):
+                    watcher = _DisconnectWatcher(self.connection, shared.cancelled)
+                    try:
+                        return run_command(request["argv"])
+                    finally:
+                        watcher.stop()
+            except (OSError, KeyboardInterrupt):
+                # the client went away
+                return None
+
+    if path.exists():
+        if _is_running(path):
+            raise RuntimeError(f"A daemon is already listening on {path}")
+        path.unlink()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    old_umask = os.umask(0o177)
+    try:
+        server = socketserver.ThreadingUnixStreamServer(str(path), Handler)
+        server.daemon_threads = True
+    finally:
+        os.umask(old_umask)
+    try:
+        with server:
+            server.serve_forever()
+    finally:
+        path.unlink(missing_ok=True)
+        shared.close()
+        StackletContext.shared = None
+
+
+def stop(path: Path | None = None) -> bool:
+    """Stop the daemon, returning whether one was running."""
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(str(path or socket_path()))
+    except OSError:
+        sock.close()
+        return False
+    with sock, sock.makefile("rwb") as stream:
+        _send(stream, {"stop": True})
+        stream.readline()
+    return True
+
+
+def _is_running(path: Path) -> bool:
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(str(path))
+        except OSError:
+            return False
+    return True
+
+
+def _forwarded(name: str) -> bool:
+    """Whether an environment variable is passed on from the client."""
+    return name.startswith(ENV_PREFIX) or name.upper() in ENV_NAMES
+
+
+def _forwarded_env() -> dict[str, str]:
+    return {name: value for name, value in os.environ.items() if _forwarded(name)}
+
+
+@contextmanager
+def _client_environment(cwd: str, env: dict[str, str]) -> Iterator[None]:
+    """Switch to the client's working directory and forwarded environment."""
+
+    def set_env(values: dict[str, str]):
+        for name in [name for name in os.environ if _forwarded(name)]:
+            if name not in values:
+                del os.environ[name]
+        os.environ.update(values)
+
+    saved_cwd = os.getcwd()
+    saved_env = _forwarded_env()
+    os.chdir(cwd)
+    set_env(env)
+    try:
+        yield
+    finally:
+        os.chdir(saved_cwd)
+        set_env(saved_env)
+
+
+class _DisconnectWatcher:
+    """
+    Cancel the command running if the client disconnects.
+
+    The client sends nothing after its request, so the connection reaching its end
+    means it's gone (e.g. the user pressed Ctrl-C). The shared cancellation event is
+    then set, which the command's executor checks before each request (so between
+    pages): a request in flight is waited for, up to the executor's timeout.
+    """
+
+    def __init__(self, connection: socket.socket, cancelled: "threading.Event"):
+        import threading
+
+        self._cancelled = cancelled
+        self._lock = threading.Lock()
+        self._running = True
+        threading.Thread(target=self._watch, args=(connection,), daemon=True).start()
+
+    def stop(self):
+        """Stop watching, as the command is done, and reset the event for the next one."""
+        with self._lock:
+            self._running = False
+            self._cancelled.clear()
+
+    def _watch(self, connection: socket.socket):
+        try:
+            while connection.recv(4096):
+                pass
+        except OSError:
+            pass
+        with self._lock:
+            if self._running:
+                self._cancelled.set()
+
+
+@contextmanager
+def _restored_logging(root) -> Iterator[None]:
+    """
+    Put the root logger's level and handlers back as they were after a command.
+
+    Its handlers are removed meanwhile, so that a command setting up logging (e.g.
+    with -v) logs to the client's standard error rather than the daemon's.
+    """
+    saved_level, saved_handlers = root.level, root.handlers[:]
+    root.handlers[:] = []
+    try:
+        yield
+    finally:
+        root.setLevel(saved_level)
+        root.handlers[:] = saved_handlers
+
+
+@contextmanager
+def _no_stdin() -> Iterator[None]:
+    saved_stdin = sys.stdin
+    sys.stdin = io.StringIO()
+    try:
+        yield
+    finally:
+        sys.stdin = saved_stdin
@@ -0,0 +1,126 @@
+# Copyright Stacklet, Inc.
+# SPDX-License-Identifier: Apache-2.0
+
+"""
+Running CLI commands inside a process that's already up, as the daemon and the batch
+command do.
+"""
+
+import sys
+import threading
+import traceback
+from contextlib import contextmanager
+from typing import Iterator
+
+import click
+
+from .cli import cli
+
+
+def run_command(argv: list[str], parent: click.Context | None = None) -> int:
+    """
+    Run a CLI command, returning its exit code.
+
+    With a `parent` (the context of the `stacklet-admin` group), `argv` is a command
+    and its arguments, run under that context and sharing its StackletContext.
+    Otherwise, it's a full command line, global options included.
+
+    Output goes to the current sys.stdout and sys.stderr, with errors reported there as
+    the CLI does when run on its own.
+    """
+    try:
+        if parent is None:
+            result = cli.main(args=argv, prog_name="stacklet-admin", standalone_mode=False)
+            # an exit code if the command exited explicitly
+            return result if isinstance(result, int) else 0
+        name, command, args = cli.resolve_command(parent, argv)
+        assert command is not None
+        with command.make_context(name, args, parent=parent) as ctx:
+            command.invoke(ctx)
+    except click.exceptions.Exit as err:
+        return err.exit_code
+    except click.ClickException as err:
+        err.show()
+        return err.exit_code
+    except click.Abort:
+        click.echo("Aborted!", err=True)
+        return 1
+    except Exception:
+        traceback.print_exc()
+        return 1
+    return 0
+
+
+def command_name(argv: list[str]) -> str | None:
+    """The name of the (top-level) command in CLI arguments, if there's one."""
+    # global options taking a value, which is skipped
+    with_value = {
+        opt
+        for param in cli.params
+        if isinstance(param, click.Option) and not param.is_flag and not param.count
+        for opt in param.opts
+    }
+    args = iter(argv)
+    for arg in args:
+        if arg in with_value:
+            next(args, None)
+        elif not arg.startswith("-"):
+            return arg
+    return None
+
+
+class ThreadOutput:
+    """
+    A text stream writing to a per-thread target, or a fallback one.
+
+    Installed as sys.stdout and sys.stderr, it lets commands run concurrently in
+    several threads each have their output captured separately.
+    """
+
+    encoding = "utf-8"
+    errors = "strict"
+
+    def __init__(self, fallback):
+        self.fallback = fallback
+        self._local = threading.local()
+
+    @property
+    def target(self):
+        return getattr(self._local, "target", None) or self.fallback
+
+    @contextmanager
+    def redirect(self, target) -> Iterator[None]:
+        """Send what the current thread writes to `target`."""
+        saved = getattr(self._local, "target", None)
+        self._local.target = target
+        try:
+            yield
+        finally:
+            self._local.target = saved
+
+    def write(self, text: str) -> int:
+        # rejecting bytes is also how click tells a text stream from a binary one
+        if not isinstance(text, str):
+            raise TypeError(f"write() argument must be str, not {type(text).__name__}")
+        return self.target.write(text)
+
+    def flush(self):
+        self.target.flush()
+
+    def isatty(self) -> bool:
+        return False
+
+    def writable(self) -> bool:
+        return True
+
+
+@contextmanager
+def thread_output() -> Iterator[tuple[ThreadOutput, ThreadOutput]]:
+    """Install per-thread standard output and error streams, yielding them."""
+    stdout, stderr = ThreadOutput(sys.stdout), ThreadOutput(sys.stderr)
+    saved = sys.stdout, sys.stderr
+    sys.stdout, sys.stderr = stdout, stderr  # type: ignore[assignment]
+    try:
+        yield stdout, stderr
+    finally:
+        sys.stdout, sys.stderr = saved
@@ -1,16 +1,35 @@
 # Copyright Stacklet, Inc.
 # SPDX-License-Identifier: Apache-2.0
 
+import csv
+import io
 import json
 from abc import abstractmethod
+from itertools import chain, islice
+from typing import Any, Iterable, Iterator
 
-import yaml
+from . import codec
+
+# Records read ahead to pick the columns of tabular output (and size them, for tables).
+# Fields only appearing in later records are left out.
+SAMPLE_SIZE = 100
+# Columns in tables are no wider than this, longer values are cut.
+MAX_COLUMN_WIDTH = 50
 
 
 class Formatter:
+    # Whether the formatter lays out records (e.g. result nodes) rather than whole
+    # responses, so commands should pass it results rather than the raw response.
+    records = False
+
     @abstractmethod
     def __call__(self, value): ...
 
+    def stream(self, values: Iterable[Any]) -> Iterator[str]:
+        """Format values one at a time, to be written out as they're produced."""
+        for value in values:
+            yield self(value)
+
 
 class RawFormatter(Formatter):
     def __call__(self, value):
@@ -18,17 +37,167 @@ def __call__(self, value):
 
 
 class JSONFormatter(Formatter):
+    indent: int | None = 2
+
     def __call__(self, value):
-        return json.dumps(value, indent=2)
+        return json.dumps(value, indent=self.indent)
+
+    def reformat(self, chunks: Iterable[bytes]) -> Iterator[str]:
+        """Format a JSON document read in chunks, without decoding it."""
+        return codec.reformat(chunks, indent=self.indent)
+
+    def stream(self, values: Iterable[Any]) -> Iterator[str]:
+        # NDJSON, one compact document per line
+        for value in values:
+            yield json.dumps(value)
 
 
 class YAMLFormatter(Formatter):
+    # yaml is imported when output is formatted, so that commands that don't print
+    # (or --help) don't pay for it
+
     def __call__(self, value):
-        return yaml.safe_dump(value, indent=2)
+        import yaml
+
+        return yaml.dump(value, Dumper=_yaml_dumper(), indent=2)
+
+    def stream(self, values: Iterable[Any]) -> Iterator[str]:
+        import yaml
+
+        dumper = _yaml_dumper()
+        # a multi-document stream, one document per value
+        for value in values:
+            yield yaml.dump(value, Dumper=dumper, indent=2, explicit_start=True).rstrip("\n")
+
+
+def _yaml_dumper():
+    """The safe YAML dumper, backed by libyaml if PyYAML was built with it."""
+    import yaml
+
+    return getattr(yaml, "CSafeDumper", yaml.SafeDumper)
+
+
+class NDJSONFormatter(JSONFormatter):
+    # compact, a document per line
+    indent = None
+
+
+def flatten(value: Any, prefix: str = "") -> dict[str, Any]:
+    """
+    Flatten a record to a single level, for tabular output.
+
+    Nested objects become dotted fields (e.g. "accountGroup.name"). Lists of key/value
+    pairs (like tags) become "key=value" items and other lists of scalars plain items,
+    separated by ";"; any other list is kept as JSON.
+    """
+    if not isinstance(value, dict):
+        return {prefix or "value": _cell(value)}
+    fields: dict[str, Any] = {}
+    for key, item in value.items():
+        name = f"{prefix}.{key}" if prefix else key
+        if isinstance(item, dict) and item:
+            fields.update(flatten(item, name))
+        else:
+            fields[name] = _cell(item)
+    return fields
+
+
+def _cell(value: Any) -> str:
+    if value is None or value == {}:
+        return ""
+    if isinstance(value, bool):
+        return str(value).lower()
+    if isinstance(value, list):
+        if all(isinstance(item, dict) and item.keys() == {"key", "value"} for item in value):
+            return ";".join(f"{item['key']}={_cell(item['value'])}" for item in value)
+        if not any(isinstance(item, (dict, list)) for item in value):
+            return ";".join(_cell(item) for item in value)
+        return json.dumps(value)
+    return str(value)
+
+
+def _records(value: Any) -> Iterator[Any]:
+    """The records in a formatted value: the items of a list, or the value itself."""
+    if isinstance(value, list):
+        return iter(value)
+    return iter([value])
+
+
+def _sample(records: Iterable[Any]) -> tuple[list[str], list[dict[str, Any]], Iterator[Any]]:
+    """
+    Read ahead the first records, returning the columns they have, the flattened
+    sample and an iterator over the remaining records.
+    """
+    records = iter(records)
+    sample = [flatten(record) for record in islice(records, SAMPLE_SIZE)]
+    # in order of first appearance
+    columns = list(dict.fromkeys(chain.from_iterable(sample)))
+    # an object that's null in some records only has columns for its fields
+    parents = {
+        column[:index] for column in columns for index, char in enumerate(column) if char == "."
+    }
+    columns = [column for column in columns if column not in parents]
+    return columns, sample, records
+
+
+class CSVFormatter(Formatter):
+    records = True
+
+    def __call__(self, value):
+        return "\n".join(self.stream(_records(value)))
+
+    def stream(self, values: Iterable[Any]) -> Iterator[str]:
+        columns, sample, rest = _sample(values)
+        if not columns:
+            return
+        yield self._row(columns)
+        for fields in chain(sample, map(flatten, rest)):
+            yield self._row([fields.get(column, "") for column in columns])
+
+    def _row(self, cells: list[str]) -> str:
+        out = io.StringIO()
+        csv.writer(out, lineterminator="").writerow(cells)
+        return out.getvalue()
+
+
+class TableFormatter(Formatter):
+    records = True
+
+    def __call__(self, value):
+        return "\n".join(self.stream(_records(value)))
+
+    def stream(self, values: Iterable[Any]) -> Iterator[str]:
+        columns, sample, rest = _sample(values)
+        if not columns:
+            return
+        widths = [
+            min(
+                MAX_COLUMN_WIDTH,
+                max(len(column), *(len(fields.get(column, "")) for fields in sample)),
+            )
+            for column in columns
+        ]
+        yield self._row(columns, widths)
+        yield self._row(["-" * width for width in widths], widths)
+        for fields in chain(sample, map(flatten, rest)):
+            yield self._row([fields.get(column, "") for column in columns], widths)
+
+    def _row(self, cells: list[str], widths: list[int]) -> str:
+        return "  ".join(
+            self._fit(cell.replace("\n", " "), width) for cell, width in zip(cells, widths)
+        ).rstrip()
+
+    def _fit(self, text: str, width: int) -> str:
+        if len(text) > width:
+            return text[: width - 1] + "…"
+        return text.ljust(width)
 
 
 FORMATTERS = {
     "plain": RawFormatter,
     "json": JSONFormatter,
+    "ndjson": NDJSONFormatter,
     "yaml": YAMLFormatter,
+    "csv": CSVFormatter,
+    "table": TableFormatter,
 }
@@ -1,8 +1,30 @@
 # Copyright Stacklet, Inc.
 # SPDX-License-Identifier: Apache-2.0
 
-from .executor import GraphQLExecutor
-from .snippet import GraphQLSnippet
-from .snippets import GRAPHQL_SNIPPETS
+import importlib
+from typing import TYPE_CHECKING, Any
 
-__all__ = ["GRAPHQL_SNIPPETS", "GraphQLExecutor", "GraphQLSnippet"]
+if TYPE_CHECKING:
+    from .async_executor import AsyncGraphQLExecutor
+    from .executor import GraphQLExecutor
+    from .snippet import GraphQLSnippet
+    from .snippets import GRAPHQL_SNIPPETS
+
+__all__ = ["GRAPHQL_SNIPPETS", "AsyncGraphQLExecutor", "GraphQLExecutor", "GraphQLSnippet"]
+
+# Exports are imported on first access, so that using a submodule (e.g. the response
+# cache from the CLI entry point) doesn't pull in requests and every snippet.
+_EXPORTS = {
+    "AsyncGraphQLExecutor": ".async_executor",
+    "GraphQLExecutor": ".executor",
+    "GraphQLSnippet": ".snippet",
+    "GRAPHQL_SNIPPETS": ".snippets",
+}
+
+
+def __getattr__(name: str) -> Any:
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_EXPORTS[name], __name__), name)
+    globals()[name] = value
+    return value
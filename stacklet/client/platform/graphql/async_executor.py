@@ -0,0 +1,78 @@
+# Copyright Stacklet, Inc.
+# SPDX-License-Identifier: Apache-2.0
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from ..config import JSONDict
+from .executor import GraphQLExecutor, adhoc_snippet
+from .retry import RetryPolicy
+from .snippet import GraphQLSnippet
+
+# How many requests are in flight at once unless told otherwise.
+DEFAULT_CONCURRENCY = 50
+
+
+class AsyncGraphQLExecutor:
+    """
+    Execute GraphQL queries against the API from asyncio code.
+
+    Requests are issued from a pool of worker threads sharing one session, so at
+    most `concurrency` of them are in flight at a time and they all draw on the
+    same pool of connections. Any number of calls can be awaited at once; the
+    ones over the limit wait for a free worker.
+    """
+
+    def __init__(
+        self,
+        api: str,
+        token: str,
+        concurrency: int = DEFAULT_CONCURRENCY,
+        retry: RetryPolicy | None = None,
+    ):
+        if concurrency < 1:
+            raise ValueError("concurrency must be at least 1")
+        self.concurrency = concurrency
+        self.executor = GraphQLExecutor(api, token, pool_size=concurrency, retry=retry)
+        self._workers = ThreadPoolExecutor(
+            max_workers=concurrency, thread_name_prefix="AsyncGraphQLExecutor"
+        )
+
+    @property
+    def api(self) -> str:
+        return self.executor.api
+
+    @property
+    def token(self) -> str:
+        return self.executor.token
+
+    async def run_query(self, query: str) -> JSONDict:
+        """Run a literal GraphQL query string."""
+        return await self.run_snippet(adhoc_snippet(query))
+
+    async def run_snippet(
+        self,
+        snippet_class: type[GraphQLSnippet],
+        variables: JSONDict | None = None,
+        transform_variables: bool = False,
+    ) -> JSONDict:
+        """Run a graphql snippet."""
+        call = partial(
+            self.executor.run_snippet,
+            snippet_class,
+            variables=variables,
+            transform_variables=transform_variables,
+        )
+        return await asyncio.get_running_loop().run_in_executor(self._workers, call)
+
+    def close(self):
+        """Wait for in-flight requests and release the workers and connections."""
+        self._workers.shutdown(wait=True)
+        self.executor.close()
+
+    async def __aenter__(self) -> "AsyncGraphQLExecutor":
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await asyncio.get_running_loop().run_in_executor(None, self.close)
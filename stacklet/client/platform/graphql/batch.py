@@ -0,0 +1,152 @@
+# Copyright Stacklet, Inc.
+# SPDX-License-Identifier: Apache-2.0
+
+"""
+Merge several snippet calls into a single GraphQL document.
+
+Each call's root field is aliased and its variables prefixed, so calls to the same
+snippet don't collide, and the response is split back into one result per call,
+shaped as if the call had been run on its own.
+"""
+
+import re
+from dataclasses import dataclass
+from typing import Iterable, Iterator
+
+from ..config import JSONDict
+from .snippet import GraphQLSnippet
+
+# How many calls are merged into one request unless told otherwise.
+DEFAULT_BATCH_SIZE = 50
+
+_OPERATION_RE = re.compile(
+    r"^\s*(?P<type>query|mutation)?\s*(?:\((?P<definitions>[^)]*)\))?\s*\{(?P<body>.*)\}\s*$",
+    re.DOTALL,
+)
+_VARIABLE_RE = re.compile(r"\$(\w+)")
+
+SnippetCall = tuple[type[GraphQLSnippet], JSONDict | None]
+
+
+@dataclass
+class _Operation:
+    """A built snippet call, split into the parts that get merged."""
+
+    type: str
+    definitions: str
+    body: str
+    root_field: str
+    variables: JSONDict
+    retryable: bool = False
+
+
+def _parse(request: JSONDict) -> _Operation:
+    match = _OPERATION_RE.match(request["query"])
+    if not match:
+        raise ValueError(f"can't batch query: {request['query']!r}")
+    body = match["body"].strip()
+    fields = _root_fields(body)
+    if len(fields) != 1:
+        raise ValueError(f"can't batch a query with {len(fields)} root fields")
+    return _Operation(
+        type=match["type"] or "query",
+        definitions=(match["definitions"] or "").strip(),
+        body=body,
+        root_field=fields[0],
+        variables=request.get("variables") or {},
+    )
+
+
+def _root_fields(body: str) -> list[str]:
+    """Names of the top-level fields in a selection set body."""
+    fields = []
+    depth = 0
+    for token in re.finditer(r"[{}()]|\w+", body):
+        match token.group():
+            case "{" | "(":
+                depth += 1
+            case "}" | ")":
+                depth -= 1
+            case name if depth == 0 and not body[token.end() :].lstrip().startswith(":"):
+                # an alias is followed by a colon, the field is what comes after it
+                fields.append(name)
+    return fields
+
+
+def _alias(index: int) -> str:
+    return f"b{index}"
+
+
+def merge(operations: list[_Operation]) -> JSONDict:
+    """Merge operations of the same type into a single request."""
+    definitions = []
+    bodies = []
+    variables = {}
+    for index, operation in enumerate(operations):
+        alias = _alias(index)
+
+        def prefix(match, alias=alias):
+            return f"${alias}_{match[1]}"
+
+        if operation.definitions:
+            definitions.append(_VARIABLE_RE.sub(prefix, operation.definitions))
+        bodies.append(f"{alias}: {_VARIABLE_RE.sub(prefix, operation.body)}")
+        variables.update({f"{alias}_{name}": value for name, value in operation.variables.items()})
+
+    operation_type = operations[0].type
+    header = f"{operation_type} ({', '.join(definitions)})" if definitions else operation_type
+    request: JSONDict = {"query": f"{header} {{ {' '.join(bodies)} }}"}
+    if variables:
+        request["variables"] = variables
+    return request
+
+
+def split(operations: list[_Operation], response: JSONDict) -> list[JSONDict]:
+    """Split the response to a merged request into one result per operation."""
+    if "data" not in response and "errors" not in response:
+        # not a GraphQL result at all (e.g. an expired token), it applies to every call
+        return [response for _ in operations]
+
+    data = response.get("data")
+    errors = response.get("errors") or []
+    results = []
+    for index, operation in enumerate(operations):
+        alias = _alias(index)
+        result: JSONDict = {
+            "data": None if data is None else {operation.root_field: data.get(alias)}
+        }
+        own_errors = []
+        for error in errors:
+            path = error.get("path")
+            if not path:
+                # request-level errors concern every call
+                own_errors.append(error)
+            elif path[0] == alias:
+                own_errors.append(error | {"path": [operation.root_field, *path[1:]]})
+        if own_errors:
+            result["errors"] = own_errors
+        results.append(result)
+    return results
+
+
+def batches(
+    calls: Iterable[SnippetCall], batch_size: int = DEFAULT_BATCH_SIZE
+) -> Iterator[list[_Operation]]:
+    """
+    Build the calls and group them into batches that can be merged.
+
+    Queries and mutations can't share a document, so a batch also ends whenever the
+    operation type changes. Calls keep their order across batches.
+    """
+    if batch_size < 1:
+        raise ValueError("batch_size must be at least 1")
+    batch: list[_Operation] = []
+    for snippet_class, variables in calls:
+        operation = _parse(snippet_class.build(variables))
+        operation.retryable = snippet_class.retryable()
+        if batch and (len(batch) == batch_size or batch[0].type != operation.type):
+            yield batch
+            batch = []
+        batch.append(operation)
+    if batch:
+        yield batch
@@ -0,0 +1,191 @@
+# Copyright Stacklet, Inc.
+# SPDX-License-Identifier: Apache-2.0
+
+"""
+On-disk cache for API query responses.
+
+Entries are files named after a hash of the request, the API endpoint and the token,
+written to a temporary file and renamed into place, so readers never see a partial
+one. Each entry records the entity types (e.g. "account") its snippet reads; a
+mutation marks the entity types it changes as invalidated at the current time, which
+discards entries created before then.
+
+Writes, eviction and invalidation take an exclusive lock on a file in the cache
+directory, so several processes can share the cache.
+"""
+
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterable, Iterator
+
+from .. import config
+from ..config import JSONDict
+
+if sys.platform != "win32":
+    import fcntl
+else:  # pragma: no cover
+    # not available on Windows, where writes are still atomic but not serialized
+    fcntl = None
+
+# Seconds an entry is kept unless the snippet sets its own TTL.
+DEFAULT_TTL = 300
+# Bytes the cache can grow to before least recently used entries are evicted.
+DEFAULT_MAX_SIZE = 100 * 2**20
+
+# Entity type invalidating all entries, for mutations whose effects aren't known.
+ALL_ENTITIES = "*"
+
+_ENTRY_SUFFIX = ".entry"
+
+
+class ResponseCache:
+    """Responses to read-only API queries, kept on disk for a while."""
+
+    def __init__(
+        self,
+        directory: Path | None = None,
+        ttl: float = DEFAULT_TTL,
+        max_size: int = DEFAULT_MAX_SIZE,
+    ):
+        self._directory = directory
+        self.ttl = ttl
+        self.max_size = max_size
+
+    @property
+    def directory(self) -> Path:
+        if self._directory is not None:
+            return self._directory
+        return config.DEFAULT_CONFIG_DIR / "cache"
+
+    def key(self, api: str, token: str, request: JSONDict) -> str:
+        """The cache key for a request sent to an API with a token."""
+        identity = hashlib.sha256(token.encode()).hexdigest()
+        data = json.dumps([api, identity, request], sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(data.encode()).hexdigest()
+
+    def get(self, key: str) -> bytes | None:
+        """Return the cached response body for a key, if there's a valid one."""
+        path = self._entry_path(key)
+        try:
+            data = path.read_bytes()
+        except FileNotFoundError:
+            return None
+        try:
+            header, body = data.split(b"\n", 1)
+            entry = json.loads(header)
+        except ValueError:
+            # not an entry this version wrote
+            path.unlink(missing_ok=True)
+            return None
+        entities = [ALL_ENTITIES, *entry["entities"]]
+        if entry["expires"] < time.time() or any(
+            self._invalidated_at(entity) >= entry["created"] for entity in entities
+        ):
+            path.unlink(missing_ok=True)
+            return None
+        # the modification time tracks use, for eviction
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        return body
+
+    def put(
+        self,
+        key: str,
+        body: bytes,
+        entities: Iterable[str],
+        created: int,
+        ttl: float | None = None,
+    ):
+        """
+        Store a response body.
+
+        `created` is the time (in nanoseconds) the request was sent: a mutation
+        invalidating the entities after that makes the entry stale, even if it
+        completed before the response was stored.
+        """
+        ttl = self.ttl if ttl is None else ttl
+        if ttl <= 0:
+            return
+        header = {"created": created, "expires": time.time() + ttl, "entities": sorted(entities)}
+        with self._lock():
+            self._write(self._entry_path(key), json.dumps(header).encode() + b"\n" + body)
+            self._evict()
+
+    def invalidate(self, entities: Iterable[str]):
+        """Discard entries for the given entity types."""
+        now = str(time.time_ns()).encode()
+        with self._lock():
+            for entity in entities:
+                self._write(self._invalidations_dir / entity, now)
+
+    def clear(self):
+        """Remove all entries."""
+        with self._lock():
+            for path in self._entries():
+                path.unlink(missing_ok=True)
+
+    @property
+    def _invalidations_dir(self) -> Path:
+        return self.directory / "invalidated"
+
+    def _entry_path(self, key: str) -> Path:
+        return self.directory / f"{key}{_ENTRY_SUFFIX}"
+
+    def _entries(self) -> Iterator[Path]:
+        if self.directory.exists():
+            yield from self.directory.glob(f"*{_ENTRY_SUFFIX}")
+
+    def _invalidated_at(self, entity: str) -> int:
+        try:
+            return int((self._invalidations_dir / entity).read_bytes())
+        except (FileNotFoundError, ValueError):
+            return 0
+
+    def _write(self, path: Path, data: bytes):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+    def _evict(self):
+        """Remove least recently used entries while the cache is over its size."""
+        entries = []
+        for path in self._entries():
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime_ns, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        if total <= self.max_size:
+            return
+        for _, size, path in sorted(entries, key=lambda entry: entry[0]):
+            path.unlink(missing_ok=True)
+            total -= size
+            if total <= self.max_size:
+                break
+
+    @contextmanager
+    def _lock(self) -> Iterator[None]:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with (self.directory / ".lock").open("a") as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_UN)
@@ -2,13 +2,24 @@
 # SPDX-License-Identifier: Apache-2.0
 
 from dataclasses import dataclass
-from typing import Any, Callable
+from typing import Any, Callable, Iterator
 
 import click
+import jmespath
 
+from ..checkpoint import CheckpointMismatch, CheckpointStore, validate_id
+from ..config import JSONDict
 from ..context import StackletContext
+from ..formatter import Formatter, JSONFormatter
+from ..pagination import merge_pages
 from ..utils import PAGINATION_OPTIONS, wrap_command
-from .snippet import GraphQLSnippet
+from .snippet import (
+    PROFILES,
+    GraphQLSnippet,
+    count_snippet,
+    profiled_snippet,
+    projected_snippet,
+)
 
 
 def snippet_options(snippet_class: type[GraphQLSnippet]):
@@ -41,7 +52,145 @@ def run_graphql(
     if raw:
         return res
     fmt = context.formatter()
-    return fmt(res)
+    return fmt(_formatted_value(fmt, snippet_class, res))
+
+
+def echo_graphql(context: StackletContext, snippet_class: type[GraphQLSnippet], variables=None):
+    """
+    Run a graphql snippet and write out the formatted response.
+
+    JSON output (pretty or compact, with the ndjson format) is laid out as the response
+    is read, without decoding it.
+    """
+    fmt = context.formatter()
+    if not isinstance(fmt, JSONFormatter):
+        click.echo(run_graphql(context, snippet_class=snippet_class, variables=variables))
+        return
+    chunks = context.executor.stream_snippet(
+        snippet_class, variables=variables, transform_variables=True
+    )
+    for text in fmt.reformat(chunks):
+        click.echo(text, nl=False)
+    click.echo()
+
+
+def _formatted_value(
+    fmt: Formatter, snippet_class: type[GraphQLSnippet] | None, result: JSONDict
+) -> Any:
+    """What to format from a response: the whole of it, or its results for records."""
+    if not fmt.records or snippet_class is None or snippet_class.result_expr is None:
+        return result
+    if result.get("errors"):
+        raise click.ClickException(f"Query failed: {result['errors']}")
+    return jmespath.search(snippet_class.result_expr, result)
+
+
+def _check_result(result: JSONDict, hint: str = ""):
+    """Fail if a response reports errors, or isn't a GraphQL result at all."""
+    if "message" in result and "data" not in result:
+        # e.g. an expired token
+        raise click.ClickException(f"Query failed{hint}: {result['message']}")
+    if result.get("errors"):
+        raise click.ClickException(f"Query failed{hint}: {result['errors']}")
+
+
+def iter_graphql_pages(
+    context: StackletContext,
+    snippet_class: type[GraphQLSnippet],
+    variables: JSONDict,
+    checkpoint_id: str | None = None,
+    limit: int | None = None,
+    prefetch: int = 0,
+) -> Iterator[JSONDict]:
+    """
+    Run a paginated snippet, yielding the response for each page as it's fetched.
+
+    Pages come from the client's method for the snippet, so pagination, limits and
+    checkpoints follow the same rules as for `StackletPlatformClient`.
+    """
+    # the client pulls in the mirror, which commands don't need loaded up front
+    from ..client import PlatformApiError, _SnippetMethod
+
+    method = _SnippetMethod(
+        snippet_class, context.executor, pager=True, expr=False, checkpoints=CheckpointStore()
+    )
+    hint = ""
+    if checkpoint_id is not None:
+        hint = f", run again with --resume {checkpoint_id} to continue"
+    try:
+        # the snippet already selects the fields asked for, and "full" keeps them
+        yield from method.iter_pages(
+            prefetch=prefetch,
+            checkpoint=checkpoint_id,
+            limit=limit,
+            profile="full",
+            **snippet_class.transform_variables(variables),
+        )
+    except CheckpointMismatch as err:
+        raise click.ClickException(f"{err}, use a different ID")
+    except PlatformApiError as err:
+        raise click.ClickException(f"Query failed{hint}: {err}")
+
+
+def run_graphql_pages(
+    context: StackletContext,
+    snippet_class: type[GraphQLSnippet],
+    variables: JSONDict,
+    checkpoint_id: str | None = None,
+    limit: int | None = None,
+) -> str:
+    """
+    Run a paginated snippet through all pages (up to the limit, if any), optionally
+    saving progress in a checkpoint.
+
+    Pages are merged in a single response.
+    """
+    pagination_expr = snippet_class.pagination_expr
+    assert pagination_expr is not None, f"{snippet_class.name} isn't paginated"
+    pages = list(iter_graphql_pages(context, snippet_class, variables, checkpoint_id, limit))
+    fmt = context.formatter()
+    return fmt(_formatted_value(fmt, snippet_class, merge_pages(pages, pagination_expr)))
+
+
+def stream_graphql_items(
+    context: StackletContext,
+    snippet_class: type[GraphQLSnippet],
+    variables: JSONDict,
+    checkpoint_id: str | None = None,
+    limit: int | None = None,
+):
+    """
+    Run a paginated snippet through all pages, writing out each result node as soon
+    as its page arrives.
+
+    The next page is fetched while the current one is written out. Output is in the
+    streaming variant of the output format (e.g. one JSON document per line).
+    """
+    pages = iter_graphql_pages(context, snippet_class, variables, checkpoint_id, limit, 1)
+    nodes = (
+        node for page in pages for node in jmespath.search(snippet_class.result_expr, page) or ()
+    )
+    fmt = context.formatter()
+    for output in fmt.stream(nodes):
+        click.echo(output)
+
+
+def run_graphql_count(context: StackletContext, snippet_class: type[GraphQLSnippet]) -> int:
+    """Return the total number of items in a listing, without fetching any."""
+    count_class = count_snippet(snippet_class)
+    result = context.executor.run_snippet(count_class)
+    _check_result(result)
+    return jmespath.search(count_class.result_expr, result)
+
+
+def _checkpoint_id(ctx, param, value):
+    """Callback for the --resume option to validate the checkpoint ID."""
+    if value is None:
+        return value
+    try:
+        return validate_id(value)
+    except ValueError as err:
+        raise click.BadParameter(str(err))
 
 
 @dataclass
@@ -74,10 +223,101 @@ def _graphql_snippet_command(cmd: GraphQLCommand):
 
     @snippet_options(cmd.snippet_class)
     @click.pass_obj
-    def command(context: StackletContext, **cli_args):
+    def command(
+        context: StackletContext,
+        all_pages: bool = False,
+        resume_id: str | None = None,
+        limit: int | None = None,
+        count: bool = False,
+        fields: tuple[str, ...] | None = None,
+        profile: str | None = None,
+        **cli_args,
+    ):
         if cmd.pre_check:
             cli_args = cmd.pre_check(context, cli_args)
 
-        click.echo(run_graphql(context, snippet_class=cmd.snippet_class, variables=cli_args))
+        if fields:
+            snippet_class = projected_snippet(cmd.snippet_class, fields)
+        else:
+            snippet_class = profiled_snippet(cmd.snippet_class, profile)
+        if count:
+            click.echo(run_graphql_count(context, snippet_class))
+            return
+        if all_pages:
+            stream_graphql_items(context, snippet_class, cli_args, resume_id, limit)
+            return
+        if resume_id is not None or limit is not None:
+            click.echo(run_graphql_pages(context, snippet_class, cli_args, resume_id, limit))
+        else:
+            echo_graphql(context, snippet_class, cli_args)
+
+    def parse_fields(ctx, param, value):
+        """Callback for the --fields option, checking the fields are selected."""
+        if value is None:
+            return value
+        fields = tuple(field.strip() for field in value.split(",") if field.strip())
+        try:
+            projected_snippet(cmd.snippet_class, fields)
+        except ValueError as err:
+            raise click.BadParameter(str(err))
+        return fields
+
+    if cmd.snippet_class.pagination_expr is not None:
+        command = click.option(
+            "--resume",
+            "resume_id",
+            metavar="ID",
+            callback=_checkpoint_id,
+            help=(
+                "Fetch all pages, saving progress under the given checkpoint ID. "
+                "Run again with the same ID to continue after an interruption."
+            ),
+        )(command)
+        command = click.option(
+            "--limit",
+            type=click.IntRange(min=1),
+            help=(
+                "Fetch pages until this many results, requesting no more than needed. "
+                "Results are merged in a single response, or streamed with --all"
+            ),
+        )(command)
+        command = click.option(
+            "--all",
+            "all_pages",
+            is_flag=True,
+            help=(
+                "Fetch all pages, writing out each result as it arrives "
+                "(one JSON document per line with JSON or NDJSON output, "
+                "one row per result with CSV or table output)"
+            ),
+        )(command)
+
+    if cmd.snippet_class.profiles:
+        command = click.option(
+            "--profile",
+            type=click.Choice(PROFILES),
+            help=(
+                "Fields of results to fetch, from minimal to full "
+                f"(default: {cmd.snippet_class.default_profile()})"
+            ),
+        )(command)
+
+    if cmd.snippet_class.result_expr is not None or cmd.snippet_class.profiles:
+        command = click.option(
+            "--fields",
+            metavar="FIELD,...",
+            callback=parse_fields,
+            help=(
+                "Only fetch these fields of results, comma-separated, with dots for "
+                "subfields (e.g. uuid,name,commit.hash), instead of a profile's"
+            ),
+        )(command)
+
+    if cmd.snippet_class.connection() is not None:
+        command = click.option(
+            "--count",
+            is_flag=True,
+            help="Only print the total number of results, without fetching any",
+        )(command)
 
     return click.command(name=cmd.name, help=cmd.help)(command)
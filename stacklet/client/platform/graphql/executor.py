@@ -3,34 +3,119 @@
 
 import json
 import logging
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Iterable, Iterator
 
 import requests
+from requests.adapters import DEFAULT_POOLSIZE, HTTPAdapter
 
+from ..codec import JSONCodec, get_codec
 from ..config import JSONDict
 from ..utils import USER_AGENT
+from . import batch, persisted
+from .cache import ALL_ENTITIES, ResponseCache
+from .retry import RetryPolicy, RetryStats, parse_retry_after
 from .snippet import AdHocSnippet, GraphQLSnippet
 
+# Bytes read at a time from streamed responses.
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+@dataclass(frozen=True)
+class ResponseStats:
+    """Measurements of a response from the API."""
+
+    # seconds from sending the request to having the whole response, retries included
+    elapsed: float
+    # size of the response body in bytes
+    size: int
+
+
+class RequestCancelled(KeyboardInterrupt):
+    """
+    A request wasn't sent, as the executor was cancelled. It's handled like an
+    interrupt, which is what cancels commands run in-process.
+    """
+
 
 class GraphQLExecutor:
     """Execute Graphql queries against the API."""
 
-    def __init__(self, api: str, token: str):
+    def __init__(
+        self,
+        api: str,
+        token: str,
+        pool_size: int = DEFAULT_POOLSIZE,
+        retry: RetryPolicy | None = None,
+        codec: JSONCodec | None = None,
+        persisted_queries: bool = False,
+        timeout: float | None = None,
+        cache: ResponseCache | None = None,
+        persisted_hashes: persisted.PersistedHashes | None = None,
+        cancelled: threading.Event | None = None,
+    ):
         self.api = api
         self.token = token
+        self.timeout = timeout
+        # once set, requests (and retries) aren't sent anymore
+        self.cancelled = cancelled
+        self.cache = cache
+        self.persisted_queries = persisted_queries
+        # hashes of the queries the server is known to have persisted
+        self.persisted_hashes = persisted_hashes or persisted.PersistedHashes()
+        self.codec = codec or get_codec()
+        self.retry = retry or RetryPolicy()
+        self.retry_stats = RetryStats()
         self.log = logging.getLogger("GraphQLExecutor")
+        # per thread, since requests can be sent from several at once
+        self._local = threading.local()
 
         self.session = requests.Session()
         self.session.headers.update(
             {
                 "Authorization": f"Bearer {token}",
+                "Content-Type": "application/json",
                 "User-Agent": USER_AGENT,
             }
         )
+        if pool_size != DEFAULT_POOLSIZE:
+            # Callers issuing requests from many threads at once need as many pooled
+            # connections, or urllib3 discards (and later reopens) the extra ones.
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+            self.session.mount("https://", adapter)
+            self.session.mount("http://", adapter)
+
+    def close(self):
+        """Close the session's pooled connections."""
+        self.session.close()
+
+    @property
+    def last_response(self) -> ResponseStats | None:
+        """Stats for the last response received in the current thread."""
+        return getattr(self._local, "last_response", None)
+
+    @contextmanager
+    def read_timeout_retries(self, enabled: bool) -> Iterator[None]:
+        """
+        Set whether requests sent from the current thread within the block are retried
+        when reading the response times out.
+
+        Callers reacting to timeouts themselves (e.g. by asking for smaller pages) turn
+        them off, so that a request that's too slow fails on the first attempt.
+        """
+        saved = getattr(self._local, "retry_read_timeouts", True)
+        self._local.retry_read_timeouts = enabled
+        try:
+            yield
+        finally:
+            self._local.retry_read_timeouts = saved
 
     def run_query(self, query: str) -> JSONDict:
         """Run a literal GraphQL query string."""
-        snippet = type("AdHocSnippet", (AdHocSnippet,), {"snippet": query})
-        return self.run_snippet(snippet)
+        return self.run_snippet(adhoc_snippet(query))
 
     def run_snippet(
         self,
@@ -42,7 +127,250 @@ def run_snippet(
         if transform_variables:
             variables = snippet_class.transform_variables(variables)
         request = snippet_class.build(variables)
-        self.log.debug("Request: %s" % json.dumps(request, indent=2))
-        res = self.session.post(self.api, json=request)
-        self.log.debug("Response: %s" % json.dumps(res.json(), indent=2))
-        return res.json()
+        if (cache := self.cache) is not None:
+            return self._run_cached(cache, snippet_class, request)
+        return self.post(request, retry=snippet_class.retryable())
+
+    def run_many(
+        self,
+        snippet_class: type[GraphQLSnippet],
+        variables: Iterable[JSONDict | None],
+        transform_variables: bool = False,
+        batch_size: int = batch.DEFAULT_BATCH_SIZE,
+    ) -> list[JSONDict]:
+        """
+        Run a graphql snippet once per set of variables, batching calls in few requests.
+
+        Results are in the same order as the variables, each shaped as `run_snippet`
+        would return it.
+        """
+        return self.run_batch(
+            ((snippet_class, v) for v in variables),
+            transform_variables=transform_variables,
+            batch_size=batch_size,
+        )
+
+    def run_batch(
+        self,
+        calls: Iterable[batch.SnippetCall],
+        transform_variables: bool = False,
+        batch_size: int = batch.DEFAULT_BATCH_SIZE,
+    ) -> list[JSONDict]:
+        """
+        Run several (snippet class, variables) calls, merging up to `batch_size` of
+        them in each request.
+
+        Each call's root field is aliased and its variables prefixed, so snippets can
+        be freely mixed and repeated. Results are in the same order as the calls, each
+        shaped as `run_snippet` would return it, with errors mapped to the call that
+        caused them.
+        """
+        if transform_variables:
+            calls = ((s, s.transform_variables(v)) for s, v in calls)
+        cache = self.cache
+        changed: set[str] = set()
+        if cache is not None:
+            # batched queries aren't cached, but mutations still invalidate
+            calls = list(calls)
+            for snippet_class, _ in calls:
+                if snippet_class.operation_type() == "mutation":
+                    changed.update(self._changed_entities(snippet_class))
+        results = []
+        try:
+            for operations in batch.batches(calls, batch_size=batch_size):
+                retry = all(operation.retryable for operation in operations)
+                response = self.post(batch.merge(operations), retry=retry)
+                results.extend(batch.split(operations, response))
+        finally:
+            if cache is not None and changed:
+                cache.invalidate(changed)
+        return results
+
+    def post(self, request: JSONDict, retry: bool = True) -> JSONDict:
+        """
+        Send a built request to the API, returning the decoded response.
+
+        Failures are retried according to the retry policy, unless `retry` is False
+        because the request isn't safe to send twice.
+
+        With persisted queries enabled, the full query text is sent along with its hash
+        the first time, which registers it on the server, and only the hash after that.
+        """
+        if self.persisted_queries and "query" in request:
+            return self._post_persisted(request, retry)
+        return self._post(request, retry)
+
+    def stream_snippet(
+        self,
+        snippet_class: type[GraphQLSnippet],
+        variables: JSONDict | None = None,
+        transform_variables: bool = False,
+    ) -> Iterator[bytes]:
+        """
+        Run a graphql snippet, yielding the JSON response body in chunks as it's read.
+
+        The response isn't decoded, for callers writing it out as it is. Persisted
+        queries, the response cache and debug logging need the decoded response, and
+        so do error statuses, which may not have a JSON body: in those cases the
+        response is decoded, and encoded again.
+        """
+        if transform_variables:
+            variables = snippet_class.transform_variables(variables)
+        if self.persisted_queries or self.cache is not None or self.log.isEnabledFor(logging.DEBUG):
+            yield self.codec.dumps(self.run_snippet(snippet_class, variables))
+            return
+
+        request = snippet_class.build(variables)
+        start = time.monotonic()
+        res = self._send(self.codec.dumps(request), snippet_class.retryable(), stream=True)
+        with res:
+            if not res.ok:
+                yield self.codec.dumps(self.codec.loads(res.content))
+                return
+            size = 0
+            for chunk in res.iter_content(STREAM_CHUNK_SIZE):
+                size += len(chunk)
+                yield chunk
+        self._local.last_response = ResponseStats(time.monotonic() - start, size)
+
+    def _run_cached(
+        self, cache: ResponseCache, snippet_class: type[GraphQLSnippet], request: JSONDict
+    ) -> JSONDict:
+        """Run a built snippet request through the response cache."""
+        if snippet_class.operation_type() == "mutation":
+            try:
+                return self.post(request, retry=snippet_class.retryable())
+            finally:
+                # even a failed mutation may have changed something
+                cache.invalidate(self._changed_entities(snippet_class))
+        if issubclass(snippet_class, AdHocSnippet) or snippet_class.cache_ttl == 0:
+            return self.post(request)
+
+        key = cache.key(self.api, self.token, request)
+        if (body := cache.get(key)) is not None:
+            self._local.last_response = ResponseStats(0.0, len(body))
+            return self.codec.loads(body)
+        created = time.time_ns()
+        result = self.post(request)
+        if "data" in result and not result.get("errors"):
+            cache.put(
+                key,
+                self.codec.dumps(result),
+                snippet_class.cache_entities(),
+                created,
+                ttl=snippet_class.cache_ttl,
+            )
+        return result
+
+    def _changed_entities(self, snippet_class: type[GraphQLSnippet]) -> frozenset[str]:
+        if issubclass(snippet_class, AdHocSnippet):
+            # an arbitrary mutation could change anything
+            return frozenset({ALL_ENTITIES})
+        return snippet_class.cache_entities()
+
+    def _post_persisted(self, request: JSONDict, retry: bool) -> JSONDict:
+        """
+        Send a request as a persisted query: by hash only if the server is known to
+        have registered it (by this executor, or an earlier one saving hashes in the
+        same place), with the full text and hash otherwise, registering it.
+        """
+        query = request["query"]
+        extensions = persisted.extensions(query)
+        digest = extensions["persistedQuery"]["sha256Hash"]
+
+        if digest in self.persisted_hashes:
+            hashed = {k: v for k, v in request.items() if k != "query"}
+            result = self._post(hashed | {"extensions": extensions}, retry)
+            match persisted.error(result):
+                case None:
+                    return result
+                case persisted.NOT_SUPPORTED:
+                    self._disable_persisted_queries()
+                    return self._post(request, retry)
+                case persisted.NOT_FOUND:
+                    # the server dropped it, the full text registers it again
+                    self.persisted_hashes.discard(digest)
+
+        # the full text registers the query, so later requests only send the hash
+        result = self._post(request | {"extensions": extensions}, retry)
+        match persisted.error(result):
+            case None:
+                self.persisted_hashes.add(digest)
+            case persisted.NOT_SUPPORTED:
+                self._disable_persisted_queries()
+                result = self._post(request, retry)
+        return result
+
+    def _disable_persisted_queries(self):
+        self.log.info("Persisted queries not supported by the server, disabling")
+        self.persisted_queries = False
+        self.persisted_hashes.clear()
+
+    def _post(self, request: JSONDict, retry: bool) -> JSONDict:
+        # formatting for the log costs as much as decoding, only do it when it's seen
+        debug = self.log.isEnabledFor(logging.DEBUG)
+        if debug:
+            self.log.debug("Request: %s", json.dumps(request, indent=2))
+        start = time.monotonic()
+        res = self._send(self.codec.dumps(request), retry)
+        content = res.content
+        self._local.last_response = ResponseStats(time.monotonic() - start, len(content))
+        result = self.codec.loads(content)
+        if debug:
+            self.log.debug("Response: %s", json.dumps(result, indent=2))
+        return result
+
+    def _send(self, body: bytes, retry: bool, stream: bool = False) -> requests.Response:
+        policy = self.retry
+        max_attempts = policy.max_attempts if retry else 1
+        deadline = None if policy.budget is None else time.monotonic() + policy.budget
+
+        attempt = 0
+
+        def exhausted(delay: float) -> bool:
+            out_of_time = deadline is not None and time.monotonic() + delay > deadline
+            if attempt < max_attempts and not out_of_time:
+                return False
+            if retry:
+                self.retry_stats.record_exhausted()
+            return True
+
+        while True:
+            if self.cancelled is not None and self.cancelled.is_set():
+                raise RequestCancelled()
+            attempt += 1
+            self.retry_stats.record_request()
+            failure: Exception | str
+            try:
+                res = self.session.post(self.api, data=body, timeout=self.timeout, stream=stream)
+            except (requests.ConnectionError, requests.Timeout) as err:
+                if isinstance(err, requests.ReadTimeout) and not getattr(
+                    self._local, "retry_read_timeouts", True
+                ):
+                    raise
+                delay = policy.delay(attempt, None)
+                if exhausted(delay):
+                    raise
+                failure = err
+            else:
+                if res.status_code not in policy.statuses:
+                    return res
+                delay = policy.delay(attempt, parse_retry_after(res.headers.get("Retry-After")))
+                if exhausted(delay):
+                    return res
+                # release the connection, the body may not have been read
+                res.close()
+                failure = f"HTTP {res.status_code}"
+
+            self.log.info("Retrying in %.2fs after attempt %d failed: %s", delay, attempt, failure)
+            self.retry_stats.record_retry(delay)
+            if self.cancelled is None:
+                time.sleep(delay)
+            else:
+                # woken up early if cancelled meanwhile
+                self.cancelled.wait(delay)
+
+
+def adhoc_snippet(query: str) -> type[GraphQLSnippet]:
+    """Wrap a literal GraphQL query string in a snippet class."""
+    return type("AdHocSnippet", (AdHocSnippet,), {"snippet": query})
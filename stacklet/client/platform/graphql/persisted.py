@@ -0,0 +1,130 @@
+# Copyright Stacklet, Inc.
+# SPDX-License-Identifier: Apache-2.0
+
+"""
+Automatic persisted queries.
+
+Rather than the query text, a request can carry the query's SHA-256 hash, which the
+server resolves from the queries it has seen before. A query is sent in full (with its
+hash) the first time, which registers it, and only by hash after that. If the server
+has since dropped it, it answers with a "not found" error, and the request is sent
+again with the full text.
+
+The hashes of registered queries are saved per API, so that later runs (e.g. one-off
+CLI commands) send queries registered by earlier ones by hash only.
+"""
+
+import hashlib
+import os
+import tempfile
+import threading
+from functools import lru_cache
+from pathlib import Path
+
+from .. import config
+from ..config import JSONDict
+
+NOT_FOUND = "PERSISTED_QUERY_NOT_FOUND"
+NOT_SUPPORTED = "PERSISTED_QUERY_NOT_SUPPORTED"
+
+# Servers report the problem in the error code, or (in older implementations) only in
+# the message.
+_ERROR_MESSAGES = {
+    "PersistedQueryNotFound": NOT_FOUND,
+    "PersistedQueryNotSupported": NOT_SUPPORTED,
+}
+
+
+@lru_cache(maxsize=1024)
+def query_hash(query: str) -> str:
+    """The hash identifying a query."""
+    return hashlib.sha256(query.encode()).hexdigest()
+
+
+def extensions(query: str) -> JSONDict:
+    """The request extensions referring to a persisted query."""
+    return {"persistedQuery": {"version": 1, "sha256Hash": query_hash(query)}}
+
+
+def error(result: JSONDict) -> str | None:
+    """The persisted query error a response reports, if any."""
+    for err in result.get("errors") or ():
+        code = (err.get("extensions") or {}).get("code")
+        if code in (NOT_FOUND, NOT_SUPPORTED):
+            return code
+        if code := _ERROR_MESSAGES.get(err.get("message")):
+            return code
+    return None
+
+
+class PersistedHashes:
+    """
+    Hashes of the queries an API is known to have persisted.
+
+    With a path, they're loaded from a file, one per line, and changes are saved there.
+    Otherwise they're only kept in memory.
+    """
+
+    def __init__(self, path: Path | None = None):
+        self.path = path
+        self._hashes: set[str] | None = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def for_api(cls, api: str, directory: Path | None = None) -> "PersistedHashes":
+        """Hashes saved for an API, in ~/.stacklet/persisted unless in a directory."""
+        directory = directory or config.DEFAULT_CONFIG_DIR / "persisted"
+        return cls(directory / hashlib.sha256(api.encode()).hexdigest()[:16])
+
+    def __contains__(self, digest: str) -> bool:
+        with self._lock:
+            return digest in self._load()
+
+    def add(self, digest: str):
+        with self._lock:
+            hashes = self._load()
+            if digest in hashes:
+                return
+            hashes.add(digest)
+            if self.path is not None:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                # appends of a line don't interleave with other processes'
+                with self.path.open("a") as f:
+                    f.write(digest + "\n")
+
+    def discard(self, digest: str):
+        with self._lock:
+            hashes = self._load()
+            if digest not in hashes:
+                return
+            hashes.discard(digest)
+            self._save(hashes)
+
+    def clear(self):
+        with self._lock:
+            self._hashes = set()
+            if self.path is not None:
+                self.path.unlink(missing_ok=True)
+
+    def _load(self) -> set[str]:
+        if self._hashes is None:
+            self._hashes = set()
+            if self.path is not None:
+                try:
+                    self._hashes.update(self.path.read_text().split())
+                except FileNotFoundError:
+                    pass
+        return self._hashes
+
+    def _save(self, hashes: set[str]):
+        if self.path is None:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.path.parent, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "w") as f:
+                f.writelines(digest + "\n" for digest in sorted(hashes))
+            os.replace(tmp, self.path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
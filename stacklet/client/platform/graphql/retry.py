@@ -0,0 +1,85 @@
+# Copyright Stacklet, Inc.
+# SPDX-License-Identifier: Apache-2.0
+
+import random
+import threading
+import time
+from dataclasses import dataclass, field
+from email.utils import parsedate_to_datetime
+
+# Statuses worth another try: throttling and the gateway errors a busy or
+# redeploying API answers with.
+RETRY_STATUSES = frozenset({429, 502, 503, 504})
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    """
+    How failed requests are retried.
+
+    Requests failing with one of `statuses`, or without a response at all (a
+    connection error or timeout), are tried again up to `max_attempts` times in
+    total. Waits between attempts grow exponentially from `backoff` up to
+    `max_backoff` seconds, with full jitter so concurrent clients spread out, unless
+    the response says how long to wait with a Retry-After header. No retry starts
+    once a call has taken `budget` seconds overall.
+    """
+
+    max_attempts: int = 5
+    backoff: float = 0.5
+    max_backoff: float = 30.0
+    jitter: bool = True
+    budget: float | None = 120.0
+    statuses: frozenset[int] = RETRY_STATUSES
+
+    def delay(self, attempt: int, retry_after: float | None = None) -> float:
+        """Seconds to wait after the given (1-based) failed attempt."""
+        if retry_after is not None:
+            return retry_after
+        delay = min(self.max_backoff, self.backoff * 2 ** (attempt - 1))
+        if self.jitter:
+            delay = random.uniform(0, delay)
+        return delay
+
+
+# A policy for callers that don't want retries.
+NO_RETRY = RetryPolicy(max_attempts=1)
+
+
+@dataclass
+class RetryStats:
+    """Counters for the retries an executor made, safe to update from many threads."""
+
+    requests: int = 0
+    retries: int = 0
+    exhausted: int = 0
+    wait_time: float = 0.0
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+    def record_request(self):
+        with self._lock:
+            self.requests += 1
+
+    def record_retry(self, delay: float):
+        with self._lock:
+            self.retries += 1
+            self.wait_time += delay
+
+    def record_exhausted(self):
+        with self._lock:
+            self.exhausted += 1
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    """Seconds to wait according to a Retry-After header, either delay or date."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, when.timestamp() - time.time())
@@ -1,10 +1,15 @@
 # Copyright Stacklet, Inc.
 # SPDX-License-Identifier: Apache-2.0
 
-from typing import Any, Callable, ClassVar
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Callable, ClassVar, Iterable
 
 from ..config import JSONDict
 
+# Selection profiles, from the leanest. "full" is everything the snippet selects.
+PROFILES = ("minimal", "standard", "full")
+
 
 class GraphQLSnippet:
     """
@@ -66,6 +71,26 @@ class MySnippet(GraphQLSnippet):
     pagination_expr: ClassVar[str | None] = None
     # JMESPath expression for extracting result data from response
     result_expr: ClassVar[str | None] = None
+    # JMESPath expression for the connection of a listing, used to count its items.
+    # Defaults to the parent of pagination_expr
+    connection_expr: ClassVar[str | None] = None
+    # Largest page worth requesting when page sizes adapt, for listings with heavy nodes.
+    # Projections leaving out the fields the standard profile does aren't capped
+    max_page_size: ClassVar[int | None] = None
+    # Whether a mutation can safely be sent again, e.g. after a connection reset
+    # where it's unknown whether the server got it. Queries always can.
+    idempotent: ClassVar[bool] = False
+    # Entity types a query reads or a mutation changes, for invalidating cached
+    # responses. Defaults to the one named by the snippet's module, e.g. "account"
+    entities: ClassVar[frozenset[str] | None] = None
+    # Seconds a query's response can be cached for, when caching is enabled.
+    # Defaults to the cache's TTL, 0 disables caching
+    cache_ttl: ClassVar[float | None] = None
+    # Fields of results selected by the lean profiles ("minimal" and "standard"), for
+    # snippets whose results carry heavy fields. Others always select everything
+    profiles: ClassVar[dict[str, tuple[str, ...]]] = {}
+
+    _template: ClassVar["SnippetTemplate | None"] = None
 
     def __init__(self):
         raise RuntimeError("instances don't do anything")
@@ -75,37 +100,69 @@ def build(cls, variables: JSONDict | None = None) -> JSONDict:
         if variables is None:
             variables = {}
 
-        if cls.snippet:
-            split_snippet = list(filter(None, cls.snippet.split("\n")))
-        else:
-            split_snippet = []
-
         # remove empty options so we can remove any optional values in the mutation/queries
-        for k in set(cls.optional).intersection(variables):
-            if variables[k] is None or variables[k] == ():
-                split_snippet = [
-                    line for line in split_snippet if f"${k.replace('-', '_')}" not in line
-                ]
+        dropped = frozenset(
+            k
+            for k in cls.optional
+            if k in variables and (variables[k] is None or variables[k] == ())
+        )
         d = {}
         if variables:
             d["variables"] = {k: v for k, v in variables.items() if v is not None and v != ()}
 
-        if var_names := d.get("variables", ()):
-            qtype, _ = split_snippet[0].strip().split(" ", 1)
-            split_snippet[0] = "%s (%s) {" % (
-                qtype,
-                (
-                    " ".join(
-                        [
-                            "$%s: %s," % (s, gql_type(variables[s], cls.parameter_types.get(s)))
-                            for s in var_names
-                        ]
-                    )
-                )[:-1],
-            )
-        d["query"] = "\n".join(split_snippet).replace('"', "")
+        definitions = tuple(
+            (s, gql_type(variables[s], cls.parameter_types.get(s))) for s in d.get("variables", ())
+        )
+        d["query"] = _render(cls, dropped, definitions)
         return d
 
+    @classmethod
+    def template(cls) -> "SnippetTemplate":
+        """The snippet compiled for building, done once per class on first use."""
+        # looked up in the class's own namespace: subclasses have their own snippet
+        if (template := cls.__dict__.get("_template")) is None:
+            template = SnippetTemplate.compile(cls.snippet, cls.optional)
+            cls._template = template
+        return template
+
+    @classmethod
+    def operation_type(cls) -> str:
+        """The GraphQL operation type, "query" or "mutation"."""
+        words = cls.snippet.split(None, 1)
+        if words and words[0] == "mutation":
+            return "mutation"
+        # a bare selection set is shorthand for a query
+        return "query"
+
+    @classmethod
+    def retryable(cls) -> bool:
+        """Whether a failed call can be retried."""
+        return cls.idempotent or cls.operation_type() == "query"
+
+    @classmethod
+    def cache_entities(cls) -> frozenset[str]:
+        """The entity types the snippet reads or changes."""
+        if cls.entities is not None:
+            return cls.entities
+        return frozenset({cls.__module__.rsplit(".", 1)[-1]})
+
+    @classmethod
+    def connection(cls) -> str | None:
+        """The path to the connection of a listing, if the snippet is one."""
+        if cls.connection_expr is not None:
+            return cls.connection_expr
+        if cls.pagination_expr is not None:
+            return cls.pagination_expr.rsplit(".", 1)[0]
+        return None
+
+    @classmethod
+    def default_profile(cls) -> str:
+        """The selection profile used unless another is asked for."""
+        # listings leave heavy fields out, single items have everything
+        if cls.connection() is not None and "standard" in cls.profiles:
+            return "standard"
+        return "full"
+
     @classmethod
     def transform_variables(cls, variables: JSONDict | None) -> JSONDict:
         variables = variables.copy() if variables else {}
@@ -132,6 +189,281 @@ def build(cls, variables: JSONDict | None = None) -> JSONDict:
         return {"query": cls.snippet}
 
 
+@lru_cache
+def count_snippet(snippet_class: type[GraphQLSnippet]) -> type[GraphQLSnippet]:
+    """
+    A snippet returning the total number of items in a listing, without any of them.
+
+    Only the connection's page info total is selected, with `first: 0` for paginated
+    connections, so the response is a single number.
+    """
+    connection = snippet_class.connection()
+    if connection is None:
+        raise ValueError(f"{snippet_class.name} isn't a listing, it can't be counted")
+
+    # the path starts from the response's "data"
+    _, *fields = connection.split(".")
+    args = "(first: 0)" if snippet_class.pagination_expr is not None else ""
+    selection = "pageInfo { total }"
+    for field in reversed(fields):
+        selection = f"{field}{args} {{ {selection} }}"
+        # arguments only go on the connection itself
+        args = ""
+    return type(
+        f"{snippet_class.__name__}Count",
+        (GraphQLSnippet,),
+        {
+            "name": f"count-{snippet_class.name}",
+            "snippet": f"query {{ {selection} }}",
+            "result_expr": f"{connection}.pageInfo.total",
+            # invalidated along with the listing it counts
+            "entities": snippet_class.cache_entities(),
+        },
+    )
+
+
+@lru_cache
+def projected_snippet(
+    snippet_class: type[GraphQLSnippet], fields: tuple[str, ...]
+) -> type[GraphQLSnippet]:
+    """
+    A snippet selecting only some fields of its results.
+
+    Fields are paths in the result nodes (e.g. "name" or "commit.hash"), and the
+    selection set at the snippet's result expression (or its root field, without one)
+    is pruned to them, leaving the rest of the query (like the connection's page
+    info) as it is. A field with subfields is kept whole unless some of them are given.
+    """
+    if not fields:
+        raise ValueError("no fields given")
+
+    head, selection, tail = _split_snippet(snippet_class.snippet)
+    if snippet_class.result_expr is not None:
+        # the path starts from the response's "data", with lists of nodes marked by "[]"
+        _, *path = snippet_class.result_expr.replace("[]", "").split(".")
+    elif len(selection) == 1:
+        path = [selection[0].key]
+    else:
+        raise ValueError(f"{snippet_class.name} has no results to select fields of")
+    nodes = selection
+    for name in path:
+        field = _find_field(nodes, name)
+        if field is None or field.selection is None:
+            raise ValueError(f"{snippet_class.name} has no results to select fields of")
+        nodes = field.selection
+    nodes[:] = _prune(nodes, _field_tree(fields))
+    return type(
+        f"{snippet_class.__name__}Projected",
+        (snippet_class,),
+        {
+            "name": f"{snippet_class.name}[{','.join(fields)}]",
+            "snippet": head + _render_selection(selection) + tail,
+            "entities": snippet_class.cache_entities(),
+            "profiles": {},
+            "max_page_size": _page_ceiling(snippet_class, fields),
+        },
+    )
+
+
+def _page_ceiling(snippet_class: type[GraphQLSnippet], fields: tuple[str, ...]) -> int | None:
+    """
+    The page size ceiling of a projection, which only keeps the snippet's one if some
+    heavy field (one the standard profile leaves out) is still selected.
+    """
+    standard = snippet_class.profiles.get("standard")
+    if standard is not None and all(field.split(".")[0] in standard for field in fields):
+        return None
+    return snippet_class.max_page_size
+
+
+def profiled_snippet(
+    snippet_class: type[GraphQLSnippet], profile: str | None = None
+) -> type[GraphQLSnippet]:
+    """
+    A snippet selecting the fields of a profile ("minimal", "standard" or "full"),
+    or the snippet's default one.
+
+    Snippets without lean profiles select everything whatever the profile.
+    """
+    if profile is None:
+        profile = snippet_class.default_profile()
+    if profile not in PROFILES:
+        raise ValueError(f"unknown profile {profile}, expected one of {', '.join(PROFILES)}")
+    fields = snippet_class.profiles.get(profile)
+    if fields is None:
+        return snippet_class
+    return projected_snippet(snippet_class, fields)
+
+
+@dataclass
+class _Field:
+    """A field in a selection set, as written in the snippet."""
+
+    # the field's name in the response (its alias, if it has one)
+    key: str
+    # the field as written, with alias and arguments
+    header: str
+    selection: "list[_Field] | None" = None
+
+
+def _split_snippet(snippet: str) -> tuple[str, list[_Field], str]:
+    """Split a snippet into the text before its selection set, the set and what follows."""
+    start = snippet.index("{")
+    selection, end = _parse_selection(snippet, start + 1)
+    return snippet[:start], selection, snippet[end:]
+
+
+def _parse_selection(text: str, pos: int) -> tuple[list[_Field], int]:
+    """
+    Parse the fields of a selection set, from after its opening brace, returning them
+    and the position after its closing brace.
+    """
+
+    def skip_space(pos: int) -> int:
+        while text[pos].isspace() or text[pos] == ",":
+            pos += 1
+        return pos
+
+    def name_end(pos: int) -> int:
+        while text[pos].isalnum() or text[pos] == "_":
+            pos += 1
+        return pos
+
+    fields: list[_Field] = []
+    while True:
+        start = pos = skip_space(pos)
+        if text[pos] == "}":
+            return fields, pos + 1
+        if text.startswith("...", pos):
+            # an inline fragment, "... on Type"
+            pos = skip_space(pos + 3)
+            if text.startswith("on", pos):
+                pos = name_end(skip_space(pos + 2))
+        else:
+            pos = name_end(pos)
+        if pos == start:
+            raise ValueError(f"unsupported selection at {text[start : start + 20]!r}")
+        key = text[start:pos]
+        if text[skip_space(pos)] == ":":
+            # an alias, followed by the field name
+            pos = name_end(skip_space(skip_space(pos) + 1))
+        header_end = pos
+        if text[skip_space(pos)] == "(":
+            pos = text.index(")", pos) + 1
+            header_end = pos
+        field = _Field(key=key, header=text[start:header_end])
+        pos = skip_space(pos)
+        if text[pos] == "{":
+            field.selection, pos = _parse_selection(text, pos + 1)
+        fields.append(field)
+
+
+def _find_field(fields: list[_Field], key: str) -> _Field | None:
+    return next((field for field in fields if field.key == key), None)
+
+
+def _field_tree(fields: Iterable[str]) -> dict[str, Any]:
+    """Nest dotted field paths, with None for fields selected whole."""
+    tree: dict[str, Any] = {}
+    for path in fields:
+        node = tree
+        *parents, last = path.strip().split(".")
+        for name in parents:
+            if node.get(name, {}) is None:
+                # the parent is already selected whole
+                break
+            node = node.setdefault(name, {})
+        else:
+            node[last] = None
+    return tree
+
+
+def _prune(fields: list[_Field], tree: dict[str, Any], path: str = "") -> list[_Field]:
+    """The fields in the tree, in the snippet's order, with their selections pruned."""
+    for key, subtree in tree.items():
+        field = _find_field(fields, key)
+        if field is None:
+            available = ", ".join(field.key for field in fields)
+            raise ValueError(f"unknown field {path}{key} (available: {available})")
+        if subtree is not None and field.selection is None:
+            raise ValueError(f"field {path}{key} has no subfields")
+    pruned = []
+    for field in fields:
+        if field.key not in tree:
+            continue
+        subtree = tree[field.key]
+        if subtree is not None:
+            selection = _prune(field.selection or [], subtree, f"{path}{field.key}.")
+            field = _Field(field.key, field.header, selection)
+        pruned.append(field)
+    return pruned
+
+
+def _render_selection(fields: list[_Field]) -> str:
+    """The text of a selection set, a field per line as snippets are written."""
+    lines = ["{"]
+    for field in fields:
+        if field.selection is None:
+            lines.append(field.header)
+        else:
+            lines.append(f"{field.header} {_render_selection(field.selection)}")
+    lines.append("}")
+    return "\n".join(lines)
+
+
+@dataclass(frozen=True)
+class SnippetTemplate:
+    """
+    A snippet preprocessed for building queries.
+
+    Lines are minified (indentation and quotes stripped), and each optional
+    variable is mapped to the lines that mention it, which are the ones left out
+    when the variable isn't set.
+    """
+
+    lines: tuple[str, ...]
+    optional_lines: dict[str, frozenset[int]]
+
+    @classmethod
+    def compile(cls, snippet: str, optional: Iterable[str]) -> "SnippetTemplate":
+        lines = tuple(
+            stripped.replace('"', "")
+            for line in (snippet or "").split("\n")
+            if (stripped := line.strip())
+        )
+        optional_lines = {}
+        for name in optional:
+            marker = f"${name.replace('-', '_')}"
+            optional_lines[name] = frozenset(n for n, line in enumerate(lines) if marker in line)
+        return cls(lines=lines, optional_lines=optional_lines)
+
+    def render(self, dropped: frozenset[str], definitions: tuple[tuple[str, str], ...]) -> str:
+        """
+        Render the query text, leaving out lines for the dropped optional
+        variables and declaring the given (name, type) variables.
+        """
+        skip = frozenset().union(*(self.optional_lines[name] for name in dropped))
+        lines = [line for n, line in enumerate(self.lines) if n not in skip]
+        if definitions:
+            qtype = lines[0].split(" ", 1)[0]
+            lines[0] = "%s (%s) {" % (
+                qtype,
+                ", ".join(f"${name}: {type_}" for name, type_ in definitions),
+            )
+        return " ".join(lines)
+
+
+@lru_cache(maxsize=4096)
+def _render(
+    snippet_class: type[GraphQLSnippet],
+    dropped: frozenset[str],
+    definitions: tuple[tuple[str, str], ...],
+) -> str:
+    # Builds only differ by which optional variables are set and the variables'
+    # types, so bulk callers get the same query text back without rebuilding it.
+    return snippet_class.template().render(dropped, definitions)
+
+
 def gql_type(v, snippet_type=None):
     if snippet_type is not None:
         return snippet_type
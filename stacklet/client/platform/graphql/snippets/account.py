@@ -5,6 +5,10 @@
 
 from ..snippet import GraphQLSnippet
 
+# Fields of the lean selection profiles, leaving out variables and the security context.
+MINIMAL_FIELDS = ("id", "key", "name", "provider")
+STANDARD_FIELDS = MINIMAL_FIELDS + ("shortName", "description", "path", "email", "tags")
+
 
 class ListAccounts(GraphQLSnippet):
     name = "list-accounts"
@@ -46,6 +50,7 @@ class ListAccounts(GraphQLSnippet):
     """
     pagination_expr = "data.accounts.pageInfo"
     result_expr = "data.accounts.edges[].node"
+    profiles = {"minimal": MINIMAL_FIELDS, "standard": STANDARD_FIELDS}
 
 
 class ShowAccount(GraphQLSnippet):
@@ -79,6 +84,7 @@ class ShowAccount(GraphQLSnippet):
         "key": "Account key -- Account ID for AWS, Subscription ID for Azure, Project ID for GCP",
     }
     parameter_types = {"provider": "CloudProvider!"}
+    profiles = {"minimal": MINIMAL_FIELDS, "standard": STANDARD_FIELDS + ("active",)}
 
 
 class UpdateAccount(GraphQLSnippet):
@@ -131,6 +137,7 @@ class UpdateAccount(GraphQLSnippet):
     }
     parameter_types = {"provider": "CloudProvider!", "tags": "[TagInput!]"}
     variable_transformers = {"tags": lambda x: json.loads(x) if x is not None else []}
+    idempotent = True
 
 
 class AddAccount(GraphQLSnippet):
@@ -219,6 +226,8 @@ class RemoveAccount(GraphQLSnippet):
         "key": "Account key -- Account ID for AWS, Subscription ID for Azure, Project ID for GCP",
     }
     parameter_types = {"provider": "CloudProvider!"}
+    # accounts are removed from their groups too
+    entities = frozenset({"account", "account_group"})
 
 
 class ValidateAccount(GraphQLSnippet):
@@ -257,3 +266,4 @@ class ValidateAccount(GraphQLSnippet):
         "key": "Account key -- Account ID for AWS, Subscription ID for Azure, Project ID for GCP",
     }
     parameter_types = {"provider": "CloudProvider!"}
+    idempotent = True
@@ -159,6 +159,9 @@ class UpdateAccountGroup(GraphQLSnippet):
         "variables": "Account Group Variables (JSON encoded)",
         "priority": "Account Group priority (0-99)",
     }
+    idempotent = True
+    # bindings show their account group
+    entities = frozenset({"account_group", "binding"})
 
 
 class ShowAccountGroup(GraphQLSnippet):
@@ -238,6 +241,8 @@ class RemoveAccountGroup(GraphQLSnippet):
       }
     """
     required = {"uuid": "Account group UUID"}
+    # bindings show their account group
+    entities = frozenset({"account_group", "binding"})
 
 
 class AddAccountGroupItem(GraphQLSnippet):
@@ -274,6 +279,7 @@ class AddAccountGroupItem(GraphQLSnippet):
         "key": "Account Key",
     }
     optional = {"regions": {"help": "Account Regions", "multiple": True}}
+    idempotent = True
 
 
 class RemoveAccountGroupItem(GraphQLSnippet):
@@ -3,6 +3,17 @@
 
 from ..snippet import GraphQLSnippet
 
+# Fields of the lean selection profiles, leaving out the execution config.
+MINIMAL_FIELDS = ("uuid", "name")
+STANDARD_FIELDS = MINIMAL_FIELDS + (
+    "description",
+    "schedule",
+    "lastDeployed",
+    "system",
+    "accountGroup",
+    "policyCollection",
+)
+
 
 class ListBindings(GraphQLSnippet):
     name = "list-bindings"
@@ -47,6 +58,8 @@ class ListBindings(GraphQLSnippet):
     """
     pagination_expr = "data.bindings.pageInfo"
     result_expr = "data.bindings.edges[].node"
+    max_page_size = 1000
+    profiles = {"minimal": MINIMAL_FIELDS, "standard": STANDARD_FIELDS}
 
 
 class ShowBinding(GraphQLSnippet):
@@ -78,6 +91,7 @@ class ShowBinding(GraphQLSnippet):
     """
 
     required = {"uuid": "Binding UUID"}
+    profiles = {"minimal": MINIMAL_FIELDS, "standard": STANDARD_FIELDS}
 
 
 class AddBinding(GraphQLSnippet):
@@ -170,6 +184,7 @@ class UpdateBinding(GraphQLSnippet):
         "schedule": "Binding Schedule for Pull Mode Policies",
         "variables": "Binding variables (JSON Encoded string)",
     }
+    idempotent = True
 
 
 class RemoveBinding(GraphQLSnippet):
@@ -230,6 +245,7 @@ class DeployBinding(GraphQLSnippet):
     """
 
     required = {"uuid": "Binding UUID"}
+    idempotent = True
 
 
 class RunBinding(GraphQLSnippet):
@@ -3,6 +3,23 @@
 
 from ..snippet import GraphQLSnippet
 
+# Fields of the lean selection profiles. The YAML source, and for a single policy its
+# last execution, make up most of a policy's size.
+MINIMAL_FIELDS = ("id", "uuid", "name", "provider", "resourceType")
+STANDARD_FIELDS = MINIMAL_FIELDS + (
+    "version",
+    "description",
+    "category",
+    "compliance",
+    "severity",
+    "resource",
+    "mode",
+    "tags",
+    "commit",
+    "repository",
+    "path",
+)
+
 
 class ListPolicies(GraphQLSnippet):
     name = "list-policies"
@@ -59,6 +76,12 @@ class ListPolicies(GraphQLSnippet):
     """
     pagination_expr = "data.policies.pageInfo"
     result_expr = "data.policies.edges[].node"
+    # for the full profile, whose nodes carry the policy source
+    max_page_size = 100
+    profiles = {
+        "minimal": MINIMAL_FIELDS,
+        "standard": STANDARD_FIELDS + ("validationError",),
+    }
 
 
 class ShowPolicy(GraphQLSnippet):
@@ -132,3 +155,4 @@ class ShowPolicy(GraphQLSnippet):
         "name": "Policy Name",
         "uuid": "Policy UUID",
     }
+    profiles = {"minimal": MINIMAL_FIELDS, "standard": STANDARD_FIELDS}
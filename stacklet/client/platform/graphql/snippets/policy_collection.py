@@ -57,6 +57,18 @@
             }
 """
 
+# Fields of the lean selection profiles. A single collection's standard profile only
+# has the number of its policies, not the policies themselves.
+MINIMAL_FIELDS = ("id", "uuid", "name", "provider")
+STANDARD_FIELDS = MINIMAL_FIELDS + (
+    "description",
+    "autoUpdate",
+    "isDynamic",
+    "repositoryConfig",
+    "repositoryView",
+    "policyMappings.pageInfo",
+)
+
 # The view half of a dynamic collection's input. Every field sits on its own line so
 # that unset options drop out individually; when they all drop the block collapses to
 # `repositoryView: {}`, which the platform reads as "no view".
@@ -119,6 +131,7 @@ class ListPolicyCollections(GraphQLSnippet):
     """ % {"fields": FIELDS, "mappings": MAPPING_COUNT}
     pagination_expr = "data.policyCollections.pageInfo"
     result_expr = "data.policyCollections.edges[].node"
+    profiles = {"minimal": MINIMAL_FIELDS, "standard": STANDARD_FIELDS}
 
 
 class ShowPolicyCollection(GraphQLSnippet):
@@ -135,6 +148,7 @@ class ShowPolicyCollection(GraphQLSnippet):
     """ % {"fields": FIELDS, "mappings": MAPPINGS}
     required = {"uuid": "Policy Collection UUID"}
     result_expr = "data.policyCollection"
+    profiles = {"minimal": MINIMAL_FIELDS, "standard": STANDARD_FIELDS}
 
 
 class AddPolicyCollection(GraphQLSnippet):
@@ -215,6 +229,9 @@ class UpdatePolicyCollection(GraphQLSnippet):
     }
     parameter_types = dict(VIEW_TYPES)
     variable_transformers = {"auto_update": to_bool}
+    idempotent = True
+    # bindings show their policy collection
+    entities = frozenset({"policy_collection", "binding"})
 
 
 class AddPolicyCollectionItem(GraphQLSnippet):
@@ -289,3 +306,5 @@ class RemovePolicyCollection(GraphQLSnippet):
     }
     """ % {"fields": FIELDS, "mappings": MAPPINGS}
     required = {"uuid": "Policy Collection UUID"}
+    # bindings show their policy collection
+    entities = frozenset({"policy_collection", "binding"})
@@ -63,6 +63,8 @@ class ProcessRepository(GraphQLSnippet):
     """
     required = {"uuid": "Repository Config UUID"}
     result_expr = "data.triggerRepositoryScan"
+    # scans import policies into collections
+    entities = frozenset({"repository", "policy", "policy_collection"})
 
 
 class ScanRepository(GraphQLSnippet):
@@ -78,6 +80,8 @@ class ScanRepository(GraphQLSnippet):
     """
     required = {"uuid": "Repository Config UUID"}
     result_expr = "data.triggerRepositoryScan"
+    # scans import policies into collections
+    entities = frozenset({"repository", "policy", "policy_collection"})
 
 
 class ListRepository(GraphQLSnippet):
@@ -116,6 +120,7 @@ class ListRepository(GraphQLSnippet):
     }
     """
     result_expr = "data.repositoryConfigs.edges[].node"
+    connection_expr = "data.repositoryConfigs"
 
 
 class RemoveRepository(GraphQLSnippet):
@@ -149,6 +154,8 @@ class RemoveRepository(GraphQLSnippet):
     }
     variable_transformers = {"cascade": to_bool}
     result_expr = "data.removeRepositoryConfig"
+    # cascades to the policies and collections from the repository
+    entities = frozenset({"repository", "policy", "policy_collection"})
 
 
 class ShowRepository(GraphQLSnippet):
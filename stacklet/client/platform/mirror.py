@@ -0,0 +1,265 @@
+# Copyright Stacklet, Inc.
+# SPDX-License-Identifier: Apache-2.0
+
+"""
+Local SQLite mirror of the platform inventory.
+
+Each listing (accounts, policies, ...) is paged through into a table with a row per
+node: the whole node as JSON in the `data` column, plus indexed columns for the fields
+commonly looked up or joined on. Nodes have the fields of the listing's default
+profile, so e.g. policies don't have their source. Syncs are incremental, in that only
+nodes that changed since the last sync are written, and nodes no longer listed are
+deleted.
+"""
+
+import hashlib
+import json
+import sqlite3
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Iterable, Iterator
+
+import jmespath
+
+from . import config
+from .config import JSONDict
+from .graphql import GraphQLExecutor, GraphQLSnippet
+from .graphql.snippet import profiled_snippet
+from .graphql.snippets import (
+    ListAccountGroups,
+    ListAccounts,
+    ListBindings,
+    ListPolicies,
+    ListPolicyCollections,
+    ListRepository,
+)
+from .pagination import prefetch
+
+# Page size for listings that don't set a ceiling of their own.
+DEFAULT_PAGE_SIZE = 500
+
+
+class MirrorSyncError(Exception):
+    """The API returned errors while syncing the mirror."""
+
+
+@dataclass(frozen=True)
+class MirrorTable:
+    """A table mirroring the nodes of a listing."""
+
+    name: str
+    snippet_class: type[GraphQLSnippet]
+    # node field with a unique value, stored as the `id` column
+    key: str
+    # indexed columns, mapped to the JMESPath expression for their value in a node
+    columns: dict[str, str]
+
+    def schema(self) -> list[str]:
+        columns = "".join(f", {column}" for column in self.columns)
+        statements = [
+            f"CREATE TABLE IF NOT EXISTS {self.name} "
+            f"(id TEXT PRIMARY KEY{columns}, data TEXT NOT NULL, digest TEXT NOT NULL)"
+        ]
+        for column in self.columns:
+            statements.append(
+                f"CREATE INDEX IF NOT EXISTS {self.name}_{column} ON {self.name} ({column})"
+            )
+        return statements
+
+    def row(self, node: JSONDict) -> tuple:
+        data = json.dumps(node, sort_keys=True)
+        digest = hashlib.sha1(data.encode()).hexdigest()
+        values = (jmespath.search(expr, node) for expr in self.columns.values())
+        return (node[self.key], *values, data, digest)
+
+    def upsert(self) -> str:
+        columns = ["id", *self.columns, "data", "digest"]
+        updates = ", ".join(f"{column} = excluded.{column}" for column in columns[1:])
+        return (
+            f"INSERT INTO {self.name} ({', '.join(columns)}) "
+            f"VALUES ({', '.join('?' * len(columns))}) "
+            f"ON CONFLICT (id) DO UPDATE SET {updates} "
+            f"WHERE {self.name}.digest != excluded.digest"
+        )
+
+
+TABLES = {
+    table.name: table
+    for table in (
+        MirrorTable(
+            "accounts", ListAccounts, "id", {"key": "key", "name": "name", "provider": "provider"}
+        ),
+        MirrorTable(
+            "account_groups",
+            ListAccountGroups,
+            "id",
+            {"uuid": "uuid", "name": "name", "provider": "provider"},
+        ),
+        MirrorTable(
+            "bindings",
+            ListBindings,
+            "uuid",
+            {
+                "uuid": "uuid",
+                "name": "name",
+                "account_group_uuid": "accountGroup.uuid",
+                "policy_collection_uuid": "policyCollection.uuid",
+            },
+        ),
+        MirrorTable(
+            "policies",
+            ListPolicies,
+            "id",
+            {
+                "uuid": "uuid",
+                "name": "name",
+                "provider": "provider",
+                "resource_type": "resourceType",
+            },
+        ),
+        MirrorTable(
+            "policy_collections",
+            ListPolicyCollections,
+            "id",
+            {"uuid": "uuid", "name": "name", "provider": "provider"},
+        ),
+        MirrorTable(
+            "repositories",
+            ListRepository,
+            "id",
+            {"uuid": "uuid", "name": "name", "provider": "provider"},
+        ),
+    )
+}
+
+
+@dataclass(frozen=True)
+class SyncStats:
+    """What a sync changed in a table."""
+
+    # nodes listed by the API
+    total: int
+    # rows inserted or updated because the node changed
+    upserted: int
+    # rows deleted because the node is gone
+    deleted: int
+    # seconds the sync took
+    elapsed: float
+
+
+class Mirror:
+    """
+    Inventory mirrored in a SQLite database, by default `~/.stacklet/mirror.db`.
+
+    Tables can be queried with plain SQL, on the indexed columns or the node data
+    with SQLite's JSON functions:
+
+        >>> mirror.sync()
+        >>> mirror.query(
+        ...     "SELECT p.name FROM policies p WHERE resource_type = ?", "aws.s3"
+        ... )
+    """
+
+    def __init__(self, executor: GraphQLExecutor | None, path: Path | None = None):
+        self.executor = executor
+        self._path = path
+        self._connection: sqlite3.Connection | None = None
+
+    @property
+    def path(self) -> Path:
+        if self._path is not None:
+            return self._path
+        return config.DEFAULT_CONFIG_DIR / "mirror.db"
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        if self._connection is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            connection = sqlite3.connect(self.path)
+            connection.row_factory = sqlite3.Row
+            with connection:
+                for table in TABLES.values():
+                    for statement in table.schema():
+                        connection.execute(statement)
+            self._connection = connection
+        return self._connection
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def sync(self, tables: Iterable[str] | None = None) -> dict[str, SyncStats]:
+        """
+        Update the mirror from the API, all tables unless only some are named.
+
+        Each table is synced in a transaction, so a failure leaves it as it was.
+        """
+        executor = self.executor
+        assert executor is not None, "syncing requires an executor"
+        names = list(TABLES) if tables is None else list(tables)
+        for name in names:
+            if name not in TABLES:
+                raise ValueError(f"Unknown mirror table: {name}")
+        return {name: self._sync_table(executor, TABLES[name]) for name in names}
+
+    def query(self, sql: str, *params: Any) -> list[dict[str, Any]]:
+        """Run a SQL query against the mirror, returning rows as dicts."""
+        return [dict(row) for row in self.connection.execute(sql, params)]
+
+    def find(self, table: str, **columns: Any) -> list[JSONDict]:
+        """Return the nodes in a table matching the given indexed column values."""
+        if table not in TABLES:
+            raise ValueError(f"Unknown mirror table: {table}")
+        for column in columns:
+            if column not in TABLES[table].columns:
+                raise ValueError(f"Not an indexed column of {table}: {column}")
+        where = " AND ".join(f"{column} = ?" for column in columns) or "1"
+        rows = self.connection.execute(
+            f"SELECT data FROM {table} WHERE {where}", tuple(columns.values())
+        )
+        return [json.loads(row["data"]) for row in rows]
+
+    def _sync_table(self, executor: GraphQLExecutor, table: MirrorTable) -> SyncStats:
+        start = time.monotonic()
+        connection = self.connection
+        upsert = table.upsert()
+        total = upserted = 0
+        with connection:
+            # IDs listed by this sync, anything else is gone
+            connection.execute("CREATE TEMP TABLE IF NOT EXISTS listed (id TEXT PRIMARY KEY)")
+            connection.execute("DELETE FROM listed")
+            # database writes for a page overlap with fetching the next one
+            for nodes in prefetch(self._iter_pages(executor, table.snippet_class), 1):
+                rows = [table.row(node) for node in nodes]
+                connection.executemany(
+                    "INSERT OR IGNORE INTO listed VALUES (?)", (row[:1] for row in rows)
+                )
+                # unchanged nodes don't count as modified rows
+                upserted += connection.executemany(upsert, rows).rowcount
+                total += len(rows)
+            deleted = connection.execute(
+                f"DELETE FROM {table.name} WHERE id NOT IN (SELECT id FROM listed)"
+            ).rowcount
+        return SyncStats(total, upserted, deleted, time.monotonic() - start)
+
+    def _iter_pages(
+        self, executor: GraphQLExecutor, snippet_class: type[GraphQLSnippet]
+    ) -> Iterator[list[JSONDict]]:
+        """Yield the nodes of a listing, a page at a time."""
+        snippet_class = profiled_snippet(snippet_class)
+        variables = None
+        if snippet_class.pagination_expr is not None:
+            variables = {"first": snippet_class.max_page_size or DEFAULT_PAGE_SIZE}
+        while True:
+            result = executor.run_snippet(snippet_class, variables=variables)
+            if result.get("errors") or "data" not in result:
+                raise MirrorSyncError(result.get("errors") or result)
+            yield jmespath.search(snippet_class.result_expr, result) or []
+            if variables is None:
+                return
+            page_info = jmespath.search(snippet_class.pagination_expr, result)
+            if not page_info or not page_info["hasNextPage"]:
+                return
+            variables = variables | {"after": page_info["endCursor"]}
@@ -0,0 +1,147 @@
+# Copyright Stacklet, Inc.
+# SPDX-License-Identifier: Apache-2.0
+
+"""Helpers for walking paginated API results."""
+
+import dataclasses
+import queue
+import threading
+from dataclasses import dataclass
+from typing import Generator, Iterator, TypeVar
+
+from .config import JSONDict
+
+T = TypeVar("T")
+
+# How often a blocked background thread checks whether it's been stopped.
+_POLL_INTERVAL = 0.1
+
+
+def prefetch(pages: Iterator[T], depth: int) -> Generator[T, None, None]:
+    """
+    Iterate pages while fetching up to `depth` of the following ones in the background.
+
+    Fetching the next page from a cursor-paginated API can only start when the
+    previous page has arrived, but it doesn't have to wait for the consumer to be done
+    with it. With prefetching, `pages` is advanced in a worker thread, so requests
+    overlap with whatever the consumer does with each page.
+
+    Errors are raised to the consumer when it reaches the page that failed. If the
+    consumer stops early, the worker stops after the request it's running, if any.
+    """
+    if depth < 1:
+        yield from pages
+        return
+
+    fetched: queue.Queue = queue.Queue()
+    # pages the worker can fetch ahead of the one being consumed
+    slots = threading.Semaphore(depth)
+    stop = threading.Event()
+
+    def worker():
+        try:
+            while True:
+                while not slots.acquire(timeout=_POLL_INTERVAL):
+                    if stop.is_set():
+                        return
+                if stop.is_set():
+                    return
+                try:
+                    page = next(pages)
+                except StopIteration:
+                    fetched.put((False, None))
+                    return
+                fetched.put((True, page))
+        except BaseException as err:
+            fetched.put((False, err))
+        finally:
+            close = getattr(pages, "close", None)
+            if close is not None:
+                close()
+
+    thread = threading.Thread(target=worker, name="page-prefetch", daemon=True)
+    thread.start()
+    try:
+        while True:
+            more, page = fetched.get()
+            if not more:
+                if page is not None:
+                    raise page
+                return
+            slots.release()
+            yield page
+    finally:
+        stop.set()
+        thread.join()
+
+
+@dataclass
+class AdaptivePageSize:
+    """
+    Page size for cursor pagination that adapts to how the API responds.
+
+    Pages start at `initial` items. After each page the size is scaled by how far the
+    response was from the latency and size targets: it grows (at most by `growth`
+    times per page) while pages come back quicker and smaller than the targets, and
+    shrinks as soon as one is slower or bigger. A timed out request shrinks the page
+    to a quarter before it's retried.
+
+    The size stays between `minimum` and `maximum`, and below the snippet's own
+    `max_page_size` ceiling, if any.
+    """
+
+    initial: int = 20
+    minimum: int = 1
+    maximum: int = 500
+    # seconds per page
+    target_latency: float = 2.0
+    # bytes per page
+    target_size: int = 4 * 2**20
+    growth: float = 2.0
+
+    def __post_init__(self):
+        self.size = self._clamp(self.initial)
+
+    def for_snippet(self, snippet_class) -> "AdaptivePageSize":
+        """A fresh sizer for walking the pages of a snippet, within its ceiling."""
+        maximum = self.maximum
+        if snippet_class.max_page_size is not None:
+            maximum = min(maximum, snippet_class.max_page_size)
+        return dataclasses.replace(self, maximum=maximum)
+
+    def record(self, elapsed: float, size: int):
+        """Adjust the page size to a response of `size` bytes taking `elapsed` seconds."""
+        ratio = min(
+            self.target_latency / max(elapsed, 1e-6),
+            self.target_size / max(size, 1),
+        )
+        self.size = self._clamp(int(self.size * min(ratio, self.growth)))
+
+    def shrink(self) -> bool:
+        """Shrink the page after a timeout, returning whether it could shrink at all."""
+        if self.size <= self.minimum:
+            return False
+        self.size = self._clamp(self.size // 4)
+        return True
+
+    def _clamp(self, size: int) -> int:
+        return max(self.minimum, min(self.maximum, size))
+
+
+def merge_pages(pages: list[JSONDict], pagination_expr: str) -> JSONDict:
+    """
+    Merge consecutive response pages of a connection into a single response.
+
+    The result is the last page, with the edges of all pages. `pagination_expr` is the
+    snippet's path to the connection's page info, e.g. `data.accounts.pageInfo`.
+    """
+    *path, _ = pagination_expr.split(".")
+
+    def connection(page: JSONDict) -> JSONDict:
+        for key in path:
+            page = page[key]
+        return page
+
+    merged = pages[-1]
+    connection(merged)["edges"] = [edge for page in pages for edge in connection(page)["edges"]]
+    return merged
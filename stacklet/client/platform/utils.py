@@ -1,6 +1,7 @@
 # Copyright Stacklet, Inc.
 # SPDX-License-Identifier: Apache-2.0
 
+import importlib
 import logging
 from pathlib import Path
 
@@ -30,10 +31,13 @@ def to_bool(value: str | None) -> bool | None:
     return value.lower() == "true"
 
 
+# Number of results in a page when not given
+DEFAULT_PAGE_SIZE = 20
+
 PAGINATION_OPTIONS = {
     "first": {
         "help": "For use with pagination. Return the first n results.",
-        "default": 20,
+        "default": DEFAULT_PAGE_SIZE,
     },
     "last": {
         "help": "For use with pagination. Return the last n results. Overrides first.",
@@ -82,6 +86,54 @@ def wrap_command(func, options, required=False, prompt=False):
     return func
 
 
+class LazyGroup(click.Group):
+    """
+    Click group whose subcommands are imported when they're first used.
+
+    `lazy_commands` maps each command name to the "module:attribute" where it's
+    defined, and the short help listed for it, so that neither running one command nor
+    showing the group's help imports all of them.
+    """
+
+    def __init__(self, *args, lazy_commands: dict[str, tuple[str, str]] | None = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.lazy_commands = lazy_commands or {}
+
+    def list_commands(self, ctx):
+        return sorted({*super().list_commands(ctx), *self.lazy_commands})
+
+    def get_command(self, ctx, cmd_name):
+        if cmd_name in self.lazy_commands and cmd_name not in self.commands:
+            self.add_command(self.load_command(cmd_name), cmd_name)
+        return super().get_command(ctx, cmd_name)
+
+    def load_command(self, cmd_name) -> click.Command:
+        path, _ = self.lazy_commands[cmd_name]
+        module, attr = path.split(":")
+        return getattr(importlib.import_module(module), attr)
+
+    def format_commands(self, ctx, formatter):
+        names = self.list_commands(ctx)
+        if not names:
+            return
+        limit = formatter.width - 6 - max(len(name) for name in names)
+        rows = []
+        for name in names:
+            if name in self.commands:
+                command = self.commands[name]
+                if command.hidden:
+                    continue
+                short_help = command.get_short_help_str(limit)
+            else:
+                # a stand-in, for the help to be shortened the same way
+                placeholder = click.Command(name, help=self.lazy_commands[name][1])
+                short_help = placeholder.get_short_help_str(limit)
+            rows.append((name, short_help))
+        if rows:
+            with formatter.section("Commands"):
+                formatter.write_dl(rows)
+
+
 def get_log_level(verbose):
     # Default to Error level (40)
     level = 40 - (verbose * 10)
@@ -0,0 +1,158 @@
+# Copyright Stacklet, Inc.
+# SPDX-License-Identifier: Apache-2.0
+
+import json
+
+import pytest
+
+API = "mock://stacklet.acme.org/api"
+
+
+def add_account_response(request, context):
+    """Answer addAccount mutations, batched or not, failing for keys starting with "x"."""
+    body = request.json()
+    variables = body["variables"]
+    data, errors = {}, []
+    prefixes = sorted({name[: -len("key")] for name in variables if name.endswith("key")})
+    for prefix in prefixes:
+        alias = prefix.rstrip("_") or "addAccount"
+        key = variables[f"{prefix}key"]
+        if key.startswith("x"):
+            data[alias] = None
+            errors.append({"message": f"bad key {key}", "path": [alias]})
+        else:
+            data[alias] = {"account": {"id": f"account:{key}", "key": key}}
+    return {"data": data, "errors": errors} if errors else {"data": data}
+
+
+@pytest.fixture
+def run_import(requests_adapter, sample_config_file, api_token_in_file, invoke_cli, tmp_path):
+    requests_adapter.register_uri("POST", API, json=add_account_response)
+
+    def run(name: str, content: str, *args: str):
+        path = tmp_path / name
+        path.write_text(content)
+        res = invoke_cli("--output=json", "account", "import", str(path), *args)
+        records = [json.loads(line) for line in res.stdout.splitlines()]
+        return res, records
+
+    return run
+
+
+def rows(*keys: str) -> list[dict]:
+    return [
+        {"provider": "AWS", "key": key, "name": f"a{key}", "securityContext": f"role/{key}"}
+        for key in keys
+    ]
+
+
+class TestImport:
+    def test_csv(self, run_import, requests_adapter):
+        res, records = run_import(
+            "accounts.csv",
+            "provider,key,name,security-context,tags\n"
+            'AWS,1,one,role/1,"[{""key"": ""env"", ""value"": ""prod""}]"\n'
+            "AWS,2,two,role/2,\n",
+        )
+        assert res.exit_code == 0, res.output
+        assert records == [
+            {"row": 1, "provider": "AWS", "key": "1", "id": "account:1", "error": None},
+            {"row": 2, "provider": "AWS", "key": "2", "id": "account:2", "error": None},
+        ]
+        first, second = [
+            request.json()["variables"] for request in requests_adapter.request_history
+        ]
+        # calls are aliased and their variables prefixed, even one at a time
+        assert first["b0_tags"] == [{"key": "env", "value": "prod"}]
+        assert first["b0_security_context"] == "role/1"
+        assert second["b0_tags"] == []
+
+    @pytest.mark.parametrize(
+        "name,content",
+        [
+            ("accounts.json", json.dumps(rows("1", "2"))),
+            ("accounts.ndjson", "\n".join(json.dumps(row) for row in rows("1", "2"))),
+            ("accounts.txt", "\n".join(json.dumps(row) for row in rows("1", "2"))),
+        ],
+    )
+    def test_json(self, run_import, name, content):
+        res, records = run_import(name, content)
+        assert res.exit_code == 0, res.output
+        assert [record["id"] for record in records] == ["account:1", "account:2"]
+
+    def test_json_fields(self, run_import, requests_adapter):
+        row = rows("1")[0] | {"tags": [{"key": "k", "value": "v"}], "variables": {"a": 1}}
+        res, _ = run_import("accounts.json", json.dumps([row]))
+        assert res.exit_code == 0, res.output
+        variables = requests_adapter.last_request.json()["variables"]
+        assert variables["b0_tags"] == [{"key": "k", "value": "v"}]
+        assert json.loads(variables["b0_variables"]) == {"a": 1}
+
+    def test_batched(self, run_import, requests_adapter):
+        keys = [str(n) for n in range(10)]
+        res, records = run_import(
+            "accounts.json", json.dumps(rows(*keys)), "--batch-size=4", "--parallel=2"
+        )
+        assert res.exit_code == 0, res.output
+        assert requests_adapter.call_count == 3
+        assert [record["id"] for record in records] == [f"account:{key}" for key in keys]
+        assert [record["row"] for record in records] == list(range(1, 11))
+
+    def test_failures(self, run_import):
+        res, records = run_import(
+            "accounts.json", json.dumps(rows("1", "x2", "3")), "--batch-size=3"
+        )
+        assert res.exit_code == 1
+        assert [record["error"] for record in records] == [None, "bad key x2", None]
+        assert records[1]["id"] is None
+
+    def test_request_failed(self, run_import, requests_adapter):
+        requests_adapter.register_uri("POST", API, status_code=500, text="oops")
+        res, records = run_import("accounts.json", json.dumps(rows("1", "2")), "--batch-size=2")
+        assert res.exit_code == 1
+        assert all(record["error"] for record in records)
+
+    def test_token_expired(self, run_import, requests_adapter):
+        requests_adapter.register_uri(
+            "POST", API, json={"message": "The incoming token has expired"}
+        )
+        res, records = run_import("accounts.json", json.dumps(rows("1", "2")), "--batch-size=2")
+        assert res.exit_code == 1
+        assert [record["error"] for record in records] == ["The incoming token has expired"] * 2
+
+    def test_invalid_rows(self, run_import, requests_adapter):
+        res, _ = run_import(
+            "accounts.json",
+            json.dumps(
+                [
+                    *rows("1", "1"),
+                    {"provider": "AWS", "key": "3"},
+                    rows("4")[0] | {"colour": "blue"},
+                    rows("5")[0] | {"tags": {"key": "k"}},
+                    "text",
+                ]
+            ),
+        )
+        assert res.exit_code == 1
+        assert requests_adapter.call_count == 0
+        for error in [
+            "row 2: same provider and key as row 1",
+            "row 3: missing name, security_context",
+            "row 4: unknown field 'colour'",
+            "row 5: invalid tags: expected a list of tags",
+            "row 6: expected an object",
+        ]:
+            assert error in res.stderr
+
+    @pytest.mark.parametrize(
+        "name,content,error",
+        [
+            ("accounts.json", "{", "Invalid json file"),
+            ("accounts.json", "{}", "Invalid json file: expected a list of objects"),
+            ("accounts.csv", "provider,key\n", "No accounts to import"),
+        ],
+    )
+    def test_invalid_file(self, run_import, name, content, error):
+        res, _ = run_import(name, content)
+        assert res.exit_code == 1
+        assert error in res.stderr
@@ -0,0 +1,118 @@
+# Copyright Stacklet, Inc.
+# SPDX-License-Identifier: Apache-2.0
+
+import json
+
+import pytest
+from click.testing import CliRunner
+
+from stacklet.client.platform.cli import cli
+from stacklet.client.platform.commands.batch import _record_argv
+from stacklet.client.platform.graphql import GraphQLExecutor
+
+API = "mock://stacklet.acme.org/api"
+
+
+def account_response(request, context):
+    key = request.json()["variables"]["key"]
+    return {"data": {"account": {"key": key}}}
+
+
+@pytest.fixture
+def run_batch(requests_adapter, sample_config_file, api_token_in_file, tmp_path):
+    requests_adapter.register_uri("POST", API, json=account_response)
+
+    def run(script: str, *args: str):
+        path = tmp_path / "script.txt"
+        path.write_text(script)
+        res = CliRunner().invoke(
+            cli, [f"--config={sample_config_file}", "--output=json", "batch", str(path), *args]
+        )
+        return res, [json.loads(line) for line in res.output.splitlines()]
+
+    return run
+
+
+class TestBatch:
+    def test_run(self, run_batch, requests_adapter):
+        res, results = run_batch(
+            "# accounts\n"
+            "account show --provider AWS --key 1\n"
+            "\n"
+            '{"command": "account show", "args": ["--provider", "AWS", "--key", "2"]}\n'
+            '{"command": ["account", "show"], "args": {"provider": "AWS", "key": "3"}}\n'
+        )
+        assert res.exit_code == 0, res.output
+        assert [result["line"] for result in results] == [2, 4, 5]
+        assert [json.loads(result["output"]) for result in results] == [
+            {"data": {"account": {"key": key}}} for key in ("1", "2", "3")
+        ]
+        assert all(result["exit_code"] == 0 and result["error"] is None for result in results)
+        assert results[0]["command"] == ["account", "show", "--provider", "AWS", "--key", "1"]
+
+    def test_errors(self, run_batch):
+        res, results = run_batch(
+            "account show --provider AWS --key 1\n"
+            "account show --nope\n"
+            "account show 'unterminated\n"
+            '{"args": []}\n'
+            "account show --provider AWS --key 2\n"
+        )
+        assert res.exit_code == 1
+        assert [result["exit_code"] for result in results] == [0, 2, 2, 2, 0]
+        assert "No such option" in results[1]["error"]
+        assert results[2]["error"].startswith("Invalid line")
+        assert results[3]["command"] is None
+
+    def test_parallel(self, run_batch):
+        script = "".join(f"account show --provider AWS --key {n}\n" for n in range(50))
+        res, results = run_batch(script, "--parallel=8")
+        assert res.exit_code == 0, res.output
+        # results are in the script's order, each with its own output
+        assert [json.loads(result["output"])["data"]["account"]["key"] for result in results] == [
+            str(n) for n in range(50)
+        ]
+
+    def test_shared_executor(self, run_batch, monkeypatch):
+        created = []
+        init = GraphQLExecutor.__init__
+        monkeypatch.setattr(
+            GraphQLExecutor,
+            "__init__",
+            lambda self, *args, **kwargs: created.append(self) or init(self, *args, **kwargs),
+        )
+        script = "".join(f"account show --provider AWS --key {n}\n" for n in range(5))
+        res, results = run_batch(script, "--parallel=3")
+        assert res.exit_code == 0, res.output
+        assert len(results) == 5
+        assert len(created) == 1
+
+    def test_stdin(self, requests_adapter, sample_config_file, api_token_in_file):
+        requests_adapter.register_uri("POST", API, json=account_response)
+        res = CliRunner().invoke(
+            cli,
+            [f"--config={sample_config_file}", "batch", "-"],
+            input="account show --provider AWS --key 1\n",
+        )
+        assert res.exit_code == 0, res.output
+        assert json.loads(res.output)["exit_code"] == 0
+
+
+def test_record_argv():
+    record = {
+        "command": "account add",
+        "args": {"provider": "AWS", "key": 1, "email": None, "tags": ["a", "b"], "dry_run": True},
+    }
+    assert _record_argv(record) == [
+        "account",
+        "add",
+        "--provider",
+        "AWS",
+        "--key",
+        "1",
+        "--tags",
+        "a",
+        "--tags",
+        "b",
+        "--dry-run",
+    ]
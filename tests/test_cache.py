@@ -0,0 +1,218 @@
+# Copyright Stacklet, Inc.
+# SPDX-License-Identifier: Apache-2.0
+
+import json
+import threading
+import time
+
+import pytest
+
+from stacklet.client.platform.graphql import GraphQLExecutor
+from stacklet.client.platform.graphql.cache import ResponseCache
+from stacklet.client.platform.graphql.snippet import count_snippet
+from stacklet.client.platform.graphql.snippets import (
+    AddAccount,
+    ListAccounts,
+    ListBindings,
+    ShowAccount,
+    UpdateAccountGroup,
+)
+
+API = "mock://stacklet.acme.org/api"
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ResponseCache(tmp_path / "cache")
+
+
+def put(cache, key, body=b"{}", entities=("account",), ttl=None):
+    cache.put(key, body, entities, created=time.time_ns(), ttl=ttl)
+
+
+class TestResponseCache:
+    def test_get_put(self, cache):
+        assert cache.get("k") is None
+        put(cache, "k", b'{"data": 1}')
+        assert cache.get("k") == b'{"data": 1}'
+
+    def test_key(self, cache):
+        request = {"query": "query { accounts { id } }"}
+        key = cache.key(API, "token", request)
+        assert key == cache.key(API, "token", dict(request))
+        assert key != cache.key(API, "other-token", request)
+        assert key != cache.key("mock://other/api", "token", request)
+        assert key != cache.key(API, "token", request | {"variables": {"first": 1}})
+
+    def test_expired(self, cache, monkeypatch):
+        put(cache, "k", ttl=10)
+        now = time.time()
+        monkeypatch.setattr(time, "time", lambda: now + 11)
+        assert cache.get("k") is None
+        assert list(cache.directory.glob("*.entry")) == []
+
+    def test_no_ttl(self, cache):
+        put(cache, "k", ttl=0)
+        assert cache.get("k") is None
+
+    def test_invalidate(self, cache):
+        put(cache, "accounts", entities=["account"])
+        put(cache, "bindings", entities=["binding"])
+        cache.invalidate(["account"])
+        assert cache.get("accounts") is None
+        assert cache.get("bindings") is not None
+
+    def test_invalidate_during_request(self, cache):
+        # the request was sent before the mutation, its response may predate it
+        created = time.time_ns()
+        cache.invalidate(["account"])
+        cache.put("k", b"{}", ["account"], created=created)
+        assert cache.get("k") is None
+
+    def test_invalidate_all(self, cache):
+        put(cache, "k", entities=["account"])
+        cache.invalidate(["*"])
+        assert cache.get("k") is None
+
+    def test_lru_eviction(self, cache):
+        for key in ("a", "b", "c"):
+            put(cache, key, b"x" * 50)
+            time.sleep(0.01)
+        # room for three entries, give or take the length of their expiry times
+        cache.max_size = sum(p.stat().st_size for p in cache.directory.glob("*.entry")) + 20
+        # using "a" makes "b" the least recently used
+        assert cache.get("a") is not None
+        time.sleep(0.01)
+        put(cache, "d", b"x" * 50)
+        assert cache.get("b") is None
+        assert all(cache.get(key) is not None for key in ("a", "c", "d"))
+
+    def test_corrupt_entry(self, cache):
+        put(cache, "k")
+        (cache.directory / "k.entry").write_bytes(b"garbage")
+        assert cache.get("k") is None
+
+    def test_clear(self, cache):
+        put(cache, "k")
+        cache.clear()
+        assert cache.get("k") is None
+
+    def test_concurrent_writers(self, cache):
+        errors = []
+
+        def write(n):
+            try:
+                for i in range(20):
+                    put(cache, f"k{i}", json.dumps({"writer": n}).encode())
+                    assert cache.get(f"k{i}") is not None
+            except Exception as err:
+                errors.append(err)
+
+        threads = [threading.Thread(target=write, args=(n,)) for n in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert errors == []
+        # no temporary files are left behind
+        assert not [p for p in cache.directory.iterdir() if p.name.startswith(".tmp")]
+
+
+class TestCachedExecutor:
+    @pytest.fixture
+    def executor(self, cache):
+        return GraphQLExecutor(API, "token", cache=cache)
+
+    def responses(self, requests_adapter, *payloads):
+        requests_adapter.register_uri("POST", API, [{"json": payload} for payload in payloads])
+
+    def test_query_cached(self, requests_adapter, executor):
+        payload = {"data": {"accounts": {"edges": []}}}
+        self.responses(requests_adapter, payload)
+        assert executor.run_snippet(ListAccounts, {"first": 1}) == payload
+        assert executor.run_snippet(ListAccounts, {"first": 1}) == payload
+        assert requests_adapter.call_count == 1
+        # different variables are a different entry
+        executor.run_snippet(ListAccounts, {"first": 2})
+        assert requests_adapter.call_count == 2
+
+    def test_errors_not_cached(self, requests_adapter, executor):
+        self.responses(requests_adapter, {"errors": [{"message": "boom"}]}, {"data": {}})
+        executor.run_snippet(ShowAccount, {"provider": "AWS", "key": "1"})
+        assert executor.run_snippet(ShowAccount, {"provider": "AWS", "key": "1"}) == {"data": {}}
+        assert requests_adapter.call_count == 2
+
+    def test_mutation_invalidates(self, requests_adapter, executor):
+        self.responses(requests_adapter, {"data": {"accounts": {}}})
+        executor.run_snippet(ListAccounts)
+        self.responses(requests_adapter, {"data": {"bindings": {}}})
+        executor.run_snippet(ListBindings)
+
+        self.responses(requests_adapter, {"data": {"addAccount": {}}})
+        executor.run_snippet(
+            AddAccount, {"provider": "AWS", "key": "1", "name": "a", "path": None, "email": None}
+        )
+        calls = requests_adapter.call_count
+
+        self.responses(requests_adapter, {"data": {"accounts": {}}})
+        executor.run_snippet(ListAccounts)
+        executor.run_snippet(ListBindings)
+        # only the accounts listing is fetched again
+        assert requests_adapter.call_count == calls + 1
+
+    def test_count_invalidated(self, requests_adapter, executor):
+        count = count_snippet(ListAccounts)
+        self.responses(requests_adapter, {"data": {"accounts": {"pageInfo": {"total": 5}}}})
+        executor.run_snippet(count)
+        executor.run_snippet(count)
+        assert requests_adapter.call_count == 1
+
+        self.responses(requests_adapter, {"data": {"addAccount": {}}})
+        executor.run_snippet(
+            AddAccount, {"provider": "AWS", "key": "1", "name": "a", "path": None, "email": None}
+        )
+        self.responses(requests_adapter, {"data": {"accounts": {"pageInfo": {"total": 6}}}})
+        result = executor.run_snippet(count)
+        assert result["data"]["accounts"]["pageInfo"]["total"] == 6
+        assert requests_adapter.call_count == 3
+
+    def test_related_entities_invalidated(self, requests_adapter, executor):
+        self.responses(requests_adapter, {"data": {"bindings": {}}})
+        executor.run_snippet(ListBindings)
+        self.responses(requests_adapter, {"data": {"updateAccountGroup": {}}})
+        executor.run_snippet(UpdateAccountGroup, {"uuid": "u"})
+        self.responses(requests_adapter, {"data": {"bindings": {}}})
+        executor.run_snippet(ListBindings)
+        assert requests_adapter.call_count == 3
+
+    def test_adhoc_queries_not_cached(self, requests_adapter, executor):
+        self.responses(requests_adapter, {"data": {"accounts": []}})
+        executor.run_query("query { accounts { id } }")
+        executor.run_query("query { accounts { id } }")
+        assert requests_adapter.call_count == 2
+
+    def test_adhoc_mutation_invalidates_all(self, requests_adapter, executor):
+        self.responses(requests_adapter, {"data": {"accounts": {}}})
+        executor.run_snippet(ListAccounts)
+        self.responses(requests_adapter, {"data": {"something": True}})
+        executor.run_query("mutation { something }")
+        self.responses(requests_adapter, {"data": {"accounts": {}}})
+        executor.run_snippet(ListAccounts)
+        assert requests_adapter.call_count == 3
+
+    def test_stream_snippet(self, requests_adapter, executor):
+        payload = {"data": {"account": None}}
+        self.responses(requests_adapter, payload)
+        for _ in range(2):
+            chunks = executor.stream_snippet(ShowAccount, {"provider": "AWS", "key": "1"})
+            assert json.loads(b"".join(chunks)) == payload
+        assert requests_adapter.call_count == 1
+
+    def test_cli(self, requests_adapter, sample_config_file, api_token_in_file, invoke_cli):
+        self.responses(requests_adapter, {"data": {"accounts": {"edges": []}}})
+        for _ in range(2):
+            res = invoke_cli("--cache", "account", "list")
+            assert res.exit_code == 0, res.output
+        assert requests_adapter.call_count == 1
+        invoke_cli("account", "list")
+        assert requests_adapter.call_count == 2
@@ -0,0 +1,160 @@
+# Copyright Stacklet, Inc.
+# SPDX-License-Identifier: Apache-2.0
+
+import json
+
+import pytest
+
+from stacklet.client.platform.checkpoint import (
+    CheckpointMismatch,
+    CheckpointStore,
+    resume,
+    validate_id,
+)
+
+
+def page(n, last=False):
+    return {"hasNextPage": not last, "endCursor": f"c{n}"}, [n]
+
+
+def fetcher(pages, calls, fail_at=None):
+    """A fetch function yielding the given pages after the cursor it's called with."""
+
+    def fetch(cursor):
+        calls.append(cursor)
+        start = 0 if cursor is None else int(cursor[1:]) + 1
+        for n in range(start, pages):
+            if n == fail_at:
+                raise RuntimeError(f"page {n} failed")
+            yield page(n, last=n == pages - 1)
+
+    return fetch
+
+
+@pytest.fixture
+def store(tmp_path):
+    return CheckpointStore(tmp_path)
+
+
+class TestCheckpoint:
+    def test_complete_run(self, store, tmp_path):
+        calls = []
+        checkpoint = store.open("export", {"q": 1})
+        results = [result for _, result in resume(checkpoint, fetcher(3, calls))]
+        assert results == [[0], [1], [2]]
+        assert calls == [None]
+        # nothing left once done
+        assert list(tmp_path.iterdir()) == []
+
+    def test_resume_after_failure(self, store):
+        calls = []
+        checkpoint = store.open("export", {"q": 1})
+        results = []
+        with pytest.raises(RuntimeError):
+            for _, result in resume(checkpoint, fetcher(5, calls, fail_at=3)):
+                results.append(result)
+        assert results == [[0], [1], [2]]
+
+        checkpoint = store.open("export", {"q": 1})
+        assert checkpoint.cursor == "c2"
+        results = [result for _, result in resume(checkpoint, fetcher(5, calls))]
+        # saved pages come first, then fetching continues after them
+        assert results == [[0], [1], [2], [3], [4]]
+        assert calls == [None, "c2"]
+
+    def test_partial_page_ignored(self, store, tmp_path):
+        checkpoint = store.open("export", {"q": 1})
+        checkpoint.record(*page(0))
+        # a page that was being written when the run was interrupted
+        with (tmp_path / "export.pages.jsonl").open("a") as fd:
+            fd.write('[{"hasNextPage": true, "endCurs')
+
+        checkpoint = store.open("export", {"q": 1})
+        assert list(checkpoint.saved_pages()) == [page(0)]
+        checkpoint.record(*page(1, last=True))
+        assert [result for _, result in checkpoint.saved_pages()] == [[0], [1]]
+
+    def test_different_query(self, store):
+        store.open("export", {"q": 1}).record(*page(0))
+        with pytest.raises(CheckpointMismatch):
+            store.open("export", {"q": 2})
+
+    @pytest.mark.parametrize("checkpoint_id", ["", "../etc", ".hidden", "a/b"])
+    def test_invalid_id(self, checkpoint_id):
+        with pytest.raises(ValueError):
+            validate_id(checkpoint_id)
+
+
+def accounts_response(ids, cursor=None):
+    return {
+        "data": {
+            "accounts": {
+                "edges": [{"node": {"key": key}} for key in ids],
+                "pageInfo": {"hasNextPage": cursor is not None, "endCursor": cursor},
+            }
+        }
+    }
+
+
+class TestResumeCli:
+    def test_resume(self, run_queries, default_stacklet_dir):
+        pages = [accounts_response(["1"], "c1"), {"errors": [{"message": "boom"}]}]
+        res, _ = run_queries("account", ["list", "--resume=export"], responses=pages)
+        assert res.exit_code == 1
+        assert "--resume export" in res.output
+        assert (default_stacklet_dir / "checkpoints" / "export.json").exists()
+
+        pages = [accounts_response(["2"], "c2"), accounts_response(["3"])]
+        res, bodies = run_queries(
+            "--output=json",
+            ["account", "list", "--resume=export"],
+            responses=pages,
+        )
+        assert res.exit_code == 0, res.output
+        # the first page came from the checkpoint
+        assert [body["variables"]["after"] for body in bodies[2:]] == ["c1", "c2"]
+        result = json.loads(res.output)
+        assert [edge["node"]["key"] for edge in result["data"]["accounts"]["edges"]] == [
+            "1",
+            "2",
+            "3",
+        ]
+        assert result["data"]["accounts"]["pageInfo"]["hasNextPage"] is False
+        assert not (default_stacklet_dir / "checkpoints" / "export.json").exists()
+
+    def test_token_expired(self, run_queries, default_stacklet_dir):
+        pages = [accounts_response(["1"], "c1"), {"message": "The incoming token has expired"}]
+        res, _ = run_queries("account", ["list", "--resume=export"], responses=pages)
+        assert res.exit_code == 1
+        assert "token has expired" in res.output
+        # the failed page isn't saved as the last one, so the run can be resumed
+        assert (default_stacklet_dir / "checkpoints" / "export.json").exists()
+
+    def test_invalid_id(self, invoke_cli):
+        res = invoke_cli("account", "list", "--resume=../x")
+        assert res.exit_code == 2
+        assert "Invalid checkpoint ID" in res.output
+
+    def test_resume_all(self, run_queries):
+        pages = [accounts_response(["1"], "c1"), {"errors": [{"message": "boom"}]}]
+        res, _ = run_queries(
+            "--output=json", ["account", "list", "--all", "--resume=export"], responses=pages
+        )
+        assert res.exit_code == 1
+        # what was fetched is written out before failing
+        assert res.output.splitlines()[0] == '{"key": "1"}'
+
+        pages = [accounts_response(["2"])]
+        res, _ = run_queries(
+            "--output=json", ["account", "list", "--all", "--resume=export"], responses=pages
+        )
+        assert res.exit_code == 0, res.output
+        assert [json.loads(line) for line in res.output.splitlines()] == [
+            {"key": "1"},
+            {"key": "2"},
+        ]
+
+    def test_not_on_unpaginated_commands(self, invoke_cli):
+        res = invoke_cli("account", "show", "--help")
+        assert "--resume" not in res.output
+        assert "--all" not in res.output
@@ -1,12 +1,37 @@
 # Copyright Stacklet, Inc.
 # SPDX-License-Identifier: Apache-2.0
 
+import re
+import subprocess
+import sys
 import textwrap
 
+import click
 import requests
 
+from benchmarks.startup import import_time
+from stacklet.client.platform.cli import cli
+from stacklet.client.platform.commands import COMMANDS
+
 from .asserts import assert_config_has
 
+# Modules that must not be imported for showing help or running commands that don't
+# need them.
+HEAVY_MODULES = ["boto3", "jwt", "jsonschema", "requests", "yaml"]
+
+# Milliseconds importing the CLI entry point can take, well above what it takes now,
+# so that only pulling heavy dependencies back in trips it.
+IMPORT_TIME_TARGET = 250
+
+
+def imported_modules(code: str) -> set[str]:
+    """Return the modules imported after running code in a fresh interpreter."""
+    output = subprocess.check_output(
+        [sys.executable, "-c", f"{code}\nimport sys\nprint(' '.join(sys.modules))"],
+        text=True,
+    )
+    return set(output.split())
+
 
 class TestAdminCli:
     def test_cli_health_check(self, invoke_cli):
@@ -246,3 +271,40 @@ def test_auto_configure_multiple_idps_no_selection_error(self, requests_adapter,
 
         assert res.exit_code == 1
         assert "Multiple identity providers available" in res.output
+
+
+class TestLazyCommands:
+    def test_short_help_matches(self):
+        # the help listed for a command before it's imported is the command's own
+        ctx = click.Context(cli)
+        for name, (_, short_help) in COMMANDS.items():
+            assert cli.get_command(ctx, name).get_short_help_str() == short_help
+
+    def test_help_lists_commands(self, invoke_cli):
+        res = invoke_cli("--help", with_config=False)
+        assert res.exit_code == 0
+        listed = re.findall(r"^  (\S+)", res.output.split("Commands:")[1], re.MULTILINE)
+        assert set(COMMANDS) <= set(listed)
+
+    def test_startup_skips_heavy_imports(self):
+        modules = imported_modules("import stacklet.client.platform.cli")
+        assert modules.isdisjoint(HEAVY_MODULES)
+        assert not any(
+            module.startswith("stacklet.client.platform.commands.") for module in modules
+        )
+
+    def test_command_imports_only_its_module(self):
+        modules = imported_modules(
+            "from click import Context\n"
+            "from stacklet.client.platform.cli import cli\n"
+            "cli.get_command(Context(cli), 'account')"
+        )
+        assert "stacklet.client.platform.commands.account" in modules
+        assert "stacklet.client.platform.commands.user" not in modules
+        assert modules.isdisjoint(["boto3", "jwt"])
+
+    def test_import_time(self):
+        # best of a few runs, to smooth out noise from whatever else is running
+        assert min(import_time("stacklet.client.platform.cli") for _ in range(3)) < (
+            IMPORT_TIME_TARGET
+        )
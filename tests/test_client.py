@@ -1,15 +1,26 @@
 # Copyright Stacklet, Inc.
 # SPDX-License-Identifier: Apache-2.0
 
+import asyncio
 import json
+import time
 
 import pytest
+import requests
 
-from stacklet.client.platform.client import platform_client
-from stacklet.client.platform.graphql import GRAPHQL_SNIPPETS
+from stacklet.client.platform.checkpoint import CheckpointMismatch
+from stacklet.client.platform.client import (
+    PlatformApiError,
+    StackletPlatformClient,
+    async_platform_client,
+    platform_client,
+)
+from stacklet.client.platform.graphql import GRAPHQL_SNIPPETS, GraphQLExecutor
+from stacklet.client.platform.graphql.retry import NO_RETRY
+from stacklet.client.platform.pagination import AdaptivePageSize
 
 
-class TestPlatformClient:
+class ClientTests:
     @pytest.fixture(autouse=True)
     def _setup(self, requests_adapter, default_config_file, sample_config, api_token_in_file):
         # configuration is looked up in the default path
@@ -27,6 +38,20 @@ def api_requests(self):
             json.loads(response.body.decode()) for response in self.requests_adapter.request_history
         ]
 
+
+def accounts_page(ids, cursor=None):
+    """A page of accounts, with a next page when given its cursor."""
+    return {
+        "data": {
+            "accounts": {
+                "edges": [{"node": {"id": id}} for id in ids],
+                "pageInfo": {"hasNextPage": cursor is not None, "endCursor": cursor},
+            }
+        }
+    }
+
+
+class TestPlatformClient(ClientTests):
     def test_snippets_as_methods(self):
         client = platform_client()
 
@@ -193,3 +218,453 @@ def test_method_with_expr_not_paginated(self):
         result = client.add_account(provider="aws", key="123456789012")
 
         assert result == {"id": "1", "name": "New Account"}
+
+
+class TestPlatformClientIterators(ClientTests):
+    def test_iter_pages(self):
+        page1 = accounts_page(["1", "2"], cursor="c1")
+        page2 = accounts_page(["3"])
+        self.api_payloads(page1, page2)
+
+        client = platform_client()
+        pages = client.list_accounts.iter_pages(first=2)
+
+        assert next(pages) == page1
+        # the next page is only fetched once it's asked for
+        assert len(self.api_requests()) == 1
+        assert list(pages) == [page2]
+        [_, request2] = self.api_requests()
+        assert request2["variables"]["after"] == "c1"
+        assert request2["variables"]["first"] == 2
+
+    def test_iter_pages_expr(self):
+        self.api_payloads(accounts_page(["1"], cursor="c1"), accounts_page(["2"]))
+        client = platform_client(expr=True)
+        assert list(client.list_accounts.iter_pages()) == [[{"id": "1"}], [{"id": "2"}]]
+
+    def test_iter_items(self):
+        self.api_payloads(accounts_page(["1", "2"], cursor="c1"), accounts_page(["3"]))
+        client = platform_client()
+        items = client.list_accounts.iter_items()
+        assert [item["id"] for item in items] == ["1", "2", "3"]
+
+    def test_iter_items_prefetch(self):
+        self.api_payloads(
+            accounts_page(["1"], cursor="c1"),
+            accounts_page(["2"], cursor="c2"),
+            accounts_page(["3"]),
+        )
+        client = platform_client(prefetch=1)
+        items = client.list_accounts.iter_items()
+
+        assert next(items) == {"id": "1"}
+        # the second page is requested while the first is being consumed
+        for _ in range(200):
+            if len(self.api_requests()) == 2:
+                break
+            time.sleep(0.01)
+        assert len(self.api_requests()) == 2
+        assert list(items) == [{"id": "2"}, {"id": "3"}]
+        assert [r["variables"]["after"] for r in self.api_requests()] == ["", "c1", "c2"]
+
+    def test_call_prefetch(self):
+        self.api_payloads(accounts_page(["1"], cursor="c1"), accounts_page(["2"]))
+        client = platform_client(pager=True, expr=True, prefetch=2)
+        assert client.list_accounts() == [{"id": "1"}, {"id": "2"}]
+
+    def test_iter_items_stop_early(self):
+        self.api_payloads(accounts_page(["1", "2"], cursor="c1"), accounts_page(["3"]))
+        client = platform_client()
+        items = client.list_accounts.iter_items()
+        assert [next(items)["id"], next(items)["id"]] == ["1", "2"]
+        assert len(self.api_requests()) == 1
+
+    def test_iter_items_not_paginated(self):
+        self.api_payloads({"data": {"account": {"key": "111"}}})
+        client = platform_client()
+        assert list(client.show_account.iter_items(provider="AWS", key="111")) == [
+            {"data": {"account": {"key": "111"}}}
+        ]
+
+    def test_iter_items_empty(self):
+        self.api_payloads(accounts_page([]))
+        client = platform_client()
+        assert list(client.list_accounts.iter_items()) == []
+
+
+class TestPlatformClientAdaptivePageSize(ClientTests):
+    def test_grows(self):
+        self.api_payloads(
+            accounts_page(["1"], cursor="c1"),
+            accounts_page(["2"], cursor="c2"),
+            accounts_page(["3"]),
+        )
+        client = platform_client(adaptive_page_size=AdaptivePageSize(initial=10))
+        assert [item["id"] for item in client.list_accounts.iter_items()] == ["1", "2", "3"]
+        # small and fast pages, the size doubles each time
+        assert [r["variables"]["first"] for r in self.api_requests()] == [10, 20, 40]
+
+    def test_explicit_first(self):
+        self.api_payloads(accounts_page(["1"], cursor="c1"), accounts_page(["2"]))
+        client = platform_client(adaptive_page_size=True)
+        list(client.list_accounts.iter_items(first=5))
+        assert [r["variables"]["first"] for r in self.api_requests()] == [5, 5]
+
+    def test_not_paginated(self):
+        self.api_payloads({"data": {"account": {"key": "111"}}})
+        client = platform_client(adaptive_page_size=True)
+        client.show_account(provider="AWS", key="111")
+        [request] = self.api_requests()
+        assert "first" not in request["variables"]
+
+    def test_shrinks_on_timeout(self, sample_config):
+        self.requests_adapter.register_uri(
+            "POST",
+            "mock://stacklet.acme.org/api",
+            [{"exc": requests.Timeout}, {"json": accounts_page(["1"])}],
+        )
+        executor = GraphQLExecutor(sample_config["api"], "token", retry=NO_RETRY, timeout=1)
+        client = StackletPlatformClient(executor, adaptive_page_size=AdaptivePageSize(initial=100))
+        assert list(client.list_accounts.iter_items()) == [{"id": "1"}]
+        assert [r["variables"]["first"] for r in self.api_requests()] == [100, 25]
+
+    def test_shrinks_on_first_timeout(self):
+        self.requests_adapter.register_uri(
+            "POST",
+            "mock://stacklet.acme.org/api",
+            [{"exc": requests.ReadTimeout}, {"json": accounts_page(["1"])}],
+        )
+        # with the default retry policy
+        client = platform_client(adaptive_page_size=AdaptivePageSize(initial=100))
+        assert list(client.list_accounts.iter_items()) == [{"id": "1"}]
+        # the page isn't retried at the same size before shrinking
+        assert [r["variables"]["first"] for r in self.api_requests()] == [100, 25]
+
+    def test_timeout_at_minimum(self, sample_config):
+        self.requests_adapter.register_uri(
+            "POST", "mock://stacklet.acme.org/api", exc=requests.Timeout
+        )
+        executor = GraphQLExecutor(sample_config["api"], "token", retry=NO_RETRY, timeout=1)
+        client = StackletPlatformClient(
+            executor, adaptive_page_size=AdaptivePageSize(initial=4, minimum=1)
+        )
+        with pytest.raises(requests.Timeout):
+            list(client.list_accounts.iter_items())
+        assert [r["variables"]["first"] for r in self.api_requests()] == [4, 1]
+
+
+class TestPlatformClientCount(ClientTests):
+    def test_count(self):
+        self.api_payloads({"data": {"policies": {"pageInfo": {"total": 30000}}}})
+        client = platform_client()
+        assert client.list_policies.count() == 30000
+        [request] = self.api_requests()
+        assert request["query"] == "query { policies(first: 0) { pageInfo { total } } }"
+
+    def test_error(self):
+        self.api_payloads({"errors": [{"message": "boom"}]})
+        client = platform_client()
+        with pytest.raises(PlatformApiError):
+            client.list_accounts.count()
+
+    def test_not_graphql(self):
+        self.api_payloads({"message": "Internal server error"})
+        client = platform_client()
+        with pytest.raises(PlatformApiError, match="Internal server error"):
+            client.list_accounts.count()
+
+    def test_not_a_listing(self):
+        client = platform_client()
+        with pytest.raises(ValueError):
+            client.show_account.count()
+
+
+class TestPlatformClientLimit(ClientTests):
+    def test_iter_items(self):
+        self.api_payloads(
+            accounts_page(["1", "2"], cursor="c1"),
+            accounts_page(["3", "4"], cursor="c2"),
+            accounts_page(["5"], cursor="c3"),
+        )
+        client = platform_client()
+        items = client.list_accounts.iter_items(first=2, limit=5)
+        assert [item["id"] for item in items] == ["1", "2", "3", "4", "5"]
+        # the last page only asks for what's left, and nothing is fetched after it
+        assert [r["variables"]["first"] for r in self.api_requests()] == [2, 2, 1]
+
+    def test_call(self):
+        self.api_payloads(accounts_page(["1", "2"], cursor="c1"))
+        client = platform_client(pager=True, expr=True)
+        assert client.list_accounts(limit=2) == [{"id": "1"}, {"id": "2"}]
+        [request] = self.api_requests()
+        assert request["variables"]["first"] == 2
+
+    def test_no_page_size(self):
+        self.api_payloads(accounts_page(["1", "2"]))
+        client = platform_client()
+        assert len(list(client.list_accounts.iter_items(first=None, limit=30))) == 2
+        # pages are no bigger than the default size
+        [request] = self.api_requests()
+        assert request["variables"]["first"] == 20
+
+    def test_last(self):
+        self.api_payloads(accounts_page(["1", "2"]))
+        client = platform_client()
+        assert len(list(client.list_accounts.iter_items(last=5, limit=2))) == 2
+        # the limit caps the size asked with "last", which overrides "first"
+        [request] = self.api_requests()
+        assert request["variables"]["last"] == 2
+
+    def test_adaptive_page_size(self):
+        self.api_payloads(accounts_page(["1"], cursor="c1"), accounts_page(["2", "3"]))
+        client = platform_client(adaptive_page_size=AdaptivePageSize(initial=1))
+        assert len(list(client.list_accounts.iter_items(limit=3))) == 3
+        assert [r["variables"]["first"] for r in self.api_requests()] == [1, 2]
+
+    def test_checkpoint(self, tmp_path):
+        self.api_payloads(accounts_page(["1"], cursor="c1"), {"errors": ["boom"]})
+        client = platform_client(pager=True, expr=True, checkpoint_dir=tmp_path)
+        with pytest.raises(PlatformApiError):
+            client.list_accounts(first=1, limit=2, checkpoint="export")
+
+        # the saved page counts towards the limit
+        self.api_payloads(accounts_page(["2"], cursor="c2"))
+        assert client.list_accounts(first=1, limit=2, checkpoint="export") == [
+            {"id": "1"},
+            {"id": "2"},
+        ]
+        assert len(self.api_requests()) == 3
+        assert list(tmp_path.iterdir()) == []
+
+    def test_not_paginated(self):
+        client = platform_client()
+        with pytest.raises(ValueError):
+            client.show_account(provider="AWS", key="111", limit=1)
+
+    def test_invalid(self):
+        client = platform_client()
+        with pytest.raises(ValueError):
+            client.list_accounts(limit=0)
+
+
+class TestPlatformClientCheckpoints(ClientTests):
+    def test_resume(self, tmp_path):
+        self.api_payloads(
+            accounts_page(["1"], cursor="c1"),
+            {"errors": [{"message": "boom"}]},
+        )
+        client = platform_client(pager=True, expr=True, checkpoint_dir=tmp_path)
+        with pytest.raises(PlatformApiError):
+            client.list_accounts(checkpoint="export")
+
+        self.api_payloads(accounts_page(["2"], cursor="c2"), accounts_page(["3"]))
+        accounts = client.list_accounts(checkpoint="export")
+        assert accounts == [{"id": "1"}, {"id": "2"}, {"id": "3"}]
+        # the first page was not requested again
+        assert [r["variables"]["after"] for r in self.api_requests()[2:]] == ["c1", "c2"]
+        assert list(tmp_path.iterdir()) == []
+
+    def test_iter_items(self, tmp_path):
+        self.api_payloads(accounts_page(["1"], cursor="c1"), accounts_page(["2"]))
+        client = platform_client(checkpoint_dir=tmp_path)
+        items = client.list_accounts.iter_items(checkpoint="export")
+        assert next(items) == {"id": "1"}
+        items.close()
+
+        # stopping early keeps the checkpoint
+        items = client.list_accounts.iter_items(checkpoint="export")
+        assert list(items) == [{"id": "1"}, {"id": "2"}]
+        assert len(self.api_requests()) == 2
+
+    def test_different_parameters(self, tmp_path):
+        self.api_payloads(accounts_page(["1"], cursor="c1"), {"errors": ["boom"]})
+        client = platform_client(pager=True, checkpoint_dir=tmp_path)
+        with pytest.raises(PlatformApiError):
+            client.list_accounts(checkpoint="export", first=5)
+        with pytest.raises(CheckpointMismatch):
+            client.list_accounts(checkpoint="export", first=10)
+
+    def test_requires_pagination(self, tmp_path):
+        client = platform_client(checkpoint_dir=tmp_path)
+        with pytest.raises(ValueError):
+            client.list_accounts(checkpoint="export")
+
+
+class TestPlatformClientFields(ClientTests):
+    def test_call(self):
+        self.api_payloads(accounts_page(["1"], cursor="c1"), accounts_page(["2"]))
+        client = platform_client(pager=True, expr=True)
+        assert client.list_accounts(fields=["id", "tags.key"]) == [{"id": "1"}, {"id": "2"}]
+        for request in self.api_requests():
+            assert "node { id tags { key } }" in request["query"]
+            assert "pageInfo {" in request["query"]
+
+    def test_iter_items(self):
+        self.api_payloads(accounts_page(["1"]))
+        client = platform_client()
+        assert list(client.list_accounts.iter_items(fields=["id"])) == [{"id": "1"}]
+        [request] = self.api_requests()
+        assert "node { id }" in request["query"]
+
+    def test_iter_pages(self):
+        self.api_payloads(accounts_page(["1"]))
+        client = platform_client()
+        assert list(client.list_accounts.iter_pages(fields=["id"])) == [accounts_page(["1"])]
+        [request] = self.api_requests()
+        assert "node { id }" in request["query"]
+
+    def test_unknown_field(self):
+        client = platform_client()
+        with pytest.raises(ValueError, match="unknown field uuid"):
+            client.list_accounts(fields=["uuid"])
+        assert self.api_requests() == []
+
+    def test_async(self):
+        self.api_payloads(accounts_page(["1"]))
+
+        async def run():
+            async with async_platform_client(expr=True) as client:
+                return await client.list_accounts(fields=["id"])
+
+        assert asyncio.run(run()) == [{"id": "1"}]
+        [request] = self.api_requests()
+        assert "node { id }" in request["query"]
+
+
+class TestPlatformClientProfiles(ClientTests):
+    def test_listing_default(self):
+        self.api_payloads({"data": {"policies": {"edges": [], "pageInfo": {}}}})
+        platform_client().list_policies()
+        [request] = self.api_requests()
+        assert " source " not in request["query"]
+
+    def test_profile(self):
+        self.api_payloads({"data": {"policies": {"edges": [], "pageInfo": {}}}})
+        list(platform_client().list_policies.iter_items(profile="full"))
+        [request] = self.api_requests()
+        assert " source " in request["query"]
+
+    def test_single_default(self):
+        self.api_payloads({"data": {"policy": None}})
+        platform_client().show_policy(uuid="u")
+        [request] = self.api_requests()
+        assert "lastExecution" in request["query"]
+
+
+class TestPolicySources(ClientTests):
+    def test_get(self):
+        self.api_payloads(
+            {
+                "data": {
+                    "b0": {"source": "policies: [a]"},
+                    "b1": {"source": "policies: [b]"},
+                }
+            }
+        )
+        sources = platform_client().policy_sources
+        sources.request(["a", "b"])
+        assert sources.get("a") == "policies: [a]"
+        # fetched along with "a", and kept
+        assert sources.get("b") == "policies: [b]"
+        assert sources.get("a") == "policies: [a]"
+        [request] = self.api_requests()
+        assert request["variables"] == {"b0_uuid": "a", "b1_uuid": "b"}
+        assert "b0: policy( uuid: $b0_uuid ) { source }" in request["query"]
+
+    def test_fetch(self):
+        self.api_payloads(
+            {"data": {"b0": {"source": "policies: [a]"}}},
+            {"data": {"b0": {"source": "policies: [b]"}, "b1": None}},
+        )
+        sources = platform_client().policy_sources
+        assert sources.get("a") == "policies: [a]"
+        assert sources.fetch(["a", "b", "c"]) == {
+            "a": "policies: [a]",
+            "b": "policies: [b]",
+            "c": None,
+        }
+        # only the missing ones are fetched
+        assert [request["variables"] for request in self.api_requests()] == [
+            {"b0_uuid": "a"},
+            {"b0_uuid": "b", "b1_uuid": "c"},
+        ]
+
+    def test_error(self):
+        self.api_payloads({"data": {"b0": None}, "errors": [{"message": "boom", "path": ["b0"]}]})
+        with pytest.raises(PlatformApiError):
+            platform_client().policy_sources.get("a")
+
+
+class TestAsyncPlatformClient(ClientTests):
+    def test_snippets_as_methods(self):
+        client = async_platform_client()
+        try:
+            for snippet in GRAPHQL_SNIPPETS:
+                method = getattr(client, snippet.name.replace("-", "_"))
+                assert asyncio.iscoroutinefunction(method.__call__)
+        finally:
+            client.close()
+
+    def test_concurrent_calls(self):
+        self.api_payloads(*({"data": {"account": {"key": str(n)}}} for n in range(5)))
+
+        async def run():
+            async with async_platform_client(expr=True, concurrency=2) as client:
+                return await asyncio.gather(
+                    *(client.show_account(provider="AWS", key=str(n)) for n in range(5))
+                )
+
+        results = asyncio.run(run())
+        assert len(results) == 5
+        assert sorted(request["variables"]["key"] for request in self.api_requests()) == [
+            "0",
+            "1",
+            "2",
+            "3",
+            "4",
+        ]
+
+    def test_pagination(self):
+        page1 = {
+            "data": {
+                "accounts": {
+                    "edges": [{"node": {"id": "1"}}],
+                    "pageInfo": {"hasNextPage": True, "endCursor": "cursor1"},
+                }
+            }
+        }
+        page2 = {
+            "data": {
+                "accounts": {
+                    "edges": [{"node": {"id": "2"}}],
+                    "pageInfo": {"hasNextPage": False, "endCursor": "cursor2"},
+                }
+            }
+        }
+        self.api_payloads(page1, page2)
+
+        async def run():
+            async with async_platform_client(pager=True, expr=True) as client:
+                return await client.list_accounts()
+
+        assert asyncio.run(run()) == [{"id": "1"}, {"id": "2"}]
+        [_, request2] = self.api_requests()
+        assert request2["variables"]["after"] == "cursor1"
+
+    def test_iter_items(self):
+        self.api_payloads(accounts_page(["1"], cursor="c1"), accounts_page(["2"]))
+
+        async def run():
+            async with async_platform_client() as client:
+                return [item async for item in client.list_accounts.iter_items()]
+
+        assert asyncio.run(run()) == [{"id": "1"}, {"id": "2"}]
+
+    def test_count(self):
+        self.api_payloads({"data": {"bindings": {"pageInfo": {"total": 7}}}})
+
+        async def run():
+            async with async_platform_client() as client:
+                return await client.list_bindings.count()
+
+        assert asyncio.run(run()) == 7
@@ -0,0 +1,71 @@
+# Copyright Stacklet, Inc.
+# SPDX-License-Identifier: Apache-2.0
+
+import importlib
+import json
+
+import pytest
+
+from stacklet.client.platform.codec import CODECS, JSONCodec, get_codec, reformat
+
+
+def available_codecs():
+    params = []
+    for name, codec in CODECS.items():
+        try:
+            params.append(pytest.param(codec(), id=name))
+        except ImportError:
+            params.append(pytest.param(None, id=name, marks=pytest.mark.skip(reason="missing")))
+    return params
+
+
+class TestCodec:
+    @pytest.mark.parametrize("codec", available_codecs())
+    def test_roundtrip(self, codec):
+        value = {"data": {"accounts": [{"name": "café", "id": 1, "tags": None}]}}
+        encoded = codec.dumps(value)
+        assert isinstance(encoded, bytes)
+        assert codec.loads(encoded) == value
+
+    def test_get_codec_by_name(self):
+        assert isinstance(get_codec("json"), JSONCodec)
+
+    def test_get_codec_fallback(self, monkeypatch):
+        def import_module(name):
+            raise ImportError(name)
+
+        monkeypatch.setattr(importlib, "import_module", import_module)
+        assert get_codec().name == "json"
+
+
+class TestReformat:
+    VALUE = {
+        "data": {
+            "accounts": {
+                "edges": [
+                    {"node": {"name": "café ☕ 𝄞", "tags": [], "variables": {}, "id": 1}},
+                    {"node": {"name": 'a "quoted" \\ name', "tags": [{"key": "k"}], "id": -2.5}},
+                ],
+                "pageInfo": {"hasNextPage": False, "endCursor": None},
+            }
+        }
+    }
+
+    @pytest.mark.parametrize("indent", [None, 0, 2, 4])
+    @pytest.mark.parametrize("chunk_size", [1, 7, 1024])
+    def test_same_as_dumps(self, indent, chunk_size):
+        data = json.dumps(self.VALUE, separators=(",", ":"), ensure_ascii=False).encode()
+        chunks = [data[i : i + chunk_size] for i in range(0, len(data), chunk_size)]
+        assert "".join(reformat(chunks, indent=indent)) == json.dumps(self.VALUE, indent=indent)
+
+    def test_whitespace(self):
+        data = b' {\n "a" : [ 1 ,\t2 ] , "b" : { } }\n'
+        assert "".join(reformat([data], indent=2)) == json.dumps(json.loads(data), indent=2)
+
+    def test_scalar(self):
+        assert "".join(reformat([b'"text"'])) == '"text"'
+
+    @pytest.mark.parametrize("data", [b'{"a": [1, 2]', b'{"a": "b'])
+    def test_incomplete(self, data):
+        with pytest.raises(ValueError):
+            "".join(reformat([data]))
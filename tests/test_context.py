@@ -2,7 +2,7 @@
 
 import pytest
 
-from stacklet.client.platform.context import StackletContext
+from stacklet.client.platform.context import SharedState, StackletContext
 from stacklet.client.platform.exceptions import MissingToken
 from stacklet.client.platform.graphql import GraphQLExecutor
 
@@ -26,3 +26,36 @@ def test_executor_missing_token(self, config_file, sample_config):
         context = StackletContext(config_file=config_file)
         with pytest.raises(MissingToken):
             _ = context.executor
+
+
+class TestSharedState:
+    @pytest.fixture
+    def shared(self, monkeypatch):
+        shared = SharedState()
+        monkeypatch.setattr(StackletContext, "shared", shared)
+        return shared
+
+    def test_executor_new_token(
+        self, shared, config_file, sample_config, api_token_in_file, default_stacklet_dir
+    ):
+        config_file.write_text(json.dumps(sample_config))
+        executor = StackletContext(config_file=config_file).executor
+        assert StackletContext(config_file=config_file).executor is executor
+        closed = []
+        executor.session.close = lambda: closed.append(True)
+
+        (default_stacklet_dir / "credentials").write_text("new-token")
+        new_executor = StackletContext(config_file=config_file).executor
+        # the previous executor is replaced and closed
+        assert new_executor.token == "new-token"
+        assert closed == [True]
+        assert len(shared.executors) == 1
+
+    def test_close(self, shared, config_file, sample_config, api_token_in_file):
+        config_file.write_text(json.dumps(sample_config))
+        executor = StackletContext(config_file=config_file).executor
+        closed = []
+        executor.session.close = lambda: closed.append(True)
+        shared.close()
+        assert closed == [True]
+        assert shared.executors == {}
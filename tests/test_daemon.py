@@ -0,0 +1,245 @@
+# Copyright Stacklet, Inc.
+# SPDX-License-Identifier: Apache-2.0
+
+import io
+import json
+import logging
+import os
+import socket
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+from stacklet.client.platform import daemon
+from stacklet.client.platform.config import StackletConfig
+from stacklet.client.platform.context import StackletContext
+from stacklet.client.platform.dispatch import command_name
+
+ACCOUNTS = {"data": {"accounts": {"edges": [{"node": {"key": "123"}}], "pageInfo": {}}}}
+
+
+@pytest.fixture
+def socket_path():
+    # socket paths are limited in length, so not under the pytest temporary directory
+    with tempfile.TemporaryDirectory() as directory:
+        yield Path(directory) / "daemon.sock"
+
+
+@pytest.fixture
+def running_daemon(socket_path):
+    thread = threading.Thread(target=daemon.serve, args=(socket_path,))
+    thread.start()
+    for _ in range(100):
+        if socket_path.exists():
+            break
+        time.sleep(0.01)
+    yield socket_path
+    daemon.stop(socket_path)
+    thread.join()
+
+
+def forward(socket_path, *argv):
+    stdout, stderr = io.StringIO(), io.StringIO()
+    exit_code = daemon.forward(list(argv), socket_path, stdout=stdout, stderr=stderr)
+    return exit_code, stdout.getvalue(), stderr.getvalue()
+
+
+class TestDaemon:
+    def test_forward(
+        self, requests_adapter, running_daemon, sample_config_file, api_token_in_file, monkeypatch
+    ):
+        requests_adapter.register_uri("POST", "mock://stacklet.acme.org/api", json=ACCOUNTS)
+        loads = []
+        from_file = StackletConfig.from_file
+        monkeypatch.setattr(
+            StackletConfig,
+            "from_file",
+            classmethod(lambda cls, path: loads.append(path) or from_file(path)),
+        )
+
+        for _ in range(2):
+            exit_code, stdout, stderr = forward(
+                running_daemon, f"--config={sample_config_file}", "account", "list"
+            )
+            assert exit_code == 0, stderr
+            assert "key: '123'" in stdout
+        # the config is parsed once and the executor (and its session) reused
+        assert len(loads) == 1
+        assert len(StackletContext.shared.executors) == 1
+
+    def test_client_environment(
+        self, requests_adapter, running_daemon, sample_config_file, api_token_in_file, monkeypatch
+    ):
+        requests_adapter.register_uri("POST", "mock://stacklet.acme.org/api", json=ACCOUNTS)
+        monkeypatch.setenv("STACKLET_OUTPUT", "json")
+        monkeypatch.setenv("STACKLET_CONFIG", sample_config_file.name)
+        monkeypatch.chdir(sample_config_file.parent)
+        exit_code, stdout, _ = forward(running_daemon, "account", "list")
+        assert exit_code == 0
+        assert json.loads(stdout) == ACCOUNTS
+        # the daemon's own environment is back as it was
+        monkeypatch.delenv("STACKLET_OUTPUT")
+        assert "STACKLET_OUTPUT" not in os.environ
+
+    def test_proxy_environment(self, monkeypatch, tmp_path):
+        monkeypatch.setenv("NO_PROXY", "daemon.example.com")
+        monkeypatch.setenv("PATH", "/daemon/bin")
+        env = {"https_proxy": "http://proxy:3128", "REQUESTS_CA_BUNDLE": "/ca.pem"}
+        with daemon._client_environment(str(tmp_path), env):
+            # the client's variables requests reads replace the daemon's
+            assert "NO_PROXY" not in os.environ
+            assert os.environ["https_proxy"] == "http://proxy:3128"
+            assert os.environ["REQUESTS_CA_BUNDLE"] == "/ca.pem"
+            # others are the daemon's own
+            assert os.environ["PATH"] == "/daemon/bin"
+        assert os.environ["NO_PROXY"] == "daemon.example.com"
+        assert "https_proxy" not in os.environ
+
+    def test_client_disconnects(
+        self, requests_adapter, running_daemon, sample_config_file, api_token_in_file
+    ):
+        started, disconnected = threading.Event(), threading.Event()
+
+        def respond(request, context):
+            started.set()
+            assert disconnected.wait(timeout=5)
+            # wait for the daemon to notice, rather than racing it
+            StackletContext.shared.cancelled.wait(timeout=5)
+            return {
+                "data": {
+                    "accounts": {
+                        "edges": [{"node": {"key": "123"}}],
+                        "pageInfo": {"hasNextPage": True, "endCursor": "c1"},
+                    }
+                }
+            }
+
+        requests_adapter.register_uri("POST", "mock://stacklet.acme.org/api", json=respond)
+        argv = [f"--config={sample_config_file}", "account", "list", "--first=1", "--limit=5"]
+        request = {"version": daemon.__version__, "argv": argv, "cwd": os.getcwd(), "env": {}}
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.connect(str(running_daemon))
+            sock.sendall(json.dumps(request).encode() + b"\n")
+            assert started.wait(timeout=5)
+        disconnected.set()
+
+        requests_adapter.register_uri("POST", "mock://stacklet.acme.org/api", json=ACCOUNTS)
+        for _ in range(100):
+            # the daemon runs commands again once the cancelled one is done
+            exit_code, stdout, _ = forward(running_daemon, *argv)
+            if exit_code is not None:
+                break
+            time.sleep(0.01)
+        assert exit_code == 0
+        assert "key: '123'" in stdout
+        # the client going away (e.g. on Ctrl-C) cancels the command before its next page
+        assert len(requests_adapter.request_history) == 2
+        assert requests_adapter.request_history[1].json()["variables"]["after"] == ""
+
+    def test_errors(self, running_daemon, sample_config_file):
+        exit_code, stdout, stderr = forward(
+            running_daemon, f"--config={sample_config_file}", "account", "list"
+        )
+        assert exit_code == 1
+        assert stdout == ""
+        assert "Authorization token not configured" in stderr
+
+    @pytest.mark.parametrize(
+        "argv",
+        [
+            ["login"],
+            ["--output", "json", "graphql", "run"],
+            ["--config=x", "user", "add"],
+            ["daemon", "stop"],
+        ],
+    )
+    def test_local_commands(self, running_daemon, argv):
+        assert forward(running_daemon, *argv) == (None, "", "")
+
+    def test_account_import(
+        self, requests_adapter, running_daemon, sample_config_file, api_token_in_file, tmp_path
+    ):
+        requests_adapter.register_uri(
+            "POST",
+            "mock://stacklet.acme.org/api",
+            json={"data": {"b0": {"account": {"id": "account:1"}}}},
+        )
+        path = tmp_path / "accounts.json"
+        path.write_text(
+            json.dumps([{"provider": "AWS", "key": "1", "name": "a", "security_context": "r"}])
+        )
+        config = f"--config={sample_config_file}"
+        exit_code, stdout, stderr = forward(
+            running_daemon, config, "--output=json", "account", "import", str(path)
+        )
+        assert exit_code == 0, stderr
+        assert json.loads(stdout)["id"] == "account:1"
+        # reading standard input, the command runs in the client
+        assert forward(running_daemon, config, "account", "import", "-") == (None, "", "")
+
+    def test_busy(self, requests_adapter, running_daemon, sample_config_file, api_token_in_file):
+        started, release = threading.Event(), threading.Event()
+
+        def respond(request, context):
+            started.set()
+            release.wait(timeout=5)
+            return ACCOUNTS
+
+        requests_adapter.register_uri("POST", "mock://stacklet.acme.org/api", json=respond)
+        argv = [f"--config={sample_config_file}", "account", "list"]
+        results = []
+        thread = threading.Thread(target=lambda: results.append(forward(running_daemon, *argv)))
+        thread.start()
+        assert started.wait(timeout=5)
+        # while a command runs, others run in their client instead of waiting
+        assert forward(running_daemon, *argv) == (None, "", "")
+        release.set()
+        thread.join()
+        assert results[0][0] == 0
+
+    def test_verbose(self, requests_adapter, running_daemon, sample_config_file, api_token_in_file):
+        requests_adapter.register_uri("POST", "mock://stacklet.acme.org/api", json=ACCOUNTS)
+        root = logging.getLogger()
+        level, handlers = root.level, root.handlers[:]
+        exit_code, _, stderr = forward(
+            running_daemon, f"--config={sample_config_file}", "-vvvv", "account", "list"
+        )
+        assert exit_code == 0
+        # logs go to the client, and the daemon's logging is as it was
+        assert "Response:" in stderr
+        assert (root.level, root.handlers) == (level, handlers)
+
+    def test_not_running(self, socket_path):
+        assert forward(socket_path, "account", "list") == (None, "", "")
+        assert not daemon.stop(socket_path)
+
+    def test_already_running(self, running_daemon):
+        with pytest.raises(RuntimeError):
+            daemon.serve(running_daemon)
+
+    def test_stop(self, socket_path):
+        thread = threading.Thread(target=daemon.serve, args=(socket_path,))
+        thread.start()
+        while not socket_path.exists():
+            time.sleep(0.01)
+        assert daemon.stop(socket_path)
+        thread.join(timeout=5)
+        assert not thread.is_alive()
+        assert not socket_path.exists()
+        assert StackletContext.shared is None
+
+
+@pytest.mark.parametrize(
+    "argv,name",
+    [
+        (["account", "list"], "account"),
+        (["--output", "json", "-vv", "account", "list"], "account"),
+        (["--config=c.json", "--cache", "policy", "list"], "policy"),
+        (["--help"], None),
+    ],
+)
+def test_command_name(argv, name):
+    assert command_name(argv) == name
@@ -0,0 +1,156 @@
+# Copyright Stacklet, Inc.
+# SPDX-License-Identifier: Apache-2.0
+
+import json
+
+import pytest
+import yaml
+
+from stacklet.client.platform import formatter
+from stacklet.client.platform.formatter import (
+    CSVFormatter,
+    JSONFormatter,
+    NDJSONFormatter,
+    RawFormatter,
+    TableFormatter,
+    YAMLFormatter,
+    flatten,
+)
+
+VALUES = [{"id": "1", "tags": ["a"]}, {"id": "2", "tags": []}]
+
+
+class TestStream:
+    def test_json(self):
+        lines = list(JSONFormatter().stream(iter(VALUES)))
+        # one compact document per line
+        assert lines == ['{"id": "1", "tags": ["a"]}', '{"id": "2", "tags": []}']
+        assert [json.loads(line) for line in lines] == VALUES
+
+    def test_yaml(self):
+        output = "\n".join(YAMLFormatter().stream(iter(VALUES)))
+        assert output.startswith("---\n")
+        assert list(yaml.safe_load_all(output)) == VALUES
+
+    def test_plain(self):
+        assert list(RawFormatter().stream(iter(VALUES))) == [str(value) for value in VALUES]
+
+    def test_lazy(self):
+        consumed = []
+
+        def values():
+            for value in VALUES:
+                consumed.append(value)
+                yield value
+
+        stream = JSONFormatter().stream(values())
+        next(stream)
+        assert consumed == VALUES[:1]
+
+    @pytest.mark.parametrize("fmt", [CSVFormatter, TableFormatter])
+    def test_lazy_records(self, fmt, monkeypatch):
+        monkeypatch.setattr(formatter, "SAMPLE_SIZE", 1)
+        consumed = []
+
+        def values():
+            for value in VALUES:
+                consumed.append(value)
+                yield value
+
+        stream = fmt().stream(values())
+        next(stream)
+        # only the sample is read ahead to write the header
+        assert consumed == VALUES[:1]
+
+
+ACCOUNTS = [
+    {
+        "key": "123",
+        "active": True,
+        "tags": [{"key": "env", "value": "prod"}, {"key": "team", "value": "a"}],
+        "accountGroup": {"uuid": "u1", "name": "group"},
+        "regions": ["us-east-1", "us-west-2"],
+    },
+    {"key": "456", "active": False, "tags": [], "accountGroup": None, "regions": []},
+]
+
+
+class TestYAML:
+    @pytest.mark.skipif(not hasattr(yaml, "CSafeDumper"), reason="PyYAML built without libyaml")
+    def test_libyaml(self):
+        assert formatter._yaml_dumper() is yaml.CSafeDumper
+
+    def test_libyaml_missing(self, monkeypatch):
+        monkeypatch.delattr(yaml, "CSafeDumper", raising=False)
+        assert formatter._yaml_dumper() is yaml.SafeDumper
+
+    def test_round_trip(self):
+        value = {"source": "policies:\n  - name: " + "x" * 100 + "\n", "tags": [], "n": None}
+        assert yaml.safe_load(YAMLFormatter()(value)) == value
+
+    def test_pure_python(self, monkeypatch):
+        monkeypatch.delattr(yaml, "CSafeDumper", raising=False)
+        assert YAMLFormatter()(VALUES) == yaml.safe_dump(VALUES, indent=2)
+
+
+class TestFlatten:
+    def test_flatten(self):
+        assert flatten(ACCOUNTS[0]) == {
+            "key": "123",
+            "active": "true",
+            "tags": "env=prod;team=a",
+            "accountGroup.uuid": "u1",
+            "accountGroup.name": "group",
+            "regions": "us-east-1;us-west-2",
+        }
+
+    def test_nested_lists(self):
+        assert flatten({"rules": [{"id": 1}]}) == {"rules": '[{"id": 1}]'}
+
+    def test_scalar(self):
+        assert flatten("x") == {"value": "x"}
+
+
+class TestRecords:
+    def test_ndjson(self):
+        assert NDJSONFormatter()(VALUES[0]) == '{"id": "1", "tags": ["a"]}'
+
+    def test_csv(self):
+        assert CSVFormatter()(ACCOUNTS).splitlines() == [
+            "key,active,tags,accountGroup.uuid,accountGroup.name,regions",
+            "123,true,env=prod;team=a,u1,group,us-east-1;us-west-2",
+            "456,false,,,,",
+        ]
+
+    def test_csv_quoting(self):
+        assert CSVFormatter()({"name": 'a, "b"'}) == 'name\n"a, ""b"""'
+
+    def test_empty(self):
+        assert CSVFormatter()([]) == ""
+        assert TableFormatter()([]) == ""
+
+    def test_table(self):
+        records = [{k: v for k, v in account.items() if k != "regions"} for account in ACCOUNTS]
+        assert TableFormatter()(records).splitlines() == [
+            "key  active  tags             accountGroup.uuid  accountGroup.name",
+            "---  ------  ---------------  -----------------  -----------------",
+            "123  true    env=prod;team=a  u1                 group",
+            "456  false",
+        ]
+
+    def test_table_width(self, monkeypatch):
+        monkeypatch.setattr(formatter, "SAMPLE_SIZE", 1)
+        lines = TableFormatter()([{"name": "a" * 60}, {"name": "b" * 80}]).splitlines()
+        # sized from the sample, and capped
+        assert lines[2] == "a" * 49 + "…"
+        assert lines[3] == "b" * 49 + "…"
+
+    def test_table_sample_columns(self, monkeypatch):
+        monkeypatch.setattr(formatter, "SAMPLE_SIZE", 1)
+        # fields first seen past the sample are left out
+        assert TableFormatter()([{"a": "1"}, {"a": "2", "b": "3"}]).splitlines() == [
+            "a",
+            "-",
+            "1",
+            "2",
+        ]
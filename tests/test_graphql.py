@@ -1,12 +1,49 @@
 # Copyright Stacklet, Inc.
 # SPDX-License-Identifier: Apache-2.0
 
+import asyncio
+import hashlib
+import json
+import threading
+import time
+from types import SimpleNamespace
+
 import pytest
+import requests
 import requests_mock
 
 from stacklet.client.platform.context import StackletContext
-from stacklet.client.platform.graphql import GraphQLExecutor, GraphQLSnippet
-from stacklet.client.platform.graphql.snippets import ListAccounts
+from stacklet.client.platform.graphql import (
+    GRAPHQL_SNIPPETS,
+    AsyncGraphQLExecutor,
+    GraphQLExecutor,
+    GraphQLSnippet,
+)
+from stacklet.client.platform.graphql.executor import RequestCancelled, adhoc_snippet
+from stacklet.client.platform.graphql.persisted import PersistedHashes
+from stacklet.client.platform.graphql.retry import RetryPolicy, parse_retry_after
+from stacklet.client.platform.graphql.snippet import (
+    SnippetTemplate,
+    _render_selection,
+    _split_snippet,
+    count_snippet,
+    profiled_snippet,
+    projected_snippet,
+)
+from stacklet.client.platform.graphql.snippets import (
+    AddAccount,
+    ListAccounts,
+    ListPolicies,
+    ListRepository,
+    RunBinding,
+    ShowAccount,
+    ShowBinding,
+    ShowPolicy,
+    ShowPolicyCollection,
+    ValidateAccount,
+)
+
+from .asserts import assert_query
 
 
 @pytest.fixture
@@ -110,6 +147,620 @@ class TransformSnippet(GraphQLSnippet):
         payload = requests_adapter.last_request.json()
         assert payload["variables"]["somevar"] == ("TEST" if transform_variables else "test")
 
+    def test_executor_decodes_once(self, requests_adapter, executor, monkeypatch):
+        requests_adapter.post(requests_mock.ANY, json={"data": {"platform": {}}})
+        loads = []
+        monkeypatch.setattr(executor.codec, "loads", lambda data: loads.append(data) or {})
+        dumps = []
+        monkeypatch.setattr(
+            "stacklet.client.platform.graphql.executor.json",
+            SimpleNamespace(dumps=lambda *a, **kw: dumps.append(a)),
+        )
+
+        executor.run_query("{ platform { version } }")
+
+        assert len(loads) == 1
+        # debug logging is off, so nothing is formatted for it
+        assert dumps == []
+        assert requests_adapter.last_request.headers["Content-Type"] == "application/json"
+
+    def test_executor_last_response(self, requests_adapter, executor):
+        assert executor.last_response is None
+        requests_adapter.register_uri(
+            "POST", "mock://stacklet.acme.org/api", text='{"data": {"accounts": []}}'
+        )
+        executor.run_query("query { accounts { id } }")
+        assert executor.last_response.size == 26
+        assert executor.last_response.elapsed >= 0
+
+    def test_stream_snippet(self, requests_adapter, executor, monkeypatch):
+        body = b'{"data": {"account": {"name": "a1"}}}'
+        requests_adapter.register_uri("POST", "mock://stacklet.acme.org/api", content=body)
+        monkeypatch.setattr(executor.codec, "loads", lambda data: pytest.fail("decoded"))
+
+        chunks = executor.stream_snippet(ShowAccount, {"provider": "AWS", "key": "1"})
+        assert b"".join(chunks) == body
+        assert executor.last_response.size == len(body)
+        sent = json.loads(requests_adapter.last_request.body)
+        assert sent["variables"] == {"provider": "AWS", "key": "1"}
+
+    def test_cli_json_passthrough(self, run_query):
+        response = {"data": {"accounts": {"edges": [{"node": {"name": "café"}}], "pageInfo": {}}}}
+        res, _ = run_query("--output=json", ["account", "list"], response)
+        assert res.output == json.dumps(response, indent=2) + "\n"
+
+    def test_cli_ndjson_passthrough(self, run_query):
+        response = {"data": {"accounts": {"edges": [{"node": {"name": "café"}}], "pageInfo": {}}}}
+        res, _ = run_query("--output=ndjson", ["account", "list"], response)
+        assert res.output == json.dumps(response) + "\n"
+
+    def test_executor_debug_logging(self, requests_adapter, executor, caplog):
+        requests_adapter.post(requests_mock.ANY, json={"data": {"platform": {"version": "1"}}})
+        with caplog.at_level("DEBUG", logger="GraphQLExecutor"):
+            executor.run_query("{ platform { version } }")
+        assert '"version": "1"' in caplog.text
+
+
+class TestGraphqlExecutorBatching:
+    def test_run_many(self, requests_adapter, executor):
+        requests_adapter.post(
+            requests_mock.ANY,
+            json={
+                "data": {
+                    "b0": {"key": "111", "name": "one"},
+                    "b1": None,
+                },
+                "errors": [{"message": "account not found", "path": ["b1"]}],
+            },
+        )
+
+        results = executor.run_many(
+            ShowAccount,
+            [
+                {"provider": "AWS", "key": "111"},
+                {"provider": "AWS", "key": "222"},
+            ],
+        )
+
+        assert results == [
+            {"data": {"account": {"key": "111", "name": "one"}}},
+            {
+                "data": {"account": None},
+                "errors": [{"message": "account not found", "path": ["account"]}],
+            },
+        ]
+        [request] = requests_adapter.request_history
+        body = request.json()
+        assert body["variables"] == {
+            "b0_provider": "AWS",
+            "b0_key": "111",
+            "b1_provider": "AWS",
+            "b1_key": "222",
+        }
+        assert body["query"].startswith(
+            "query ($b0_provider: CloudProvider!, $b0_key: String!, "
+            "$b1_provider: CloudProvider!, $b1_key: String!) {"
+        )
+        assert "b0: account( provider: $b0_provider key: $b0_key )" in " ".join(
+            body["query"].split()
+        )
+
+    def test_run_batch_mixed(self, requests_adapter, executor):
+        requests_adapter.post(
+            requests_mock.ANY,
+            [
+                {"json": {"data": {"b0": {"uuid": "u1"}, "b1": {"key": "111"}}}},
+                {"json": {"data": {"b0": {"binding": {"uuid": "u1"}}}}},
+            ],
+        )
+
+        results = executor.run_batch(
+            [
+                (ShowBinding, {"uuid": "u1"}),
+                (ShowAccount, {"provider": "AWS", "key": "111"}),
+                (RunBinding, {"uuid": "u1"}),
+            ]
+        )
+
+        assert results == [
+            {"data": {"binding": {"uuid": "u1"}}},
+            {"data": {"account": {"key": "111"}}},
+            {"data": {"runBinding": {"binding": {"uuid": "u1"}}}},
+        ]
+        # queries and mutations can't share a document
+        queries = [request.json()["query"] for request in requests_adapter.request_history]
+        assert [q.split()[0] for q in queries] == ["query", "mutation"]
+
+    def test_run_many_batch_size(self, requests_adapter, executor):
+        requests_adapter.post(requests_mock.ANY, json={"data": {"b0": {}, "b1": {}}})
+        results = executor.run_many(ShowBinding, [{"uuid": str(n)} for n in range(5)], batch_size=2)
+        assert len(results) == 5
+        assert requests_adapter.call_count == 3
+
+    def test_run_many_request_error(self, requests_adapter, executor):
+        error = {"message": "The incoming token has expired"}
+        requests_adapter.post(requests_mock.ANY, json=error)
+        results = executor.run_many(ShowBinding, [{"uuid": "u1"}, {"uuid": "u2"}])
+        assert results == [error, error]
+
+    def test_run_many_unaliased_errors(self, requests_adapter, executor):
+        error = {"message": "Syntax Error"}
+        requests_adapter.post(requests_mock.ANY, json={"data": None, "errors": [error]})
+        results = executor.run_many(ShowBinding, [{"uuid": "u1"}, {"uuid": "u2"}])
+        assert results == [{"data": None, "errors": [error]}] * 2
+
+    def test_run_query_batched(self, requests_adapter, executor):
+        requests_adapter.post(requests_mock.ANY, json={"data": {"b0": {"version": "1"}}})
+        snippet = type(
+            "Platform",
+            (GraphQLSnippet,),
+            {"name": "platform", "snippet": "query { platform { version } }"},
+        )
+        [result] = executor.run_many(snippet, [None])
+        assert result == {"data": {"platform": {"version": "1"}}}
+        assert_query(requests_adapter.last_request.json(), "query { b0: platform { version } }")
+
+
+class TestGraphqlExecutorRetry:
+    @pytest.fixture
+    def sleeps(self, monkeypatch) -> list[float]:
+        """Record waits instead of sleeping, advancing the clock as they would."""
+        sleeps = []
+        monkeypatch.setattr("stacklet.client.platform.graphql.executor.time.sleep", sleeps.append)
+        monkeypatch.setattr(
+            "stacklet.client.platform.graphql.executor.time.monotonic", lambda: sum(sleeps)
+        )
+        return sleeps
+
+    @pytest.fixture
+    def executor(self, executor) -> GraphQLExecutor:
+        executor.retry = RetryPolicy(max_attempts=3, backoff=1, jitter=False)
+        return executor
+
+    def test_retry_query(self, requests_adapter, executor, sleeps):
+        payload = {"data": {"account": {"key": "111"}}}
+        requests_adapter.post(
+            requests_mock.ANY,
+            [
+                {"status_code": 502, "text": "Bad Gateway"},
+                {"exc": requests.ConnectionError("connection reset")},
+                {"json": payload},
+            ],
+        )
+
+        result = executor.run_snippet(ShowAccount, {"provider": "AWS", "key": "111"})
+
+        assert result == payload
+        assert requests_adapter.call_count == 3
+        assert sleeps == [1, 2]
+        assert executor.retry_stats.requests == 3
+        assert executor.retry_stats.retries == 2
+        assert executor.retry_stats.wait_time == 3
+        assert executor.retry_stats.exhausted == 0
+
+    def test_retry_after(self, requests_adapter, executor, sleeps):
+        requests_adapter.post(
+            requests_mock.ANY,
+            [
+                {"status_code": 429, "headers": {"Retry-After": "7"}, "json": {}},
+                {"json": {"data": {}}},
+            ],
+        )
+        executor.run_query("{ platform { version } }")
+        assert sleeps == [7]
+
+    def test_cancelled(self, requests_adapter, executor):
+        executor.cancelled = threading.Event()
+
+        def respond(request, context):
+            # cancelled while waiting to retry, which isn't sent then
+            executor.cancelled.set()
+            context.status_code = 503
+            return {"message": "busy"}
+
+        requests_adapter.post(requests_mock.ANY, json=respond)
+        with pytest.raises(RequestCancelled):
+            executor.run_query("{ platform { version } }")
+        assert requests_adapter.call_count == 1
+
+    def test_retry_exhausted(self, requests_adapter, executor, sleeps):
+        requests_adapter.post(requests_mock.ANY, status_code=503, json={"message": "busy"})
+        assert executor.run_query("{ platform { version } }") == {"message": "busy"}
+        assert requests_adapter.call_count == 3
+        assert executor.retry_stats.exhausted == 1
+
+    def test_retry_connection_error_exhausted(self, requests_adapter, executor, sleeps):
+        requests_adapter.post(requests_mock.ANY, exc=requests.ConnectTimeout)
+        with pytest.raises(requests.ConnectTimeout):
+            executor.run_query("{ platform { version } }")
+        assert requests_adapter.call_count == 3
+
+    def test_retry_budget(self, requests_adapter, executor, sleeps):
+        executor.retry = RetryPolicy(max_attempts=10, backoff=1, jitter=False, budget=5)
+        requests_adapter.post(requests_mock.ANY, status_code=429, json={})
+        executor.run_query("{ platform { version } }")
+        # waits of 1, 2 fit the budget, the next one of 4 doesn't
+        assert sleeps == [1, 2]
+
+    def test_no_retry_mutation(self, requests_adapter, executor, sleeps):
+        requests_adapter.post(requests_mock.ANY, exc=requests.ConnectionError)
+        with pytest.raises(requests.ConnectionError):
+            executor.run_snippet(
+                AddAccount,
+                {"name": "n", "key": "111", "provider": "AWS", "security_context": "role"},
+            )
+        assert requests_adapter.call_count == 1
+        assert sleeps == []
+
+    def test_retry_idempotent_mutation(self, requests_adapter, executor, sleeps):
+        requests_adapter.post(
+            requests_mock.ANY, [{"status_code": 502, "text": ""}, {"json": {"data": {}}}]
+        )
+        executor.run_snippet(ValidateAccount, {"provider": "AWS", "key": "111"})
+        assert requests_adapter.call_count == 2
+
+
+class TestRetryPolicy:
+    def test_delay(self):
+        policy = RetryPolicy(backoff=0.5, max_backoff=3, jitter=False)
+        assert [policy.delay(attempt) for attempt in range(1, 6)] == [0.5, 1, 2, 3, 3]
+
+    def test_delay_jitter(self):
+        policy = RetryPolicy(backoff=1)
+        assert all(0 <= policy.delay(3) <= 4 for _ in range(20))
+
+    def test_delay_retry_after(self):
+        assert RetryPolicy().delay(1, retry_after=12.5) == 12.5
+
+    @pytest.mark.parametrize(
+        "value,expected",
+        [(None, None), ("", None), ("3", 3), ("-1", 0), ("Wed, 21 Oct 2015 07:28:00 GMT", 0)],
+    )
+    def test_parse_retry_after(self, value, expected):
+        assert parse_retry_after(value) == expected
+
+
+class PersistedQueryServer:
+    """A stand-in API implementing automatic persisted queries."""
+
+    def __init__(self, supported=True):
+        self.supported = supported
+        self.queries: dict[str, str] = {}
+        self.received: list[dict] = []
+
+    def __call__(self, request, context):
+        body = request.json()
+        self.received.append(body)
+        persisted = (body.get("extensions") or {}).get("persistedQuery")
+        if persisted and not self.supported:
+            return self._error("PersistedQueryNotSupported")
+        elif persisted:
+            digest = persisted["sha256Hash"]
+            if "query" in body:
+                assert hashlib.sha256(body["query"].encode()).hexdigest() == digest
+                self.queries[digest] = body["query"]
+            elif digest not in self.queries:
+                return self._error("PersistedQueryNotFound", "PERSISTED_QUERY_NOT_FOUND")
+        return {"data": {"platform": {"version": "1"}}}
+
+    def _error(self, message, code=None):
+        error = {"message": message}
+        if code:
+            error["extensions"] = {"code": code}
+        return {"errors": [error]}
+
+
+class TestGraphqlExecutorPersistedQueries:
+    @pytest.fixture
+    def executor(self, executor) -> GraphQLExecutor:
+        executor.persisted_queries = True
+        return executor
+
+    def test_hash_only_when_known(self, requests_adapter, executor):
+        server = PersistedQueryServer()
+        requests_adapter.post(requests_mock.ANY, json=server)
+        query = "{ platform { version } }"
+        digest = hashlib.sha256(query.encode()).hexdigest()
+
+        assert executor.run_query(query) == {"data": {"platform": {"version": "1"}}}
+        assert executor.run_query(query) == {"data": {"platform": {"version": "1"}}}
+
+        # the first request registers the query, the next only sends its hash
+        first, second = server.received
+        assert first["query"] == query
+        assert first["extensions"]["persistedQuery"] == {"version": 1, "sha256Hash": digest}
+        assert "query" not in second
+        assert second["extensions"]["persistedQuery"] == {"version": 1, "sha256Hash": digest}
+        assert digest in executor.persisted_hashes
+
+    def test_hashes_saved(self, requests_adapter, executor, tmp_path):
+        server = PersistedQueryServer()
+        requests_adapter.post(requests_mock.ANY, json=server)
+        query = "{ platform { version } }"
+        executor.persisted_hashes = PersistedHashes(tmp_path / "hashes")
+        executor.run_query(query)
+
+        # a later run knows the query is registered
+        later = GraphQLExecutor(
+            executor.api,
+            "token",
+            persisted_queries=True,
+            persisted_hashes=PersistedHashes(tmp_path / "hashes"),
+        )
+        assert later.run_query(query) == {"data": {"platform": {"version": "1"}}}
+        assert ["query" in body for body in server.received] == [True, False]
+
+    def test_hashes_saved_for_cli(
+        self, requests_adapter, sample_config_file, api_token_in_file, invoke_cli
+    ):
+        server = PersistedQueryServer()
+        requests_adapter.post(requests_mock.ANY, json=server)
+        for _ in range(2):
+            res = invoke_cli("--persisted-queries", "binding", "show", "--uuid=u1")
+            assert res.exit_code == 0
+        # the second command sends the query registered by the first by hash only
+        assert ["query" in body for body in server.received] == [True, False]
+
+    def test_dropped_by_server(self, requests_adapter, executor):
+        server = PersistedQueryServer()
+        requests_adapter.post(requests_mock.ANY, json=server)
+        query = "{ platform { version } }"
+        executor.run_query(query)
+        server.queries.clear()
+
+        assert executor.run_query(query) == {"data": {"platform": {"version": "1"}}}
+        # the hash isn't found, so the query is sent again in full
+        assert ["query" in body for body in server.received] == [True, False, True]
+
+    def test_variables_kept(self, requests_adapter, executor):
+        server = PersistedQueryServer()
+        requests_adapter.post(requests_mock.ANY, json=server)
+        executor.run_snippet(ShowBinding, {"uuid": "u1"})
+        executor.run_snippet(ShowBinding, {"uuid": "u1"})
+        assert [body["variables"] for body in server.received] == [{"uuid": "u1"}] * 2
+
+    def test_not_supported(self, requests_adapter, executor):
+        server = PersistedQueryServer(supported=False)
+        requests_adapter.post(requests_mock.ANY, json=server)
+
+        executor.run_query("{ platform { version } }")
+        executor.run_query("{ platform { version } }")
+
+        assert not executor.persisted_queries
+        assert ["extensions" in body for body in server.received] == [True, False, False]
+        assert all("query" in body for body in server.received)
+
+    def test_stream_snippet(self, requests_adapter, executor):
+        server = PersistedQueryServer()
+        requests_adapter.post(requests_mock.ANY, json=server)
+        snippet = adhoc_snippet("{ platform { version } }")
+        executor.run_snippet(snippet)
+        chunks = executor.stream_snippet(snippet)
+        assert json.loads(b"".join(chunks)) == {"data": {"platform": {"version": "1"}}}
+        assert "query" not in server.received[1]
+
+    def test_cli_option(self, requests_adapter, sample_config_file, api_token_in_file, invoke_cli):
+        server = PersistedQueryServer()
+        requests_adapter.post(requests_mock.ANY, json=server)
+        res = invoke_cli("--persisted-queries", "binding", "show", "--uuid=u1")
+        assert res.exit_code == 0
+        assert "persistedQuery" in server.received[0]["extensions"]
+
+
+class TestListAll:
+    def test_ndjson(self, run_queries):
+        responses = [
+            {
+                "data": {
+                    "accounts": {
+                        "edges": [{"node": {"key": "1"}}, {"node": {"key": "2"}}],
+                        "pageInfo": {"hasNextPage": True, "endCursor": "c1"},
+                    }
+                }
+            },
+            {
+                "data": {
+                    "accounts": {
+                        "edges": [{"node": {"key": "3"}}],
+                        "pageInfo": {"hasNextPage": False, "endCursor": "c2"},
+                    }
+                }
+            },
+        ]
+        res, bodies = run_queries(
+            "--output=json", ["account", "list", "--all", "--first=2"], responses=responses
+        )
+        assert res.exit_code == 0, res.output
+        assert res.output.splitlines() == ['{"key": "1"}', '{"key": "2"}', '{"key": "3"}']
+        assert [body["variables"]["after"] for body in bodies] == ["", "c1"]
+        assert all(body["variables"]["first"] == 2 for body in bodies)
+
+    @pytest.mark.parametrize(
+        "response,message",
+        [
+            ({"message": "The incoming token has expired"}, "token has expired"),
+            ({"data": None, "errors": [{"message": "boom"}]}, "boom"),
+        ],
+    )
+    def test_failed(self, run_queries, response, message):
+        res, _ = run_queries("--output=json", ["account", "list", "--all"], responses=[response])
+        assert res.exit_code == 1
+        assert message in res.output
+
+    def test_yaml(self, run_queries):
+        response = {
+            "data": {
+                "policies": {
+                    "edges": [{"node": {"name": "p1"}}, {"node": {"name": "p2"}}],
+                    "pageInfo": {"hasNextPage": False, "endCursor": "c1"},
+                }
+            }
+        }
+        res, _ = run_queries("--output=yaml", ["policy", "list", "--all"], responses=[response])
+        assert res.exit_code == 0, res.output
+        assert res.output == "---\nname: p1\n---\nname: p2\n"
+
+    def test_limit(self, run_queries):
+        responses = [
+            {
+                "data": {
+                    "accounts": {
+                        "edges": [{"node": {"key": "1"}}, {"node": {"key": "2"}}],
+                        "pageInfo": {"hasNextPage": True, "endCursor": "c1"},
+                    }
+                }
+            },
+            {
+                "data": {
+                    "accounts": {
+                        "edges": [{"node": {"key": "3"}}],
+                        "pageInfo": {"hasNextPage": True, "endCursor": "c2"},
+                    }
+                }
+            },
+        ]
+        res, bodies = run_queries(
+            "--output=json", ["account", "list", "--limit=3", "--first=2"], responses=responses
+        )
+        assert res.exit_code == 0, res.output
+        assert [body["variables"]["first"] for body in bodies] == [2, 1]
+        result = json.loads(res.output)
+        assert [edge["node"]["key"] for edge in result["data"]["accounts"]["edges"]] == [
+            "1",
+            "2",
+            "3",
+        ]
+
+    def test_limit_last(self, run_queries):
+        response = {
+            "data": {
+                "accounts": {
+                    "edges": [{"node": {"key": "1"}}, {"node": {"key": "2"}}],
+                    "pageInfo": {"hasNextPage": False, "endCursor": "c1"},
+                }
+            }
+        }
+        res, bodies = run_queries(
+            "--output=json", ["account", "list", "--limit=2", "--last=5"], responses=[response]
+        )
+        assert res.exit_code == 0, res.output
+        [body] = bodies
+        assert body["variables"]["last"] == 2
+
+    def test_limit_all(self, run_queries):
+        response = {
+            "data": {
+                "accounts": {
+                    "edges": [{"node": {"key": "1"}}],
+                    "pageInfo": {"hasNextPage": True, "endCursor": "c1"},
+                }
+            }
+        }
+        res, bodies = run_queries(
+            "--output=json", ["account", "list", "--all", "--limit=1"], responses=[response]
+        )
+        assert res.exit_code == 0, res.output
+        assert res.output == '{"key": "1"}\n'
+        assert len(bodies) == 1
+
+    def test_csv(self, run_queries):
+        responses = [
+            {
+                "data": {
+                    "accounts": {
+                        "edges": [{"node": {"key": "1", "tags": [{"key": "k", "value": "v"}]}}],
+                        "pageInfo": {"hasNextPage": True, "endCursor": "c1"},
+                    }
+                }
+            },
+            {
+                "data": {
+                    "accounts": {
+                        "edges": [{"node": {"key": "2", "tags": []}}],
+                        "pageInfo": {"hasNextPage": False, "endCursor": "c2"},
+                    }
+                }
+            },
+        ]
+        res, _ = run_queries("--output=csv", ["account", "list", "--all"], responses=responses)
+        assert res.exit_code == 0, res.output
+        assert res.output.splitlines() == ["key,tags", "1,k=v", "2,"]
+
+    def test_table_page(self, run_queries):
+        response = {
+            "data": {
+                "accounts": {
+                    "edges": [{"node": {"key": "1", "name": "one"}}],
+                    "pageInfo": {"hasNextPage": True, "endCursor": "c1"},
+                }
+            }
+        }
+        # a single page is laid out as its results too
+        res, _ = run_queries("--output=table", ["account", "list"], responses=[response])
+        assert res.exit_code == 0, res.output
+        assert res.output.splitlines() == ["key  name", "---  ----", "1    one"]
+
+    def test_table_error(self, run_queries):
+        res, _ = run_queries(
+            "--output=table", ["account", "list"], responses=[{"errors": [{"message": "boom"}]}]
+        )
+        assert res.exit_code == 1
+        assert "Query failed" in res.output
+
+    def test_error(self, run_queries):
+        res, _ = run_queries(
+            "account", ["list", "--all"], responses=[{"errors": [{"message": "boom"}]}]
+        )
+        assert res.exit_code == 1
+        assert "Query failed" in res.output
+        assert "--resume" not in res.output
+
+
+class TestAsyncGraphqlExecutor:
+    def test_run_snippet(self, requests_adapter, sample_config, api_token_in_file):
+        payload = {"data": {"accounts": {"edges": []}}}
+        requests_adapter.post(requests_mock.ANY, json=payload)
+
+        async def run():
+            async with AsyncGraphQLExecutor(sample_config["api"], api_token_in_file) as executor:
+                return await executor.run_snippet(ListAccounts, variables={"first": 1})
+
+        assert asyncio.run(run()) == payload
+        assert requests_adapter.last_request.json()["variables"] == {"first": 1}
+
+    def test_concurrency_limit(self, sample_config, api_token_in_file):
+        lock = threading.Lock()
+        in_flight = 0
+        peak = 0
+
+        # requests-mock serializes requests, so stand in for the HTTP call instead
+        def post(request, retry=True):
+            nonlocal in_flight, peak
+            with lock:
+                in_flight += 1
+                peak = max(peak, in_flight)
+            time.sleep(0.02)
+            with lock:
+                in_flight -= 1
+            return {"data": {"platform": {"version": "1"}}}
+
+        async def run():
+            async with AsyncGraphQLExecutor(
+                sample_config["api"], api_token_in_file, concurrency=3
+            ) as executor:
+                executor.executor.post = post
+                return await asyncio.gather(
+                    *(executor.run_query("{ platform { version } }") for _ in range(12))
+                )
+
+        results = asyncio.run(run())
+        assert len(results) == 12
+        assert peak == 3
+
+    def test_invalid_concurrency(self):
+        with pytest.raises(ValueError):
+            AsyncGraphQLExecutor("mock://stacklet.acme.org/api", "token", concurrency=0)
+
 
 class TestGraphQLSnippet:
     def test_build(self):
@@ -126,12 +777,300 @@ class Snippet(GraphQLSnippet):
 
         result = Snippet.build({"somevar": "test"})
         assert result == {
-            "query": """query ($somevar: String!) {
-              sample(somevar: $somevar) {
-                foo
-                bar
+            "query": "query ($somevar: String!) { sample(somevar: $somevar) { foo bar } }",
+            "variables": {"somevar": "test"},
+        }
+
+    def test_build_optional(self):
+        class Snippet(GraphQLSnippet):
+            name = "sample"
+            snippet = """
+            mutation {
+              sample(input: {
+                id: $id
+                label: "$label"
+                tags: $tags
+              }) {
+                id
               }
             }
-            """,
-            "variables": {"somevar": "test"},
+            """
+            required = {"id": "ID"}
+            optional = {"label": "Label", "tags": "Tags"}
+            parameter_types = {"tags": "[String!]"}
+
+        result = Snippet.build({"id": 1, "label": None, "tags": ["a"]})
+        assert result == {
+            "query": (
+                "mutation ($id: Int!, $tags: [String!]) "
+                "{ sample(input: { id: $id tags: $tags }) { id } }"
+            ),
+            "variables": {"id": 1, "tags": ["a"]},
         }
+        result = Snippet.build({"id": "x", "label": "l", "tags": ()})
+        assert result == {
+            "query": (
+                "mutation ($id: String!, $label: String!) "
+                "{ sample(input: { id: $id label: $label }) { id } }"
+            ),
+            "variables": {"id": "x", "label": "l"},
+        }
+
+    def test_build_compiled_once(self, monkeypatch):
+        class Snippet(GraphQLSnippet):
+            name = "sample"
+            snippet = "query { sample(somevar: $somevar) { foo } }"
+
+        compiled = []
+        compile = SnippetTemplate.compile.__func__
+
+        def record(cls, *args):
+            compiled.append(args)
+            return compile(cls, *args)
+
+        monkeypatch.setattr(SnippetTemplate, "compile", classmethod(record))
+        first = Snippet.build({"somevar": "a"})
+        second = Snippet.build({"somevar": "b"})
+
+        assert len(compiled) == 1
+        assert first["query"] is second["query"]
+        assert second["variables"] == {"somevar": "b"}
+
+    def test_template_per_class(self):
+        class Snippet(GraphQLSnippet):
+            name = "sample"
+            snippet = "query { sample { foo } }"
+
+        class Other(Snippet):
+            snippet = "query { other { foo } }"
+
+        assert Snippet.build()["query"] == "query { sample { foo } }"
+        assert Other.build()["query"] == "query { other { foo } }"
+
+
+class TestCountSnippet:
+    def test_paginated(self):
+        snippet_class = count_snippet(ListAccounts)
+        assert snippet_class.build() == {
+            "query": "query { accounts(first: 0) { pageInfo { total } } }"
+        }
+        assert snippet_class.result_expr == "data.accounts.pageInfo.total"
+        # built once per listing
+        assert count_snippet(ListAccounts) is snippet_class
+
+    def test_not_paginated(self):
+        snippet_class = count_snippet(ListRepository)
+        assert snippet_class.build() == {
+            "query": "query { repositoryConfigs { pageInfo { total } } }"
+        }
+
+    def test_nested(self):
+        class Nested(GraphQLSnippet):
+            name = "nested"
+            snippet = "query { org { members(first: $first) { edges { node { id } } } } }"
+            pagination_expr = "data.org.members.pageInfo"
+
+        assert count_snippet(Nested).build() == {
+            "query": "query { org { members(first: 0) { pageInfo { total } } } }"
+        }
+
+    def test_not_a_listing(self):
+        with pytest.raises(ValueError):
+            count_snippet(ShowAccount)
+
+    @pytest.mark.parametrize(
+        "command,field",
+        [
+            ("account", "accounts"),
+            ("policy", "policies"),
+            ("binding", "bindings"),
+            ("policy-collection", "policyCollections"),
+            ("account-group", "accountGroups"),
+            ("repository", "repositoryConfigs"),
+        ],
+    )
+    def test_cli(self, run_query, command, field):
+        res, body = run_query(
+            command, ["list", "--count"], response={"data": {field: {"pageInfo": {"total": 42}}}}
+        )
+        assert res.output == "42\n"
+        assert "edges" not in body["query"]
+        assert "total" in body["query"]
+
+    def test_cli_token_expired(self, run_queries):
+        res, _ = run_queries(
+            "account",
+            ["list", "--count"],
+            responses=[{"message": "The incoming token has expired"}],
+        )
+        assert res.exit_code == 1
+        assert "token has expired" in res.output
+
+    def test_cli_not_on_other_commands(self, invoke_cli):
+        res = invoke_cli("account", "show", "--help")
+        assert "--count" not in res.output
+
+
+class TestProjectedSnippet:
+    VARIABLES = {"first": 20, "last": 0, "before": "", "after": ""}
+
+    def test_fields(self):
+        snippet_class = projected_snippet(ListPolicies, ("uuid", "name", "commit.hash"))
+        query = snippet_class.build(self.VARIABLES)["query"]
+        assert query.endswith(
+            "{ edges { node { uuid name commit { hash } } } "
+            "pageInfo { hasPreviousPage hasNextPage startCursor endCursor total } } }"
+        )
+        assert snippet_class.pagination_expr == ListPolicies.pagination_expr
+        assert snippet_class.result_expr == ListPolicies.result_expr
+        assert snippet_class.cache_entities() == frozenset({"policy"})
+        # built once per set of fields
+        assert projected_snippet(ListPolicies, ("uuid", "name", "commit.hash")) is snippet_class
+
+    def test_snippet_order(self):
+        snippet_class = projected_snippet(ListAccounts, ("name", "key"))
+        assert "node { key name }" in snippet_class.build(self.VARIABLES)["query"]
+
+    def test_whole_subfield(self):
+        snippet_class = projected_snippet(ListAccounts, ("tags", "tags.key"))
+        assert "node { tags { key value } }" in snippet_class.build(self.VARIABLES)["query"]
+
+    def test_optional_variables(self):
+        class Items(GraphQLSnippet):
+            name = "items"
+            snippet = """
+                query {
+                  items(
+                    kind: $kind
+                  ) {
+                    id
+                    name
+                  }
+                }
+            """
+            optional = {"kind": "The kind"}
+            result_expr = "data.items"
+
+        # lines with optional variables are still left out when they're not set
+        assert projected_snippet(Items, ("name",)).build({"kind": None})["query"] == (
+            "query { items( ) { name } }"
+        )
+
+    def test_mutation(self):
+        snippet_class = projected_snippet(AddAccount, ("key", "name"))
+        query = snippet_class.build({"name": "a", "key": "1", "provider": "AWS"})["query"]
+        assert query.endswith("{ account { key name } } }")
+
+    @pytest.mark.parametrize(
+        "fields,message",
+        [
+            (("uuid",), "unknown field uuid"),
+            (("tags.name",), "unknown field tags.name"),
+            (("key.x",), "field key has no subfields"),
+            ((), "no fields given"),
+        ],
+    )
+    def test_invalid(self, fields, message):
+        with pytest.raises(ValueError, match=message):
+            projected_snippet(ListAccounts, fields)
+
+    def test_root_field(self):
+        # without a result expression, results are the root field's
+        snippet_class = projected_snippet(ShowBinding, ("uuid",))
+        assert snippet_class.build({"uuid": "u"})["query"].endswith(
+            "{ binding( uuid: $uuid ) { uuid } }"
+        )
+
+    def test_no_results(self):
+        class Version(GraphQLSnippet):
+            name = "version"
+            snippet = "query { version }"
+
+        with pytest.raises(ValueError, match="no results"):
+            projected_snippet(Version, ("major",))
+
+    @pytest.mark.parametrize("snippet_class", GRAPHQL_SNIPPETS, ids=lambda cls: cls.name)
+    def test_parse(self, snippet_class):
+        # every snippet can be parsed, and rendered back to the same query
+        head, selection, tail = _split_snippet(snippet_class.snippet)
+        rendered = head + _render_selection(selection) + tail
+        assert " ".join(rendered.replace("{", " {").split()) == " ".join(
+            snippet_class.snippet.replace("{", " {").split()
+        )
+
+    def test_cli(self, run_query):
+        res, body = run_query(
+            "--output=json",
+            ["policy", "list", "--fields", "uuid, name,commit.hash"],
+            response={"data": {"policies": {"edges": [], "pageInfo": {}}}},
+        )
+        assert res.exit_code == 0, res.output
+        assert "node { uuid name commit { hash } }" in body["query"]
+
+    def test_cli_invalid(self, invoke_cli):
+        res = invoke_cli("account", "list", "--fields", "uuid")
+        assert res.exit_code == 2
+        assert "unknown field uuid" in res.output
+
+
+class TestProfiles:
+    def test_listing_default(self):
+        snippet_class = profiled_snippet(ListPolicies)
+        assert snippet_class is profiled_snippet(ListPolicies, "standard")
+        query = snippet_class.build(TestProjectedSnippet.VARIABLES)["query"]
+        assert " source " not in query
+        assert "commit { hash author msg }" in query
+
+    def test_single_default(self):
+        assert ShowPolicy.default_profile() == "full"
+        assert profiled_snippet(ShowPolicy) is ShowPolicy
+
+    def test_full(self):
+        assert profiled_snippet(ListPolicies, "full") is ListPolicies
+
+    def test_minimal(self):
+        query = profiled_snippet(ListAccounts, "minimal").build(TestProjectedSnippet.VARIABLES)
+        assert "node { id key name provider }" in query["query"]
+
+    def test_standard_single(self):
+        query = profiled_snippet(ShowPolicy, "standard").build({"uuid": "u"})["query"]
+        assert " source " not in query
+        assert "lastExecution" not in query
+        query = profiled_snippet(ShowPolicyCollection, "standard").build({"uuid": "u"})["query"]
+        assert "policyMappings(first: 1000) { pageInfo { total } }" in query
+
+    def test_no_profiles(self):
+        assert profiled_snippet(ListRepository, "minimal") is ListRepository
+
+    def test_unknown(self):
+        with pytest.raises(ValueError, match="unknown profile"):
+            profiled_snippet(ListPolicies, "tiny")
+
+    def test_cli_default(self, run_query):
+        res, body = run_query(
+            "policy", ["list"], response={"data": {"policies": {"edges": [], "pageInfo": {}}}}
+        )
+        assert res.exit_code == 0, res.output
+        assert " source " not in body["query"]
+
+    def test_cli_profile(self, run_query):
+        res, body = run_query(
+            "policy",
+            ["list", "--profile", "full"],
+            response={"data": {"policies": {"edges": [], "pageInfo": {}}}},
+        )
+        assert res.exit_code == 0, res.output
+        assert " source " in body["query"]
+
+    def test_cli_show_source(self, run_query):
+        res, body = run_query(
+            "policy",
+            ["show-source", "--uuid", "u"],
+            response={"data": {"policy": {"sourceYAML": "policies: []"}}},
+        )
+        assert res.output == "policies: []\n"
+        assert body["query"].endswith("{ policy( uuid: $uuid ) { sourceYAML } }")
+
+    def test_cli_no_profiles(self, invoke_cli):
+        res = invoke_cli("repository", "list", "--help")
+        assert "--profile" not in res.output
@@ -0,0 +1,155 @@
+# Copyright Stacklet, Inc.
+# SPDX-License-Identifier: Apache-2.0
+
+import json
+
+import pytest
+
+from stacklet.client.platform.graphql import GraphQLExecutor
+from stacklet.client.platform.mirror import Mirror, MirrorSyncError
+
+API = "mock://stacklet.acme.org/api"
+
+
+def policies_response(policies, cursor=None):
+    return {
+        "data": {
+            "policies": {
+                "edges": [{"node": policy} for policy in policies],
+                "pageInfo": {"hasNextPage": cursor is not None, "endCursor": cursor},
+            }
+        }
+    }
+
+
+def policy(n, resource_type="aws.s3", **fields):
+    return {
+        "id": f"p{n}",
+        "uuid": f"u{n}",
+        "name": f"policy-{n}",
+        "provider": "AWS",
+        "resourceType": resource_type,
+    } | fields
+
+
+@pytest.fixture
+def mirror(tmp_path):
+    mirror = Mirror(GraphQLExecutor(API, "token"), tmp_path / "mirror.db")
+    yield mirror
+    mirror.close()
+
+
+def respond(requests_adapter, *payloads):
+    requests_adapter.register_uri("POST", API, [{"json": payload} for payload in payloads])
+
+
+class TestMirror:
+    def test_sync(self, requests_adapter, mirror):
+        respond(
+            requests_adapter,
+            policies_response([policy(1), policy(2)], cursor="c1"),
+            policies_response([policy(3, "aws.ec2")]),
+        )
+        stats = mirror.sync(["policies"])["policies"]
+        assert (stats.total, stats.upserted, stats.deleted) == (3, 3, 0)
+        bodies = [req.json() for req in requests_adapter.request_history]
+        # policy sources aren't mirrored, so pages aren't capped for them
+        assert bodies[0]["variables"]["first"] == 500
+        assert bodies[1]["variables"]["after"] == "c1"
+
+        assert [node["name"] for node in mirror.find("policies", resource_type="aws.s3")] == [
+            "policy-1",
+            "policy-2",
+        ]
+        assert mirror.query("SELECT id, uuid FROM policies WHERE name = ?", "policy-3") == [
+            {"id": "p3", "uuid": "u3"}
+        ]
+
+    def test_incremental_sync(self, requests_adapter, mirror):
+        respond(requests_adapter, policies_response([policy(1), policy(2), policy(3)]))
+        mirror.sync(["policies"])
+
+        respond(
+            requests_adapter,
+            policies_response([policy(1), policy(2, name="renamed"), policy(4)]),
+        )
+        stats = mirror.sync(["policies"])["policies"]
+        # unchanged nodes aren't written again
+        assert (stats.total, stats.upserted, stats.deleted) == (3, 2, 1)
+        assert [row["name"] for row in mirror.query("SELECT name FROM policies ORDER BY id")] == [
+            "policy-1",
+            "renamed",
+            "policy-4",
+        ]
+
+    def test_failed_sync_keeps_table(self, requests_adapter, mirror):
+        respond(requests_adapter, policies_response([policy(1)]))
+        mirror.sync(["policies"])
+
+        respond(
+            requests_adapter,
+            policies_response([policy(2)], cursor="c1"),
+            {"errors": [{"message": "boom"}]},
+        )
+        with pytest.raises(MirrorSyncError):
+            mirror.sync(["policies"])
+        assert mirror.find("policies") == [policy(1)]
+
+    def test_unpaginated_listing(self, requests_adapter, mirror):
+        respond(
+            requests_adapter,
+            {
+                "data": {
+                    "repositoryConfigs": {
+                        "edges": [{"node": {"id": "r1", "uuid": "u1", "name": "repo"}}]
+                    }
+                }
+            },
+        )
+        stats = mirror.sync(["repositories"])["repositories"]
+        assert stats.total == 1
+        assert requests_adapter.call_count == 1
+        assert mirror.find("repositories", uuid="u1")[0]["name"] == "repo"
+
+    def test_unknown_table(self, mirror):
+        with pytest.raises(ValueError):
+            mirror.sync(["users"])
+        with pytest.raises(ValueError):
+            mirror.find("policies", severity="high")
+
+
+class TestMirrorCli:
+    def test_sync_and_query(self, run_queries, invoke_cli, tmp_path):
+        database = str(tmp_path / "mirror.db")
+        res, _ = run_queries(
+            "--output=json",
+            ["mirror", "sync", "--table=policies", f"--database={database}"],
+            responses=[policies_response([policy(1), policy(2, "aws.ec2")])],
+        )
+        assert res.exit_code == 0, res.output
+        assert json.loads(res.output)["policies"]["upserted"] == 2
+
+        res = invoke_cli(
+            "--output=json",
+            "mirror",
+            "query",
+            f"--database={database}",
+            "SELECT name FROM policies WHERE resource_type = ?",
+            "aws.ec2",
+        )
+        assert res.exit_code == 0, res.output
+        assert json.loads(res.output) == [{"name": "policy-2"}]
+
+    def test_sync_errors(self, run_queries, tmp_path):
+        res, _ = run_queries(
+            "mirror",
+            ["sync", "--table=policies", f"--database={tmp_path / 'mirror.db'}"],
+            responses=[{"errors": [{"message": "boom"}]}],
+        )
+        assert res.exit_code == 1
+        assert "Sync failed" in res.output
+
+    def test_invalid_query(self, invoke_cli, tmp_path):
+        res = invoke_cli("mirror", "query", f"--database={tmp_path / 'mirror.db'}", "SELEC 1")
+        assert res.exit_code == 1
+        assert "Query failed" in res.output
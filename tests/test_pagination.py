@@ -0,0 +1,114 @@
+# Copyright Stacklet, Inc.
+# SPDX-License-Identifier: Apache-2.0
+
+import threading
+
+import pytest
+
+from stacklet.client.platform.graphql.snippet import profiled_snippet, projected_snippet
+from stacklet.client.platform.graphql.snippets import ListAccounts, ListPolicies
+from stacklet.client.platform.pagination import AdaptivePageSize, prefetch
+
+
+def pages(count, fetched, fail_at=None):
+    """Yield page numbers, recording each as it's fetched."""
+    for n in range(count):
+        if n == fail_at:
+            raise RuntimeError(f"page {n} failed")
+        fetched.append(n)
+        yield n
+
+
+def wait_for(condition, timeout=2):
+    event = threading.Event()
+    for _ in range(int(timeout / 0.01)):
+        if condition():
+            return True
+        event.wait(0.01)
+    return False
+
+
+class TestPrefetch:
+    @pytest.mark.parametrize("depth", [0, 1, 3])
+    def test_order(self, depth):
+        fetched = []
+        assert list(prefetch(pages(10, fetched), depth)) == list(range(10))
+
+    def test_fetches_ahead(self):
+        fetched = []
+        iterator = prefetch(pages(10, fetched), 2)
+        assert next(iterator) == 0
+        # while page 0 is being consumed the next two get fetched, and no more
+        assert wait_for(lambda: len(fetched) == 3)
+        assert not wait_for(lambda: len(fetched) > 3, timeout=0.2)
+        iterator.close()
+
+    def test_error(self):
+        fetched = []
+        iterator = prefetch(pages(10, fetched, fail_at=2), 1)
+        assert next(iterator) == 0
+        assert next(iterator) == 1
+        with pytest.raises(RuntimeError, match="page 2 failed"):
+            next(iterator)
+
+    def test_stop_early(self):
+        fetched = []
+        source = pages(100, fetched)
+        iterator = prefetch(source, 1)
+        assert next(iterator) == 0
+        iterator.close()
+        count = len(fetched)
+        assert count <= 2
+        # the worker is done and has closed the source
+        with pytest.raises(StopIteration):
+            next(source)
+
+
+class TestAdaptivePageSize:
+    def test_grows_when_fast(self):
+        sizer = AdaptivePageSize(initial=10, maximum=100)
+        sizer.record(elapsed=0.1, size=1000)
+        # limited by the growth factor
+        assert sizer.size == 20
+        for _ in range(5):
+            sizer.record(elapsed=0.1, size=1000)
+        assert sizer.size == 100
+
+    def test_shrinks_when_slow(self):
+        sizer = AdaptivePageSize(initial=100, target_latency=2.0)
+        sizer.record(elapsed=8.0, size=1000)
+        assert sizer.size == 25
+
+    def test_shrinks_when_big(self):
+        sizer = AdaptivePageSize(initial=100, target_size=1000)
+        sizer.record(elapsed=0.1, size=4000)
+        assert sizer.size == 25
+
+    def test_minimum(self):
+        sizer = AdaptivePageSize(initial=10, minimum=5)
+        sizer.record(elapsed=100.0, size=1000)
+        assert sizer.size == 5
+
+    def test_shrink(self):
+        sizer = AdaptivePageSize(initial=8, minimum=1)
+        assert sizer.shrink()
+        assert sizer.size == 2
+        assert sizer.shrink()
+        assert sizer.size == 1
+        assert not sizer.shrink()
+
+    def test_for_snippet(self):
+        sizer = AdaptivePageSize(initial=200, maximum=500)
+        assert sizer.for_snippet(ListAccounts).maximum == 500
+        policies = sizer.for_snippet(ListPolicies)
+        assert policies.maximum == ListPolicies.max_page_size
+        assert policies.size == ListPolicies.max_page_size
+        # the original is left alone
+        assert sizer.size == 200
+
+    def test_for_lean_snippet(self):
+        sizer = AdaptivePageSize(initial=200, maximum=500)
+        # without policy sources, pages aren't capped
+        assert sizer.for_snippet(profiled_snippet(ListPolicies)).maximum == 500
+        with_source = projected_snippet(ListPolicies, ("uuid", "source"))
+        assert sizer.for_snippet(with_source).maximum == ListPolicies.max_page_size